@@ -86,4 +86,13 @@ def create_app(config_name='default'):
     with app.app_context():
         db.create_all()
     
+    # Camera-scan slots live in shared memory, created before gunicorn forks
+    from app.utils.scan_admission import init_scan_admission
+    init_scan_admission(app.config)
+    
+    # Load the plate pipeline before gunicorn forks, so workers share it
+    if app.config.get('PLATE_WARMUP_ENABLED'):
+        from app.utils.warmup import warm_up
+        warm_up(app)
+    
     return app
\ No newline at end of file
@@ -1,10 +1,11 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, send_file
 from flask_login import login_required, current_user
 from app import db
 from app.models import User, Vehicle, ComplianceRecord, FuelStation, Document, StationRating, Notification, StationEmployee
 from app.utils.helpers import send_notification
 from app.utils.reporting import ReportingService
 from datetime import datetime, timedelta
+import os
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -116,9 +117,6 @@ def delete_user(user_id):
             from app.models import QRCode
             qr_codes = QRCode.query.filter_by(vehicle_id=vehicle.id).all()
             for qr in qr_codes:
-                import os
-                if os.path.exists(qr.qr_code_path):
-                    os.remove(qr.qr_code_path)
                 db.session.delete(qr)
             
             # Delete documents
@@ -616,4 +614,117 @@ def system_settings():
         flash('Access denied. You are not authorized to access this page.', 'error')
         return redirect(url_for('main.index'))
     
-    return render_template('admin/system_settings.html')
\ No newline at end of file
+    return render_template('admin/system_settings.html')
+
+@admin_bp.route('/ocr-metrics')
+@login_required
+def ocr_metrics():
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    from app.utils.plate_cache import get_result_cache_stats
+    from app.utils.ocr_jobs import get_job_stats
+    from app.utils.ocr_metrics import get_pipeline_stats
+    from app.utils.ocr_service import OCRServiceClient
+    from app.utils.warmup import get_warmup_report
+    from app.utils.scan_admission import get_scan_admission_stats
+    from app.utils.error_handler import OCRServiceUnavailableError
+    
+    service = None
+    service_socket = current_app.config.get('PLATE_OCR_SERVICE_SOCKET')
+    if service_socket:
+        try:
+            service = OCRServiceClient(service_socket, timeout=2.0).health()
+        except OCRServiceUnavailableError as e:
+            service = {'status': 'down', 'error': str(e)}
+    
+    # Counters are per gunicorn worker, so report which worker answered;
+    # admission state is shared by all workers
+    return jsonify({
+        'worker_pid': os.getpid(),
+        'result_cache': get_result_cache_stats(),
+        'ocr_jobs': get_job_stats(),
+        'pipeline': get_pipeline_stats(),
+        'ocr_service': service,
+        'warmup': get_warmup_report(),
+        'admission': get_scan_admission_stats()
+    })
+
+
+@admin_bp.route('/batch-detect', methods=['POST'])
+@login_required
+def batch_detect():
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    from app.utils.batch_detect import OUTPUT_FORMATS, submit_batch
+    from app.utils.error_handler import OCRQueueFullError
+    
+    archive = request.files.get('archive')
+    if not archive or not archive.filename:
+        return jsonify({'error': 'No ZIP archive provided'}), 400
+    
+    output_format = request.values.get('format', 'csv')
+    if output_format not in OUTPUT_FORMATS:
+        return jsonify({'error': 'Format must be csv or jsonl'}), 400
+    
+    # The archive is only stored here; batch_detect.py --worker reads the plates
+    try:
+        job_id = submit_batch(archive, output_format, owner_id=current_user.id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except OCRQueueFullError:
+        response = jsonify({'error': 'Too many batches are queued, please try again later'})
+        response.headers['Retry-After'] = '60'
+        return response, 503
+    
+    return jsonify({
+        'status': 'queued',
+        'job_id': job_id,
+        'poll_url': url_for('admin.batch_detect_job', job_id=job_id)
+    }), 202
+
+
+@admin_bp.route('/batch-detect/<job_id>')
+@login_required
+def batch_detect_job(job_id):
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    from app.utils.batch_detect import get_batch_runner
+    
+    job = get_batch_runner().broker.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Batch not found'}), 404
+    if job['status'] == 'failed':
+        return jsonify({'status': 'error', 'job_id': job_id, 'error': 'Batch detection failed'}), 500
+    if job['status'] == 'done':
+        return jsonify({
+            'status': 'done',
+            'job_id': job_id,
+            'stats': job['result']['stats'],
+            'results_url': url_for('admin.batch_detect_results', job_id=job_id)
+        })
+    
+    # Still queued or running
+    return jsonify({'status': 'pending', 'job_id': job_id, 'job_status': job['status']}), 202
+
+
+@admin_bp.route('/batch-detect/<job_id>/results')
+@login_required
+def batch_detect_results(job_id):
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    from app.utils.batch_detect import OUTPUT_FORMATS, batch_directory, get_batch_runner
+    
+    job = get_batch_runner().broker.get(job_id)
+    if job is None or job['status'] != 'done':
+        return jsonify({'error': 'Batch results not found'}), 404
+    
+    result = job['result']
+    path = os.path.join(batch_directory(current_app.config), result['result_file'])
+    if not os.path.exists(path):
+        return jsonify({'error': 'Batch results have expired'}), 404
+    return send_file(os.path.abspath(path), mimetype=OUTPUT_FORMATS[result['format']], as_attachment=True,
+                     download_name=f"plates_{job_id}.{result['format']}")
@@ -1,11 +1,17 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
 from app import db
-from app.models import User, Vehicle, ComplianceRecord, FuelStation, StationEmployee
+from app.models import User, Vehicle, ComplianceRecord, FuelStation, StationEmployee, QRCode
 from app.utils.helpers import validate_vehicle_number, calculate_compliance_status, generate_qr_content
-import qrcode
+from app.utils.ocr_jobs import get_job_runner, FINISHED_STATUSES
+from app.utils.scan_admission import scan_slot
+from app.utils.error_handler import OCRQueueFullError, OCRServiceUnavailableError, OCRServiceTimeoutError, QRPayloadError, ImageRejectedError
+from app.utils.qr_payload import decode_qr_payload, get_qr_signing_key
 import json
-from datetime import datetime
+import base64
+import binascii
+import time
+from datetime import datetime, timedelta
 
 operator_bp = Blueprint('operator', __name__)
 
@@ -115,12 +121,32 @@ def qr_scan():
     qr_data = request.form.get('qr_data', '')
     
     try:
-        # Parse QR data
-        qr_content = json.loads(qr_data)
-        vehicle_id = qr_content.get('vehicle_id')
+        # Parse QR data: a signed payload, or the JSON of older codes
+        qr_content = decode_qr_payload(qr_data, get_qr_signing_key(current_app.config))
+        
+        # A signed code vouches for its expiry date. While that still reads
+        # valid and the code is recent, it is answered without the database;
+        # renewals and deletions since it was issued only show up there
+        compliance_status = calculate_compliance_status(qr_content['expiry_date'])
+        max_age = timedelta(days=current_app.config.get('QR_SIGNED_MAX_AGE_DAYS', 30))
+        if (qr_content['signed'] and compliance_status == 'valid'
+                and datetime.utcnow() - qr_content['issued_at'] <= max_age
+                and not request.form.get('fresh')):
+            return jsonify({
+                'status': 'success',
+                'verified_by': 'signature',
+                'vehicle': {
+                    'id': qr_content['vehicle_id'],
+                    'number': qr_content['vehicle_number'],
+                    'owner': None,
+                    'type': None,
+                    'compliance_status': compliance_status,
+                    'expiry_date': qr_content['expiry_date'].isoformat() if qr_content['expiry_date'] else None
+                }
+            })
         
         # Get vehicle from database
-        vehicle = Vehicle.query.get(vehicle_id)
+        vehicle = Vehicle.query.get(qr_content['vehicle_id'])
         if not vehicle:
             return jsonify({'error': 'Vehicle not found in the system'}), 404
         
@@ -131,15 +157,17 @@ def qr_scan():
         # This allows the frontend to display the info and then submit compliance check
         return jsonify({
             'status': 'success',
+            'verified_by': 'database',
             'vehicle': {
                 'id': vehicle.id,
                 'number': vehicle.vehicle_number,
                 'owner': vehicle.owner_name,
                 'type': vehicle.vehicle_type,
-                'compliance_status': compliance_status
+                'compliance_status': compliance_status,
+                'expiry_date': vehicle.cng_expiry_date.isoformat() if vehicle.cng_expiry_date else None
             }
         })
-    except json.JSONDecodeError:
+    except QRPayloadError:
         return jsonify({'error': 'Invalid QR code data'}), 400
     except Exception as e:
         return jsonify({'error': 'Error processing QR code'}), 500
@@ -194,10 +222,7 @@ def add_vehicle():
         vehicle_number = request.form.get('vehicle_number', '').strip().upper()
         owner_name = request.form.get('owner_name', '').strip()
         vehicle_type = request.form.get('vehicle_type', 'car')
-        fuel_type = request.form.get('fuel_type', 'petrol')
         cng_expiry_date = request.form.get('cng_expiry_date')
-        insurance_expiry_date = request.form.get('insurance_expiry_date')
-        pollution_expiry_date = request.form.get('pollution_expiry_date')
         
         # Validation
         if not all([vehicle_number, owner_name, vehicle_type]):
@@ -213,20 +238,16 @@ def add_vehicle():
         # Convert dates if provided
         from datetime import datetime
         cng_expiry = datetime.strptime(cng_expiry_date, '%Y-%m-%d').date() if cng_expiry_date else None
-        insurance_expiry = datetime.strptime(insurance_expiry_date, '%Y-%m-%d').date() if insurance_expiry_date else None
-        pollution_expiry = datetime.strptime(pollution_expiry_date, '%Y-%m-%d').date() if pollution_expiry_date else None
         
         try:
-            # Create new vehicle
+            # Create new vehicle; it stays on the operator's account, the
+            # owner named on the form may not have one
             vehicle = Vehicle(
+                user_id=current_user.id,
                 vehicle_number=vehicle_number,
                 owner_name=owner_name,
                 vehicle_type=vehicle_type,
-                fuel_type=fuel_type,
-                cng_expiry_date=cng_expiry,
-                insurance_expiry_date=insurance_expiry,
-                pollution_expiry_date=pollution_expiry,
-                last_compliance_date=datetime.utcnow().date()
+                cng_expiry_date=cng_expiry
             )
             
             # Calculate compliance status
@@ -235,23 +256,12 @@ def add_vehicle():
             db.session.add(vehicle)
             db.session.commit()
             
-            # Generate QR code for the vehicle
+            # Generate QR code for the vehicle; its image is rendered on demand
             qr_content = generate_qr_content(vehicle.id, vehicle.vehicle_number, vehicle.cng_expiry_date)
             
-            # Create QR code image
-            qr_img = qrcode.make(qr_content)
-            qr_filename = f"qr_{vehicle.id}_{vehicle.vehicle_number.replace(' ', '_')}.png"
-            qr_path = os.path.join('app', 'static', 'qr_codes', qr_filename)
-            
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(qr_path), exist_ok=True)
-            
-            qr_img.save(qr_path)
-            
             # Save QR code record to database
             qr_code = QRCode(
                 vehicle_id=vehicle.id,
-                qr_code_path=qr_path,
                 qr_content=qr_content
             )
             db.session.add(qr_code)
@@ -406,137 +416,396 @@ def camera_scan():
     if not station_employee:
         return jsonify({'error': 'You are not assigned to any fuel station. Please contact your administrator.'}), 400
     
-    # Check if we have an image file uploaded or captured image data
-    image_provided = 'image' in request.files and request.files['image'].filename != ''
-    captured_image_data = request.form.get('captured_image_data')
+    image_buffer = get_scan_image_buffer()
+    if image_buffer is None:
+        return jsonify({'error': 'No image provided'}), 400
     
-    if not image_provided and not captured_image_data:
+    manual_vehicle_number = request.form.get('manual_vehicle_number', '').strip().upper()
+    
+    return start_plate_scan(image_buffer, manual_vehicle_number, station_employee.station_id)
+
+
+@operator_bp.route('/scan', methods=['POST'])
+@login_required
+def scan():
+    """
+    Scan one frame for either a vehicle's QR sticker or its number plate.
+
+    The frame is first searched for a FuelLens QR code, which takes a few
+    milliseconds; the plate OCR only runs (inline or as a job, as for
+    /camera-scan) when there is none. `scan_method` in the response says
+    which one identified the vehicle.
+    """
+    if current_user.role != 'station_operator':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    # Get the station assigned to this operator
+    station_employee = StationEmployee.query.filter_by(employee_id=current_user.id, is_active=True).first()
+    if not station_employee:
+        return jsonify({'error': 'You are not assigned to any fuel station. Please contact your administrator.'}), 400
+    
+    image_buffer = get_scan_image_buffer()
+    if image_buffer is None:
         return jsonify({'error': 'No image provided'}), 400
     
+    # Read the upload once, the plate pipeline may need it after the QR search
+    image = image_buffer.read() if hasattr(image_buffer, 'read') else image_buffer
+    manual_vehicle_number = request.form.get('manual_vehicle_number', '').strip().upper()
+    
+    # Decoding a large frame costs about as much as the OCR, so it is admitted
+    # under the same shared limits before anything is decoded
+    station_id = station_employee.station_id
+    try:
+        with scan_slot(station_id):
+            result, status_code = scan_frame(image, manual_vehicle_number, station_id)
+    except OCRQueueFullError:
+        result, status_code = {'status': 'error', 'error': 'Scanner is busy, please try again in a few seconds'}, 503
+    return scan_response(result, status_code)
+
+
+def scan_frame(image, manual_vehicle_number, station_id):
+    """
+    Search one scan frame for a QR code, then for a plate; the caller holds a scan slot.
+
+    Returns (response body, HTTP status). With mode=async the plate is read
+    by a background job and the body is the queued job.
+    """
+    try:
+        # Decode once; the QR search and the plate pipeline share the working image
+        from app.utils.plate_detector import PlateDetector
+        detector = PlateDetector()
+        gray = detector.decode_image(image)
+    except ImageRejectedError as e:
+        return {'status': 'error', 'error': f'Image rejected: {e}'}, 400
+    except Exception as e:
+        print(f'Error in scan: {e}')
+        return {'error': 'Error processing image'}, 500
+    
+    qr_scan_result = run_qr_image_scan(gray)
+    if qr_scan_result is not None:
+        return qr_scan_result
+    
+    if request.values.get('mode') == 'async':
+        # Queued jobs decode the upload in their own process
+        return submit_scan_job(image, manual_vehicle_number, station_id, scan_method='plate')
+    
+    # The OCR service decodes the upload in its own process
+    if detector.service is None:
+        image = gray
+    result, status_code = run_camera_scan(image, manual_vehicle_number, station_id, detector)
+    result['scan_method'] = 'plate'
+    return result, status_code
+
+
+def start_plate_scan(image_buffer, manual_vehicle_number, station_id):
+    """Read the plate in a scan image, inline or as a background job (mode=async), and return the response"""
+    # Job mode: queue the image and answer straight away, OCR runs in the background
+    if request.values.get('mode') == 'async':
+        image = image_buffer.read() if hasattr(image_buffer, 'read') else image_buffer
+        return scan_response(*submit_scan_job(image, manual_vehicle_number, station_id))
+    
+    # Scans beyond the shared limits are refused straight away so they cannot
+    # take every worker from the rest of the app
+    try:
+        with scan_slot(station_id):
+            result, status_code = run_camera_scan(image_buffer, manual_vehicle_number, station_id)
+    except OCRQueueFullError:
+        result, status_code = {'status': 'error', 'error': 'Scanner is busy, please try again in a few seconds'}, 503
+    return scan_response(result, status_code)
+
+
+def submit_scan_job(image, manual_vehicle_number, station_id, scan_method=None):
+    """
+    Queue a plate scan as a background job.
+
+    Returns (response body, HTTP status); `scan_method`, when given, is
+    added to the job's result.
+    """
+    try:
+        params = {'manual_vehicle_number': manual_vehicle_number, 'station_id': station_id}
+        if scan_method:
+            params['scan_method'] = scan_method
+        job_id = get_scan_job_runner().submit(image, params, owner_id=current_user.id)
+    except OCRQueueFullError:
+        return {'status': 'error', 'error': 'Scanner is busy, please try again in a few seconds'}, 503
+    queued = {
+        'status': 'queued',
+        'job_id': job_id,
+        'poll_url': url_for('operator.camera_scan_job', job_id=job_id)
+    }
+    if current_app.config.get('OCR_JOB_EVENTS_ENABLED', False):
+        queued['events_url'] = url_for('operator.camera_scan_job_events', job_id=job_id)
+    return queued, 202
+
+
+def scan_response(result, status_code):
+    """JSON response for a scan result; a busy scanner tells the client when to retry"""
+    response = jsonify(result)
+    if status_code == 503:
+        response.headers['Retry-After'] = str(current_app.config.get('PLATE_SCAN_RETRY_AFTER', 5))
+    return response, status_code
+
+
+@operator_bp.route('/camera-scan/jobs/<job_id>')
+@login_required
+def camera_scan_job(job_id):
+    job = get_own_scan_job(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'error': 'Scan job not found'}), 404
+    
+    if job['status'] in FINISHED_STATUSES:
+        result = dict(job['result'])
+        status_code = result.pop('http_status', 200)
+        return jsonify(result), status_code
+    
+    # Still queued or running
+    return jsonify({'status': 'pending', 'job_id': job_id, 'job_status': job['status']}), 202
+
+
+@operator_bp.route('/camera-scan/jobs/<job_id>/events')
+@login_required
+def camera_scan_job_events(job_id):
+    # An open stream holds its worker, which sync gunicorn workers cannot spare
+    if not current_app.config.get('OCR_JOB_EVENTS_ENABLED', False):
+        return jsonify({'status': 'error', 'error': 'Event streams are disabled, poll the job instead',
+                        'poll_url': url_for('operator.camera_scan_job', job_id=job_id)}), 404
+    
+    job = get_own_scan_job(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'error': 'Scan job not found'}), 404
+    
+    broker = get_scan_job_runner().broker
+    timeout = current_app.config.get('OCR_JOB_STREAM_TIMEOUT', 60)
+    
+    def generate():
+        # Server-sent events: a status event now, the result event once the scan finishes
+        yield f"event: status\ndata: {json.dumps({'job_id': job_id, 'job_status': job['status']})}\n\n"
+        deadline = time.monotonic() + timeout
+        current = job
+        while current is not None and current['status'] not in FINISHED_STATUSES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                yield f"event: timeout\ndata: {json.dumps({'job_id': job_id})}\n\n"
+                return
+            current = broker.wait(job_id, min(remaining, 5.0))
+            if current is not None and current['status'] not in FINISHED_STATUSES:
+                # Keep proxies from closing an idle connection
+                yield ': keep-alive\n\n'
+        if current is None:
+            yield f"event: error\ndata: {json.dumps({'status': 'error', 'error': 'Scan job not found'})}\n\n"
+            return
+        result = dict(current['result'])
+        result.pop('http_status', None)
+        yield f"event: result\ndata: {json.dumps(result)}\n\n"
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def run_camera_scan(image_buffer, manual_vehicle_number='', station_id=None, detector=None):
+    """
+    Detect the plate in a scan image and look the vehicle up.
+
+    Returns (response body, HTTP status); used inline by /camera-scan and
+    by the background job workers. `station_id` picks the OCR cascade
+    order learned for that station's camera. `image_buffer` may also be
+    an already decoded working image, read with the caller's `detector`.
+    """
     try:
-        # Check if we have a captured image data (base64) or file upload
-        captured_image_data = request.form.get('captured_image_data')
-        
-        import os
-        import tempfile
-        import base64
         from app.utils.plate_detector import PlateDetector
         
-        temp_path = None
+        # Initialize plate detector and run the in-memory pipeline
+        if detector is None:
+            detector = PlateDetector()
+        detection = detector.detect_plate(image_buffer, station_id)
+        detected_plate = detection['plate']
         
-        try:
-            if captured_image_data:
-                # Handle base64 image data from camera capture
-                # Remove data URL prefix if present (e.g., 'data:image/png;base64,')
-                if ',' in captured_image_data:
-                    header, encoded = captured_image_data.split(',', 1)
-                    image_data = base64.b64decode(encoded)
-                else:
-                    image_data = base64.b64decode(captured_image_data)
-                
-                # Create a temporary file to save the image
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as temp_file:
-                    temp_file.write(image_data)
-                    temp_path = temp_file.name
+        if detection['rejected']:
+            return {
+                'status': 'error',
+                'error': f"Image rejected: {detection['error']}"
+            }, 400
+        
+        if detected_plate:
+            # Validate if the detected plate exists in the database
+            vehicle = detector.validate_plate_in_db(detected_plate)
+            # Learn the reading under the registered number, never under its own correction
+            detector.learn_from_detection(detection, station_id, vehicle.vehicle_number if vehicle else None)
+            if vehicle:
+                # A near-miss reading resolves to the registered number
+                message = f'Vehicle found in database: {vehicle.vehicle_number}'
+                if vehicle.vehicle_number != detected_plate:
+                    message += f' (read as {detected_plate})'
+                return {
+                    'status': 'success',
+                    'vehicle_number': vehicle.vehicle_number,
+                    'detected_plate': detected_plate,
+                    'vehicle_exists': True,
+                    'message': message,
+                    'vehicle_details': vehicle_scan_details(vehicle)
+                }, 200
             else:
-                # Handle file upload
-                image_file = request.files['image']
-                
-                # Create a temporary file to save the uploaded image
-                # Get file extension or default to .jpg
-                file_ext = os.path.splitext(image_file.filename)[1]
-                if not file_ext:
-                    file_ext = '.jpg'  # Default to jpg if no extension
-                
-                with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
-                    image_file.save(temp_file.name)
-                    temp_path = temp_file.name
-            
-            # Initialize plate detector
-            detector = PlateDetector()
-            
-            # Detect plate from the saved image
-            detected_plate = detector.detect_plate_from_image(temp_path)
-            
-            if detected_plate:
-                # Validate if the detected plate exists in the database
-                vehicle = detector.validate_plate_in_db(detected_plate)
-                if vehicle:
-                    # Calculate compliance status
-                    compliance_status = vehicle.calculate_compliance_status()
-                    
-                    return jsonify({
-                        'status': 'success',
-                        'vehicle_number': detected_plate,
-                        'vehicle_exists': True,
-                        'message': f'Vehicle found in database: {detected_plate}',
-                        'vehicle_details': {
-                            'id': vehicle.id,
-                            'owner_name': vehicle.owner.get_full_name() if vehicle.owner else 'Unknown',
-                            'owner_email': vehicle.owner.email if vehicle.owner else 'N/A',
-                            'owner_phone': vehicle.owner.phone if vehicle.owner else 'N/A',
-                            'vehicle_type': vehicle.vehicle_type,
-                            'fuel_type': vehicle.fuel_type,
-                            'cng_expiry_date': vehicle.cng_expiry_date.strftime('%Y-%m-%d') if vehicle.cng_expiry_date else 'N/A',
-                            'compliance_status': compliance_status,
-                            'last_compliance_date': vehicle.last_compliance_date.strftime('%Y-%m-%d') if vehicle.last_compliance_date else 'N/A',
-                            'insurance_expiry': vehicle.insurance_expiry_date.strftime('%Y-%m-%d') if vehicle.insurance_expiry_date else 'N/A',
-                            'pollution_expiry': vehicle.pollution_expiry_date.strftime('%Y-%m-%d') if vehicle.pollution_expiry_date else 'N/A'
-                        }
-                    })
-                else:
-                    return jsonify({
-                        'status': 'success',
-                        'vehicle_number': detected_plate,
-                        'vehicle_exists': False,
-                        'message': f'Vehicle detected: {detected_plate} (not found in database)'
-                    })
+                return {
+                    'status': 'success',
+                    'vehicle_number': detected_plate,
+                    'vehicle_exists': False,
+                    'message': f'Vehicle detected: {detected_plate} (not found in database)'
+                }, 200
+        
+        # No plate detected from image, check if manual vehicle number was provided
+        if manual_vehicle_number:
+            vehicle = detector.validate_plate_in_db(manual_vehicle_number, fuzzy=False)
+            # The operator's entry labels what OCR read from this frame
+            label = manual_vehicle_number if validate_vehicle_number(manual_vehicle_number) else None
+            detector.learn_from_detection(detection, station_id, label)
+            if vehicle:
+                return {
+                    'status': 'success',
+                    'vehicle_number': manual_vehicle_number,
+                    'vehicle_exists': True,
+                    'message': f'Vehicle found in database: {manual_vehicle_number}',
+                    'vehicle_details': vehicle_scan_details(vehicle)
+                }, 200
             else:
-                # No plate detected from image, check if manual vehicle number was provided
-                manual_vehicle_number = request.form.get('manual_vehicle_number', '').strip().upper()
-                if manual_vehicle_number:
-                    vehicle = detector.validate_plate_in_db(manual_vehicle_number)
-                    if vehicle:
-                        # Calculate compliance status
-                        compliance_status = vehicle.calculate_compliance_status()
-                        
-                        return jsonify({
-                            'status': 'success',
-                            'vehicle_number': manual_vehicle_number,
-                            'vehicle_exists': True,
-                            'message': f'Vehicle found in database: {manual_vehicle_number}',
-                            'vehicle_details': {
-                                'id': vehicle.id,
-                                'owner_name': vehicle.owner.get_full_name() if vehicle.owner else 'Unknown',
-                                'owner_email': vehicle.owner.email if vehicle.owner else 'N/A',
-                                'owner_phone': vehicle.owner.phone if vehicle.owner else 'N/A',
-                                'vehicle_type': vehicle.vehicle_type,
-                                'fuel_type': vehicle.fuel_type,
-                                'cng_expiry_date': vehicle.cng_expiry_date.strftime('%Y-%m-%d') if vehicle.cng_expiry_date else 'N/A',
-                                'compliance_status': compliance_status,
-                                'last_compliance_date': vehicle.last_compliance_date.strftime('%Y-%m-%d') if vehicle.last_compliance_date else 'N/A',
-                                'insurance_expiry': vehicle.insurance_expiry_date.strftime('%Y-%m-%d') if vehicle.insurance_expiry_date else 'N/A',
-                                'pollution_expiry': vehicle.pollution_expiry_date.strftime('%Y-%m-%d') if vehicle.pollution_expiry_date else 'N/A'
-                            }
-                        })
-                    else:
-                        return jsonify({
-                            'status': 'success',
-                            'vehicle_number': manual_vehicle_number,
-                            'vehicle_exists': False,
-                            'message': f'Vehicle manually entered: {manual_vehicle_number} (not found in database)'
-                        })
-                else:
-                    # No plate detected and no manual entry, return error
-                    return jsonify({
-                        'status': 'error',
-                        'error': 'Could not detect vehicle number from image'
-                    }), 400
-        finally:
-            # Clean up the temporary file if it was created
-            if temp_path and os.path.exists(temp_path):
-                os.unlink(temp_path)
-    
+                return {
+                    'status': 'success',
+                    'vehicle_number': manual_vehicle_number,
+                    'vehicle_exists': False,
+                    'message': f'Vehicle manually entered: {manual_vehicle_number} (not found in database)'
+                }, 200
+        
+        # No plate detected and no manual entry, return error; the cascade's
+        # attempts still count towards the cascade order
+        detector.learn_from_detection(detection, station_id)
+        if detection['retake']:
+            # Too poor to OCR, tell the operator what to fix
+            return {
+                'status': 'error',
+                'error': detection['error'],
+                'retake': True,
+                'retake_reason': detection['retake'],
+                'quality': detection['quality']
+            }, 400
+        return {
+            'status': 'error',
+            'error': 'Could not detect vehicle number from image'
+        }, 400
+    
+    except (OCRQueueFullError, OCRServiceTimeoutError):
+        return {'status': 'error', 'error': 'Scanner is busy, please try again in a few seconds'}, 503
+    except OCRServiceUnavailableError as e:
+        print(f'Error in camera scan: {e}')
+        return {'status': 'error', 'error': 'Scanner is unavailable, please try again shortly'}, 503
     except Exception as e:
         print(f'Error in camera scan: {e}')
-        return jsonify({'error': 'Error processing image'}), 500
\ No newline at end of file
+        return {'error': 'Error processing image'}, 500
+
+
+def run_qr_image_scan(gray):
+    """
+    Look for a FuelLens QR code in a decoded scan image and resolve its vehicle.
+
+    Returns (response body, HTTP status), or None when the frame holds no
+    QR code of ours (none at all, or someone else's) and the plate has to
+    be read instead.
+    """
+    from app.utils.qr_generator import read_qr_codes
+    
+    started = time.perf_counter()
+    key = get_qr_signing_key(current_app.config)
+    for qr_data in read_qr_codes(gray):
+        try:
+            qr_content = decode_qr_payload(qr_data, key)
+        except QRPayloadError:
+            continue
+        
+        vehicle = Vehicle.query.get(qr_content['vehicle_id'])
+        qr_ms = round((time.perf_counter() - started) * 1000, 1)
+        if not vehicle:
+            return {
+                'status': 'error',
+                'scan_method': 'qr',
+                'error': 'Vehicle not found in the system',
+                'qr_ms': qr_ms
+            }, 404
+        return {
+            'status': 'success',
+            'scan_method': 'qr',
+            'vehicle_number': vehicle.vehicle_number,
+            'vehicle_exists': True,
+            'message': f'Vehicle found from QR code: {vehicle.vehicle_number}',
+            'vehicle_details': vehicle_scan_details(vehicle),
+            'qr_ms': qr_ms
+        }, 200
+    return None
+
+
+def run_scan_job(image, params):
+    """Job worker entry point: run a queued scan and keep the HTTP status with the result"""
+    result, status_code = run_camera_scan(image, params.get('manual_vehicle_number', ''), params.get('station_id'))
+    result['http_status'] = status_code
+    if params.get('scan_method'):
+        result['scan_method'] = params['scan_method']
+    return result
+
+
+def run_admitted_scan_job(image, params):
+    """Job thread entry point inside a web worker: the scan needs a slot, as an inline one does"""
+    try:
+        with scan_slot(params.get('station_id')):
+            return run_scan_job(image, params)
+    except OCRQueueFullError:
+        result = {'status': 'error', 'error': 'Scanner is busy, please try again in a few seconds',
+                  'http_status': 503}
+        if params.get('scan_method'):
+            result['scan_method'] = params['scan_method']
+        return result
+
+
+def get_scan_job_runner():
+    """This worker's OCR job runner, created on first use"""
+    return get_job_runner(current_app._get_current_object(), run_admitted_scan_job)
+
+
+def get_own_scan_job(job_id):
+    """A scan job submitted by the current user, or None"""
+    if current_user.role != 'station_operator':
+        return None
+    job = get_scan_job_runner().broker.get(job_id)
+    if job is None or job['owner_id'] != current_user.id:
+        return None
+    return job
+
+
+def get_scan_image_buffer():
+    """Return the scan image from the request as an in-memory buffer, or None"""
+    # Captured image data (base64) from the camera takes precedence over uploads
+    captured_image_data = request.form.get('captured_image_data')
+    if captured_image_data:
+        # Remove data URL prefix if present (e.g., 'data:image/png;base64,')
+        if ',' in captured_image_data:
+            captured_image_data = captured_image_data.split(',', 1)[1]
+        try:
+            return base64.b64decode(captured_image_data)
+        except (binascii.Error, ValueError):
+            return None
+    
+    image_file = request.files.get('image')
+    if image_file and image_file.filename != '':
+        # Hand the upload stream straight to the decoder, no temp file
+        return image_file.stream
+    
+    return None
+
+
+def vehicle_scan_details(vehicle):
+    """Vehicle details returned to the scan page after a successful lookup"""
+    return {
+        'id': vehicle.id,
+        'owner_name': vehicle.owner.get_full_name() if vehicle.owner else 'Unknown',
+        'owner_email': vehicle.owner.email if vehicle.owner else 'N/A',
+        'owner_phone': vehicle.owner.phone if vehicle.owner else 'N/A',
+        'vehicle_type': vehicle.vehicle_type,
+        'cng_expiry_date': vehicle.cng_expiry_date.strftime('%Y-%m-%d') if vehicle.cng_expiry_date else 'N/A',
+        'compliance_status': vehicle.calculate_compliance_status()
+    }
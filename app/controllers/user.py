@@ -1,9 +1,9 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, Response
 from flask_login import login_required, current_user
 from app import db
 from app.models import User, Vehicle, ComplianceRecord, Document, QRCode, Notification, FuelStation
 from app.utils.helpers import send_compliance_reminder, generate_qr_content
-import qrcode
+from app.utils.qr_generator import QR_IMAGE_FORMATS, qr_image_etag, get_qr_image_cache
 import os
 from datetime import datetime
 import json
@@ -172,23 +172,12 @@ def add_vehicle():
             db.session.add(vehicle)
             db.session.commit()
             
-            # Generate QR code for the vehicle
+            # Generate QR code for the vehicle; its image is rendered on demand
             qr_content = generate_qr_content(vehicle.id, vehicle.vehicle_number, vehicle.cng_expiry_date)
             
-            # Create QR code image
-            qr_img = qrcode.make(qr_content)
-            qr_filename = f"qr_{vehicle.id}_{vehicle.vehicle_number.replace(' ', '_')}.png"
-            qr_path = os.path.join('app', 'static', 'qr_codes', qr_filename)
-            
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(qr_path), exist_ok=True)
-            
-            qr_img.save(qr_path)
-            
             # Save QR code record to database
             qr_code = QRCode(
                 vehicle_id=vehicle.id,
-                qr_code_path=qr_path,
                 qr_content=qr_content
             )
             db.session.add(qr_code)
@@ -252,8 +241,6 @@ def delete_vehicle(vehicle_id):
         # Delete QR codes
         qr_codes = QRCode.query.filter_by(vehicle_id=vehicle.id).all()
         for qr in qr_codes:
-            if os.path.exists(qr.qr_code_path):
-                os.remove(qr.qr_code_path)
             db.session.delete(qr)
         
         # Delete documents
@@ -290,10 +277,13 @@ def vehicle_details(vehicle_id):
     # Get documents for this vehicle
     documents = Document.query.filter_by(vehicle_id=vehicle.id).all()
     
+    qr_code = QRCode.query.filter_by(vehicle_id=vehicle.id).first()
+    
     return render_template('user/vehicle_details.html', 
                           vehicle=vehicle, 
                           compliance_history=compliance_history,
-                          documents=documents)
+                          documents=documents,
+                          qr_code=qr_code)
 
 @user_bp.route('/notifications')
 @login_required
@@ -417,23 +407,12 @@ def generate_qr(vehicle_id):
     qr_code = QRCode.query.filter_by(vehicle_id=vehicle.id).first()
     
     if not qr_code:
-        # Generate new QR code if it doesn't exist
+        # Generate new QR code if it doesn't exist; its image is rendered on demand
         qr_content = generate_qr_content(vehicle.id, vehicle.vehicle_number, vehicle.cng_expiry_date)
         
-        # Create QR code image
-        qr_img = qrcode.make(qr_content)
-        qr_filename = f"qr_{vehicle.id}_{vehicle.vehicle_number.replace(' ', '_')}.png"
-        qr_path = os.path.join('app', 'static', 'qr_codes', qr_filename)
-        
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(qr_path), exist_ok=True)
-        
-        qr_img.save(qr_path)
-        
         # Save QR code record to database
         qr_code = QRCode(
             vehicle_id=vehicle.id,
-            qr_code_path=qr_path,
             qr_content=qr_content
         )
         db.session.add(qr_code)
@@ -441,6 +420,43 @@ def generate_qr(vehicle_id):
     
     return render_template('user/qr_code.html', vehicle=vehicle, qr_code=qr_code)
 
+@user_bp.route('/qr/image/<int:qr_code_id>.<image_format>')
+@login_required
+def qr_image(qr_code_id, image_format):
+    """
+    Render a QR code as PNG or SVG from its stored content.
+
+    A QR code record's content never changes (a new code gets a new id),
+    so images carry a strong ETag and may be cached for a long time.
+    """
+    if image_format not in QR_IMAGE_FORMATS:
+        return jsonify({'error': 'Unsupported image format'}), 404
+    
+    query = QRCode.query.filter_by(id=qr_code_id)
+    if current_user.role != 'admin':
+        query = query.join(Vehicle).filter(Vehicle.user_id == current_user.id)
+    qr_code = query.first_or_404()
+    
+    # Revalidations are answered without rendering
+    etag = qr_image_etag(qr_code.qr_content, image_format)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        image, etag = get_qr_image_cache(current_app.config.get('QR_IMAGE_CACHE_SIZE', 512)).get(
+            qr_code.qr_content, image_format
+        )
+        response = Response(image, mimetype=QR_IMAGE_FORMATS[image_format])
+        if request.args.get('download'):
+            filename = f"qr_{qr_code.vehicle.vehicle_number.replace(' ', '_')}.{image_format}"
+            response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    
+    response.set_etag(etag)
+    # Behind login, so only the user's browser may keep it
+    response.cache_control.private = True
+    response.cache_control.max_age = current_app.config.get('QR_IMAGE_MAX_AGE', 31536000)
+    response.cache_control.immutable = True
+    return response
+
 
 @user_bp.route('/notifications/mark-all-read', methods=['POST'])
 @login_required
@@ -1,17 +1,16 @@
-from flask_sqlalchemy import SQLAlchemy
-
-db = SQLAlchemy()
+from app import db
 
 # Import models after db is defined
 from .user import User
-from .station import Station
+from .station import FuelStation, StationEmployee
 from .vehicle import Vehicle
-from .compliance import Compliance
+from .compliance import ComplianceRecord
 from .document import Document
 from .notification import Notification
 from .qr_code import QRCode
-from .rating import Rating
+from .rating import StationRating
 from .security_log import SecurityLog
 
 # Export models
-__all__ = ['db', 'User', 'Station', 'Vehicle', 'Compliance', 'Document', 'Notification', 'QRCode', 'Rating', 'SecurityLog']
+__all__ = ['db', 'User', 'FuelStation', 'StationEmployee', 'Vehicle', 'ComplianceRecord', 'Document', 'Notification',
+           'QRCode', 'StationRating', 'SecurityLog']
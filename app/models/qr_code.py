@@ -6,8 +6,7 @@ class QRCode(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.id'), nullable=False)
-    qr_code_path = db.Column(db.String(255), nullable=False)  # Path to QR code image file
-    qr_content = db.Column(db.Text, nullable=False)  # Encoded content
+    qr_content = db.Column(db.Text, nullable=False)  # Encoded content; images are rendered from it on demand
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
     
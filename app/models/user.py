@@ -1,15 +1,9 @@
-from flask_sqlalchemy import SQLAlchemy
-db = SQLAlchemy()
+from flask import current_app
 from flask_login import UserMixin
 from datetime import datetime, timedelta
-import bcrypt
 import jwt
-from app import create_app
 from app.utils.security import hash_password, verify_password
-from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
-from app import db  # This might still cause circular import
+from app import db
 
 class User(db.Model, UserMixin):
     __tablename__ = 'users'
@@ -53,15 +47,15 @@ class User(db.Model, UserMixin):
     def get_reset_token(self, expires=500):
         """Generate a password reset token"""
         return jwt.encode(
-            {'reset_password': self.id, 'exp': datetime.utcnow() + datetime.timedelta(seconds=expires)},
-            create_app().config['SECRET_KEY'], algorithm='HS256'
+            {'reset_password': self.id, 'exp': datetime.utcnow() + timedelta(seconds=expires)},
+            current_app.config['SECRET_KEY'], algorithm='HS256'
         )
     
     @staticmethod
     def verify_reset_token(token):
         """Verify the password reset token"""
         try:
-            id = jwt.decode(token, create_app().config['SECRET_KEY'], algorithms=['HS256'])['reset_password']
+            id = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])['reset_password']
         except jwt.ExpiredSignatureError:
             return None
         except jwt.InvalidTokenError:
@@ -0,0 +1,358 @@
+"""Batch plate detection for folders and ZIP archives of photos.
+
+Regulators hand over enforcement photos by the thousand. Instead of one
+HTTP round trip per image, the images are read straight out of the folder
+or archive and fanned out over a process pool, each worker keeping its own
+PlateDetector. Finished results are resolved against the vehicles table a
+chunk at a time with a single IN query and streamed out as CSV or JSON
+lines, so memory stays flat however large the set is.
+
+Batches never run inside a web worker: a large set takes far longer than
+a request may, and the pool would take every core from the web workers.
+They run from the batch_detect.py CLI, either on a folder or archive given
+on the command line or, with --worker, on the ZIP archives admins upload
+to /batch-detect; the upload is stored and queued as a batch job,
+and its results are fetched once the worker is done. Batch detections are
+kept out of the detection log, so a set of enforcement photos does not
+skew the learned corrections or the cascade order of the station cameras.
+"""
+
+import csv
+import io
+import json
+import os
+import time
+import uuid
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from flask import Flask, current_app
+from app.models import Vehicle
+from app.utils.ocr_jobs import JobRunner, MemoryJobBroker, SQLiteJobBroker
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff')
+
+# Archive members larger than this are reported as errors instead of read
+MAX_IMAGE_BYTES = 25 * 1024 * 1024
+
+RESULT_FIELDS = [
+    'name', 'plate', 'vehicle_exists', 'vehicle_number', 'compliance_status', 'cng_expiry_date',
+    'confidence', 'format_valid', 'ocr_calls', 'elapsed_ms', 'error'
+]
+
+OUTPUT_FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+# Detector of a pool worker process, set up by init_worker
+_worker_detector = None
+
+# One batch job runner per process
+_batch_runner = None
+_batch_runner_pid = None
+
+
+def is_image_name(name):
+    base = os.path.basename(name)
+    return not base.startswith('.') and base.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def iter_directory(path):
+    """Yield (relative name, bytes) for every image under a directory, in name order"""
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for filename in sorted(files):
+            if not is_image_name(filename):
+                continue
+            full_path = os.path.join(root, filename)
+            name = os.path.relpath(full_path, path)
+            if os.path.getsize(full_path) > MAX_IMAGE_BYTES:
+                yield name, None
+                continue
+            with open(full_path, 'rb') as f:
+                yield name, f.read()
+
+
+def iter_zip(source):
+    """Yield (member name, bytes) for every image in a ZIP archive (path or seekable file)"""
+    with zipfile.ZipFile(source) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or info.filename.startswith('__MACOSX/') or not is_image_name(info.filename):
+                continue
+            if info.file_size > MAX_IMAGE_BYTES:
+                yield info.filename, None
+                continue
+            yield info.filename, archive.read(info)
+
+
+def iter_images(source):
+    """Images of a directory path, a ZIP path or an uploaded ZIP file object"""
+    if isinstance(source, str) and os.path.isdir(source):
+        return iter_directory(source)
+    if not zipfile.is_zipfile(source):
+        raise ValueError('Expected a directory or a ZIP archive of images')
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return iter_zip(source)
+
+
+def worker_settings(config):
+    """Plate settings for the pool workers, taken from the app config"""
+    settings = {name: value for name, value in config.items() if name.startswith('PLATE_')}
+    settings.update(
+        # Parallelism comes from the batch pool; vehicles are resolved by the parent
+        PLATE_OCR_WORKERS=1,
+        # Batches neither write nor compact the stations' learning data
+        PLATE_DETECTION_LOG_ENABLED=False,
+        PLATE_LEARNING_ENABLED=False,
+        PLATE_OCR_SERVICE_SOCKET=None,
+        PLATE_RESULT_CACHE_ENABLED=False,
+        PLATE_INDEX_ENABLED=False,
+        # Nobody can retake an enforcement photo, so by default every one is read
+        PLATE_QUALITY_GATE_ENABLED=config.get('BATCH_DETECT_QUALITY_GATE', False)
+    )
+    return settings
+
+
+def init_worker(settings):
+    """Pool initializer: build this worker's detector under a minimal app config"""
+    global _worker_detector
+    from app.utils.plate_detector import PlateDetector
+
+    app = Flask('batch_detect')
+    app.config.update(settings)
+    app.app_context().push()
+    _worker_detector = PlateDetector()
+
+
+def detect_image(name, data):
+    """Pool task: run the plate pipeline on one image"""
+    row = dict.fromkeys(RESULT_FIELDS)
+    row['name'] = name
+    if data is None:
+        row['error'] = 'Image too large'
+        return row
+    result = _worker_detector.detect_plate(data)
+    row.update({
+        'plate': result['plate'],
+        'confidence': round(result['confidence'], 1),
+        'format_valid': result['format_valid'],
+        'ocr_calls': result['ocr_calls'],
+        'elapsed_ms': result['elapsed_ms'],
+        'error': result['error']
+    })
+    return row
+
+
+def resolve_vehicles(rows, plate_index=None):
+    """
+    Fill in the registered vehicle for a chunk of results with one IN query.
+
+    With a plate index, readings a character or two off a registered
+    number are mapped to it first, so the same query covers them.
+    """
+    readings = {row['plate'] for row in rows if row['plate']}
+    resolved = {}
+    if plate_index is not None:
+        plate_index.sync()
+        for plate in readings:
+            match = plate_index.lookup(plate)
+            if match is not None:
+                resolved[plate] = match[1]
+    numbers = readings | set(resolved.values())
+    vehicles = {}
+    if numbers:
+        vehicles = {vehicle.vehicle_number: vehicle
+                    for vehicle in Vehicle.query.filter(Vehicle.vehicle_number.in_(numbers)).all()}
+
+    for row in rows:
+        vehicle = None
+        if row['plate']:
+            vehicle = vehicles.get(row['plate']) or vehicles.get(resolved.get(row['plate']))
+        row['vehicle_exists'] = vehicle is not None
+        row['vehicle_number'] = vehicle.vehicle_number if vehicle else row['plate']
+        if vehicle:
+            row['compliance_status'] = vehicle.calculate_compliance_status()
+            row['cng_expiry_date'] = vehicle.cng_expiry_date.isoformat() if vehicle.cng_expiry_date else None
+    return rows
+
+
+def detect_batch(images, config, workers=None, chunk_size=200, plate_index=None):
+    """
+    Run (name, bytes) images through a process pool and yield result rows.
+
+    Rows come out in completion order, a resolved chunk at a time. Only a
+    few images per worker are held in memory at once. Must be iterated
+    inside an app context, which the vehicle lookups need.
+    """
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                               initargs=(worker_settings(config),))
+    pending = set()
+    finished = []
+    try:
+        for name, data in images:
+            # Keep a bounded number of images in flight
+            while len(pending) >= workers * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                finished.extend(future.result() for future in done)
+                if len(finished) >= chunk_size:
+                    yield from resolve_vehicles(finished, plate_index)
+                    finished = []
+            pending.add(pool.submit(detect_image, name, data))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            finished.extend(future.result() for future in done)
+            if len(finished) >= chunk_size:
+                yield from resolve_vehicles(finished, plate_index)
+                finished = []
+        if finished:
+            yield from resolve_vehicles(finished, plate_index)
+    finally:
+        # Also reached when the consumer stops early, e.g. a client disconnects
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_batch(images, output, config, output_format='csv', workers=None, chunk_size=None, exact=False):
+    """
+    Detect every (name, bytes) image and write the formatted rows to the text file `output`.
+
+    Returns the counts of images, plates read, registered vehicles found
+    and errors. With `exact`, only exact registered numbers match. Must
+    be called inside an app context.
+    """
+    from app.utils.plate_index import get_plate_index
+
+    plate_index = None
+    if config.get('PLATE_INDEX_ENABLED', True) and not exact:
+        plate_index = get_plate_index(max_distance=config.get('PLATE_INDEX_MAX_DISTANCE', 2))
+    counts = {'images': 0, 'plates': 0, 'registered': 0, 'errors': 0}
+
+    def counted(rows):
+        for row in rows:
+            counts['images'] += 1
+            counts['plates'] += row['plate'] is not None
+            counts['registered'] += bool(row['vehicle_exists'])
+            counts['errors'] += row['error'] is not None
+            yield row
+
+    rows = detect_batch(
+        images, config,
+        workers=workers or config.get('BATCH_DETECT_WORKERS'),
+        chunk_size=chunk_size or config.get('BATCH_DETECT_CHUNK_SIZE', 200),
+        plate_index=plate_index
+    )
+    for text in format_rows(counted(rows), output_format):
+        output.write(text)
+    return counts
+
+
+def batch_directory(config):
+    """Where uploaded archives wait for the batch worker and their results are kept"""
+    directory = config.get('BATCH_DETECT_DIR', os.path.join('instance', 'batch_jobs'))
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+
+
+def new_batch_broker(config):
+    """
+    Queue of uploaded batches, kept apart from the camera-scan jobs
+
+    A batch runs for minutes, so a running one is only given up as
+    interrupted after BATCH_DETECT_STALE_AFTER seconds.
+    """
+    result_ttl = config.get('BATCH_DETECT_RESULT_TTL', 86400)
+    if config.get('OCR_JOB_BROKER', 'sqlite') == 'memory':
+        return MemoryJobBroker(max_queued=config.get('BATCH_DETECT_QUEUE_SIZE', 4), result_ttl=result_ttl)
+    return SQLiteJobBroker(
+        config.get('BATCH_DETECT_DB_PATH', os.path.join('instance', 'batch_jobs.db')),
+        max_queued=config.get('BATCH_DETECT_QUEUE_SIZE', 4),
+        result_ttl=result_ttl,
+        stale_after=config.get('BATCH_DETECT_STALE_AFTER', 6 * 3600),
+        poll_interval=1.0
+    )
+
+
+def submit_batch(upload, output_format, owner_id=None):
+    """
+    Store an uploaded ZIP archive and queue it for the batch worker; returns the job id
+
+    Raises ValueError when the upload is not a ZIP archive and
+    OCRQueueFullError when too many batches are already queued.
+    """
+    batch_id = uuid.uuid4().hex
+    archive_path = os.path.join(batch_directory(current_app.config), f'upload-{batch_id}.zip')
+    upload.save(archive_path)
+    try:
+        if not zipfile.is_zipfile(archive_path):
+            raise ValueError('Expected a ZIP archive of images')
+        params = {'archive': archive_path, 'result_file': f'{batch_id}.{output_format}', 'format': output_format}
+        return get_batch_runner().submit(b'', params, owner_id=owner_id)
+    except Exception:
+        os.remove(archive_path)
+        raise
+
+
+def run_batch_job(image, params):
+    """Batch worker entry point: detect an uploaded archive and store the results next to it"""
+    config = current_app.config
+    remove_expired_results(config)
+    path = os.path.join(batch_directory(config), params['result_file'])
+    started = time.monotonic()
+    try:
+        with open(path + '.part', 'w', newline='') as output:
+            counts = run_batch(iter_images(params['archive']), output, config, params['format'])
+        os.replace(path + '.part', path)
+    finally:
+        os.remove(params['archive'])
+        if os.path.exists(path + '.part'):
+            os.remove(path + '.part')
+    counts['seconds'] = round(time.monotonic() - started, 1)
+    return {'status': 'done', 'format': params['format'], 'result_file': params['result_file'], 'stats': counts}
+
+
+def remove_expired_results(config):
+    """Delete result files whose job has expired from the queue"""
+    directory = batch_directory(config)
+    cutoff = time.time() - config.get('BATCH_DETECT_RESULT_TTL', 86400)
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if not name.startswith('upload-') and os.path.getmtime(path) < cutoff:
+            os.remove(path)
+
+
+def get_batch_runner(threads=None):
+    """
+    Return this process's batch job runner, creating the broker on first use.
+
+    In a web worker it only submits and looks up batches, unless the
+    memory broker of a single-process development server is in use;
+    batch_detect.py --worker passes `threads` to work the queue.
+    """
+    global _batch_runner, _batch_runner_pid
+    if _batch_runner is None or _batch_runner_pid != os.getpid():
+        app = current_app._get_current_object()
+        if threads is None:
+            threads = 1 if app.config.get('OCR_JOB_BROKER', 'sqlite') == 'memory' else 0
+        _batch_runner = JobRunner(app, new_batch_broker(app.config), run_batch_job, threads=threads)
+        _batch_runner_pid = os.getpid()
+    return _batch_runner
+
+
+def format_rows(rows, output_format='csv'):
+    """Yield the rows as CSV (with a header line) or JSON lines text"""
+    if output_format == 'jsonl':
+        for row in rows:
+            yield json.dumps(row) + '\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=RESULT_FIELDS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,271 @@
+"""Append-only log of plate detections.
+
+Replaces the old pickle learning file, which every scan read, mutated and
+rewrote in full without locking. Each row keeps the raw OCR text next to
+the plate read from it and, when known, the number the scan was resolved
+to independently of the OCR; only those labelled rows teach the corrector.
+Detections are queued in memory and a background thread appends them to a
+local SQLite file in batches, so the scan request never touches the disk.
+The thread starts with the first detection a process records, so a log
+opened in the gunicorn master (by the warmup) hands its workers no thread
+or connection across the fork.
+SQLite in WAL mode keeps concurrent writers from all gunicorn workers safe,
+and retention is enforced by periodic compaction instead of truncating to
+a fixed count on every write.
+"""
+
+import atexit
+import os
+import pickle
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# One log per process; the writer thread does not survive a fork
+_detection_log = None
+_detection_log_pid = None
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS detections (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at REAL NOT NULL,
+        plate TEXT,
+        raw_text TEXT NOT NULL,
+        confidence REAL,
+        station_id INTEGER,
+        variant TEXT,
+        psm INTEGER,
+        tried TEXT,
+        label TEXT
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS ix_detections_created_at ON detections (created_at)',
+]
+
+INSERT = ('INSERT INTO detections (created_at, plate, raw_text, confidence, station_id, variant, psm, tried, label) '
+          'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)')
+
+
+class DetectionLog:
+    def __init__(self, path, batch_size=50, flush_interval=2.0, max_age_days=90, max_rows=50000,
+                 compact_interval=600, legacy_path=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_age_days = max_age_days
+        self.max_rows = max_rows
+        self.compact_interval = compact_interval
+        self.pending = queue.Queue(maxsize=batch_size * 20)
+        self.dropped = 0
+        self.last_compacted = 0.0
+        self.stopping = threading.Event()
+        self.writer = None
+        self.writer_pid = None
+        self.writer_lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.create(legacy_path)
+        atexit.register(self.close)
+
+    def start_writer(self):
+        """Start this process's writer thread, unless it is running; a forked child starts its own"""
+        if self.writer_pid == os.getpid():
+            return
+        with self.writer_lock:
+            if self.writer_pid == os.getpid():
+                return
+            if self.writer is not None:
+                # Inherited across a fork: the parent's thread and queue are not ours
+                self.pending = queue.Queue(maxsize=self.batch_size * 20)
+                self.stopping = threading.Event()
+            self.writer = threading.Thread(target=self._run_writer, name='detection-log-writer', daemon=True)
+            self.writer.start()
+            self.writer_pid = os.getpid()
+
+    def create(self, legacy_path=None):
+        """
+        Create the log file, importing the legacy pickle into a new one.
+
+        Every worker runs this at startup, so the check, the schema and the
+        import share one write transaction: the first worker creates the
+        log and the others find it there. auto_vacuum only takes effect on
+        a file without tables and before it is switched to WAL, so it is set
+        on a plain connection first; it is a no-op on an existing log.
+        """
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('BEGIN IMMEDIATE')
+            is_new = conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name='detections'"
+            ).fetchone() is None
+            for statement in SCHEMA:
+                conn.execute(statement)
+            if is_new and legacy_path and os.path.exists(legacy_path):
+                self.import_legacy_pickle(conn, legacy_path)
+            conn.execute('COMMIT')
+            conn.execute('PRAGMA journal_mode = WAL')
+        finally:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            conn.close()
+
+    def connect(self):
+        """Open a connection tuned for many processes appending to the same file"""
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        return conn
+
+    def record(self, raw_text, plate, confidence=None, station_id=None, variant=None, psm=None, tried=None,
+               label=None):
+        """
+        Queue a detection for the writer thread; never blocks the caller.
+
+        `plate` is what the pipeline read, or None. `variant` and `psm` name
+        the (enhancement, tesseract PSM) pair that produced the plate, when
+        it came out of the OCR cascade, and `tried` lists the (variant, psm)
+        pairs the cascade ran to get there. `label` is the number the scan
+        was resolved to independently of the OCR: the registered vehicle it
+        matched, or the number the operator entered.
+        """
+        tried_text = ','.join(f'{name}:{mode}' for name, mode in tried) if tried else None
+        self.start_writer()
+        try:
+            self.pending.put_nowait((time.time(), plate, raw_text or '', confidence, station_id, variant, psm,
+                                     tried_text, label))
+        except queue.Full:
+            # The writer is behind (e.g. the disk is locked); losing a learning sample is fine
+            self.dropped += 1
+
+    def recent(self, limit=1000):
+        """Most recent labelled detections as (label, raw_text, confidence) tuples, newest first"""
+        conn = self.connect()
+        try:
+            return conn.execute(
+                'SELECT label, raw_text, confidence FROM detections WHERE label IS NOT NULL '
+                'ORDER BY id DESC LIMIT ?', (limit,)
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def recent_wins(self, limit=5000):
+        """
+        (station_id, variant, psm, tried) of the most recent OCR cascades, whether they read a plate or not
+
+        `variant` and `psm` name the pair that read the plate, or are None
+        for a cascade that read nothing. `tried` is the list of (variant,
+        psm) pairs the cascade ran, or None.
+        """
+        conn = self.connect()
+        try:
+            rows = conn.execute(
+                'SELECT station_id, variant, psm, tried FROM detections '
+                'WHERE variant IS NOT NULL OR tried IS NOT NULL ORDER BY id DESC LIMIT ?', (limit,)
+            ).fetchall()
+        finally:
+            conn.close()
+        wins = []
+        for station_id, variant, psm, tried_text in rows:
+            tried = None
+            if tried_text:
+                tried = [(name, int(mode)) for name, mode in (item.split(':') for item in tried_text.split(','))]
+            wins.append((station_id, variant, psm, tried))
+        return wins
+
+    def flush(self, timeout=5.0):
+        """Wait until everything queued so far has been written"""
+        deadline = time.monotonic() + timeout
+        while self.pending.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def close(self):
+        """Stop the writer thread after writing what is still queued"""
+        if self.stopping.is_set():
+            return
+        self.stopping.set()
+        if self.writer_pid == os.getpid():
+            self.writer.join(timeout=5.0)
+
+    def compact(self, conn):
+        """Apply retention: drop rows past the maximum age, then all but the newest max_rows"""
+        cutoff = time.time() - self.max_age_days * 86400
+        conn.execute('DELETE FROM detections WHERE created_at < ?', (cutoff,))
+        conn.execute(
+            'DELETE FROM detections WHERE id <= (SELECT id FROM detections ORDER BY id DESC LIMIT 1 OFFSET ?)',
+            (self.max_rows,)
+        )
+        # Hand the freed pages back to the filesystem; the file shrinks once the WAL is checkpointed.
+        # execute() steps the pragma only once, which frees a single page
+        conn.executescript('PRAGMA incremental_vacuum;')
+        conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+        self.last_compacted = time.monotonic()
+
+    def import_legacy_pickle(self, conn, legacy_path):
+        """One-time import of detections from the old plate_detection_learning.pkl"""
+        try:
+            with open(legacy_path, 'rb') as f:
+                learning_data = pickle.load(f)
+            rows = []
+            for detection in learning_data.get('successful_detections', []):
+                created_at = datetime.fromisoformat(detection['timestamp']).timestamp()
+                # The pickle only kept the corrector's own output, which is no label
+                rows.append((created_at, detection['corrected'], detection['original'], None, None, None, None, None,
+                             None))
+            conn.executemany(INSERT, rows)
+        except Exception as e:
+            print(f"Error importing legacy plate learning file: {e}")
+
+    def _run_writer(self):
+        conn = self.connect()
+        try:
+            while not (self.stopping.is_set() and self.pending.empty()):
+                batch = self._next_batch()
+                if batch:
+                    self._write_batch(conn, batch)
+                    for _ in batch:
+                        self.pending.task_done()
+                if time.monotonic() - self.last_compacted >= self.compact_interval:
+                    try:
+                        self.compact(conn)
+                    except sqlite3.Error as e:
+                        print(f"Error compacting detection log: {e}")
+        finally:
+            conn.close()
+
+    def _next_batch(self):
+        """Block up to flush_interval for the first item, then drain up to batch_size"""
+        try:
+            batch = [self.pending.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.pending.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_batch(self, conn, batch):
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(INSERT, batch)
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            print(f"Error writing detection log: {e}")
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+
+
+def get_detection_log(path, **options):
+    """Return this process's detection log, creating it (and its writer thread) on first use"""
+    global _detection_log, _detection_log_pid
+    if _detection_log is None or _detection_log_pid != os.getpid():
+        _detection_log = DetectionLog(path, **options)
+        _detection_log_pid = os.getpid()
+    return _detection_log
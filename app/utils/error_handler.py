@@ -3,7 +3,6 @@
 from flask import jsonify, request, current_app, render_template
 from werkzeug.exceptions import HTTPException
 from app.utils.logging_config import get_logger
-from app.models import SecurityLog
 import traceback
 import sys
 from functools import wraps
@@ -40,6 +39,31 @@ class OCRProcessingError(FuelLensException):
     pass
 
 
+class ImageRejectedError(OCRProcessingError):
+    """Raised when a scan image is rejected before it is decoded."""
+    pass
+
+
+class OCRQueueFullError(OCRProcessingError):
+    """Raised when the OCR job queue cannot take another scan."""
+    pass
+
+
+class OCRServiceUnavailableError(OCRProcessingError):
+    """Raised when the shared OCR service cannot be reached or fails."""
+    pass
+
+
+class OCRServiceTimeoutError(OCRServiceUnavailableError):
+    """Raised when the shared OCR service does not finish a scan in time."""
+    pass
+
+
+class QRPayloadError(ValidationError):
+    """Raised when QR code content cannot be decoded or its signature does not match."""
+    pass
+
+
 class SecurityError(FuelLensException):
     """Raised when security-related issues occur."""
     pass
@@ -51,6 +75,8 @@ logger = get_logger('app.errors')
 
 def init_error_handlers(app):
     """Initialize error handlers for the Flask application."""
+    # Late import: app/__init__.py imports this module before db is defined
+    from app.models import SecurityLog
     
     @app.errorhandler(400)
     def bad_request(error):
@@ -191,6 +217,7 @@ def error_handler(f):
             return handle_error_response("Database error occurred", 500)
         except SecurityError as e:
             logger.error(f"Security error: {str(e)}", exc_info=True)
+            from app.models import SecurityLog
             SecurityLog.log_event(
                 event_type='SECURITY_ERROR',
                 user_id=getattr(current_user, 'id', None),
@@ -75,22 +75,14 @@ def send_compliance_reminder(vehicle):
     )
 
 def generate_qr_content(vehicle_id, vehicle_number, expiry_date):
-    """Generate QR code content with vehicle info"""
-    import json
-    from datetime import datetime
+    """Generate signed, compact QR code content with vehicle info (see app.utils.qr_payload)"""
+    from flask import current_app
+    from app.utils.qr_payload import encode_qr_payload, get_qr_signing_key
     
     # Sanitize vehicle number
     vehicle_number = sanitize_input(vehicle_number) if vehicle_number else vehicle_number
     
-    qr_data = {
-        'vehicle_id': vehicle_id,
-        'vehicle_number': vehicle_number,
-        'expiry_date': expiry_date.isoformat() if expiry_date else None,
-        'generated_at': datetime.utcnow().isoformat(),
-        'status': 'valid'  # This will be checked against database when scanned
-    }
-    
-    return json.dumps(qr_data)
+    return encode_qr_payload(vehicle_id, vehicle_number, expiry_date, get_qr_signing_key(current_app.config))
 
 def validate_and_sanitize_input(input_string):
     """Validate and sanitize user input"""
@@ -0,0 +1,166 @@
+"""Ingest normalization for scan images.
+
+Reads image dimensions from the file header before anything is decoded,
+rejects pathological images cheaply, and decodes straight to a reduced
+grayscale working image so per-scan memory and CPU stay bounded no matter
+what resolution the client sends.
+"""
+
+import struct
+import cv2
+import numpy as np
+from app.utils.error_handler import ImageRejectedError
+
+# Reduced-size grayscale decode flags by downscale factor. For JPEG the
+# reduction happens inside the decoder (DCT scaling), so the full-size
+# image is never materialized.
+GRAYSCALE_DECODE_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+    (1, cv2.IMREAD_GRAYSCALE),
+]
+
+# JPEG start-of-frame markers carrying the image size (excludes DHT, JPG, DAC)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def read_buffer(source):
+    """Return the raw bytes of a buffer or readable stream"""
+    if hasattr(source, 'read'):
+        source = source.read()
+    return memoryview(source).cast('B') if source else None
+
+
+def read_image_header(data):
+    """
+    Return (format, width, height) from an encoded image header without decoding it
+    """
+    if len(data) < 30:
+        raise ImageRejectedError('Image is truncated')
+    head = bytes(data[:30])
+
+    if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+        width, height = struct.unpack('>II', head[16:24])
+        return 'png', width, height
+
+    if head.startswith(b'\xff\xd8'):
+        width, height = read_jpeg_size(data)
+        return 'jpeg', width, height
+
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        chunk = head[12:16]
+        if chunk == b'VP8 ':
+            width, height = struct.unpack('<HH', head[26:30])
+            return 'webp', width & 0x3FFF, height & 0x3FFF
+        if chunk == b'VP8L':
+            bits = int.from_bytes(head[21:25], 'little')
+            return 'webp', (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b'VP8X':
+            width = int.from_bytes(head[24:27], 'little') + 1
+            height = int.from_bytes(head[27:30], 'little') + 1
+            return 'webp', width, height
+
+    if head.startswith(b'BM'):
+        width, height = struct.unpack('<ii', head[18:26])
+        return 'bmp', abs(width), abs(height)
+
+    raise ImageRejectedError('Unsupported image format')
+
+
+def read_jpeg_size(data):
+    """Walk JPEG marker segments up to the start-of-frame and return (width, height)"""
+    i = 2
+    size = len(data)
+    while i + 4 <= size:
+        if data[i] != 0xFF:
+            break
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            i += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            # Standalone markers have no length field
+            i += 2
+            continue
+        segment_length = (data[i + 2] << 8) | data[i + 3]
+        if marker in JPEG_SOF_MARKERS:
+            if i + 9 > size:
+                break
+            height = (data[i + 5] << 8) | data[i + 6]
+            width = (data[i + 7] << 8) | data[i + 8]
+            return width, height
+        if marker in (0xD9, 0xDA) or segment_length < 2:
+            # End of image or start of scan before any frame header
+            break
+        i += 2 + segment_length
+    raise ImageRejectedError('Corrupt JPEG header')
+
+
+class ImageIngestor:
+    def __init__(self, working_max_side=1280, max_pixels=40000000, min_side=64, max_aspect_ratio=8.0):
+        self.working_max_side = working_max_side
+        self.max_pixels = max_pixels
+        self.min_side = min_side
+        self.max_aspect_ratio = max_aspect_ratio
+
+    def check_dimensions(self, width, height):
+        """Reject images whose header dimensions are unusable or dangerous to decode"""
+        if width <= 0 or height <= 0:
+            raise ImageRejectedError('Image has no dimensions')
+        if width * height > self.max_pixels:
+            # Decompression-bomb guard: refuse before allocating anything
+            raise ImageRejectedError(f'Image too large ({width}x{height})')
+        if min(width, height) < self.min_side:
+            raise ImageRejectedError(f'Image too small ({width}x{height})')
+        if max(width, height) / min(width, height) > self.max_aspect_ratio:
+            raise ImageRejectedError(f'Unusual image shape ({width}x{height})')
+
+    def decode_factor(self, width, height):
+        """Largest decoder reduction that keeps the long side at or above the working size"""
+        long_side = max(width, height)
+        for factor, flag in GRAYSCALE_DECODE_FLAGS:
+            if long_side // factor >= self.working_max_side:
+                return factor, flag
+        return GRAYSCALE_DECODE_FLAGS[-1]
+
+    def load(self, source):
+        """
+        Decode a scan image buffer to a bounded grayscale working image.
+
+        Raises ImageRejectedError for missing, unsupported, corrupt or
+        pathological images.
+        """
+        data = read_buffer(source)
+        if data is None:
+            raise ImageRejectedError('Empty image')
+
+        _, width, height = read_image_header(data)
+        self.check_dimensions(width, height)
+
+        _, flag = self.decode_factor(width, height)
+        gray = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+        if gray is None:
+            raise ImageRejectedError('Could not decode image')
+
+        # Finish the downsample to the working resolution
+        return self.fit_working_size(gray)
+
+    def load_frame(self, frame):
+        """Bring an already decoded BGR or grayscale frame (e.g. from a video capture) to the working image"""
+        if frame is None or frame.size == 0:
+            raise ImageRejectedError('Empty frame')
+        height, width = frame.shape[:2]
+        self.check_dimensions(width, height)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        return self.fit_working_size(gray)
+
+    def fit_working_size(self, gray):
+        """Downsample so the long side is at most the working size"""
+        long_side = max(gray.shape[:2])
+        if long_side > self.working_max_side:
+            scale = self.working_max_side / float(long_side)
+            gray = cv2.resize(gray, (max(int(gray.shape[1] * scale), 1), max(int(gray.shape[0] * scale), 1)),
+                              interpolation=cv2.INTER_AREA)
+        return gray
@@ -0,0 +1,339 @@
+"""Continuous plate recognition from a fixed lane camera.
+
+Running OCR on every frame of a video stream is far too expensive, so the
+worker samples a few frames per second and runs a cheap motion gate over
+a small thumbnail of each one. Only while the gate reports a vehicle in
+the lane are frames handed to the plate pipeline, and the readings from
+one vehicle's pass are voted into a single result. A vehicle that stops
+and pulls away again inside the dedupe window is not reported twice.
+Frames are not learned from one by one; the reported result carries the
+winning plate's best detection, so a pass is learned from once.
+
+A live stream does not wait while a frame is OCR'd: RTSP and MJPEG
+sources buffer what is not read, so reading them only between detections
+would leave the worker further and further behind the lane. Live frames
+are read on a separate thread that keeps only the newest one, and frames
+that arrive during a detection are dropped.
+"""
+
+import threading
+import time
+from collections import defaultdict
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Decides whether a vehicle is in the lane from frame-to-background change.
+
+    The background is a running average of thumbnails. It adapts quickly
+    while the lane is empty (lighting drift) and only slowly while a
+    vehicle is present, so a car standing still is not absorbed at once.
+    Hysteresis on both the change fraction and the frame counts keeps the
+    gate from flickering.
+    """
+
+    def __init__(self, width=160, pixel_threshold=25, enter_fraction=0.02, exit_fraction=0.008,
+                 enter_frames=2, exit_frames=4, learning_rate=0.05, present_learning_rate=0.005):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.enter_fraction = enter_fraction
+        self.exit_fraction = exit_fraction
+        self.enter_frames = enter_frames
+        self.exit_frames = exit_frames
+        self.learning_rate = learning_rate
+        self.present_learning_rate = present_learning_rate
+        self.background = None
+        self.present = False
+        self.streak = 0
+
+    def thumbnail(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        height = max(int(gray.shape[0] * self.width / gray.shape[1]), 1)
+        small = cv2.resize(gray, (self.width, height), interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def update(self, frame):
+        """Feed one sampled frame; returns (vehicle present, fraction of changed pixels)"""
+        small = self.thumbnail(frame)
+        if self.background is None:
+            self.background = small.astype(np.float32)
+            return False, 0.0
+
+        diff = cv2.absdiff(small, cv2.convertScaleAbs(self.background))
+        changed = float(np.count_nonzero(diff > self.pixel_threshold)) / diff.size
+
+        if self.present:
+            self.streak = self.streak + 1 if changed < self.exit_fraction else 0
+            if self.streak >= self.exit_frames:
+                self.present = False
+                self.streak = 0
+        else:
+            self.streak = self.streak + 1 if changed > self.enter_fraction else 0
+            if self.streak >= self.enter_frames:
+                self.present = True
+                self.streak = 0
+
+        rate = self.present_learning_rate if self.present else self.learning_rate
+        cv2.accumulateWeighted(small, self.background, rate)
+        return self.present, changed
+
+
+class LatestFrameReader:
+    """Reads a live capture on its own thread, keeping only the newest frame"""
+
+    def __init__(self, capture):
+        self.capture = capture
+        self.condition = threading.Condition()
+        self.frame = None
+        self.frame_id = 0  # Frames read so far; the newest frame's number
+        self.ended = False
+        self.stopping = False
+        self.thread = threading.Thread(target=self._read, name='lane-camera-reader', daemon=True)
+        self.thread.start()
+
+    def _read(self):
+        while not self.stopping:
+            ok, frame = self.capture.read()
+            with self.condition:
+                if not ok:
+                    self.ended = True
+                    self.condition.notify_all()
+                    return
+                self.frame = frame
+                self.frame_id += 1
+                self.condition.notify_all()
+
+    def next_frame(self, after_id, timeout):
+        """The newest frame read after frame `after_id`, as (frame id, frame), or None if the stream ended or stalled"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.frame_id > after_id or self.ended, timeout)
+            if self.frame_id <= after_id:
+                return None
+            return self.frame_id, self.frame
+
+    def stop(self):
+        # The capture's own read timeout bounds the wait on a stalled stream
+        self.stopping = True
+        self.thread.join()
+
+
+class VehiclePass:
+    """Plate readings collected while one vehicle is in the lane"""
+
+    def __init__(self, started_at):
+        self.started_at = started_at
+        self.ended_at = started_at
+        self.scores = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.detections = {}  # plate -> its most confident detection
+        self.frames = 0
+        self.ocr_frames = 0
+
+    def add(self, plate, confidence, detection=None):
+        # Low-confidence readings still count, just less
+        self.scores[plate] += max(confidence, 1.0)
+        self.counts[plate] += 1
+        best = self.detections.get(plate)
+        if detection is not None and (best is None or confidence > best['confidence']):
+            self.detections[plate] = detection
+
+    def ranked(self):
+        return sorted(self.scores.items(), key=lambda item: item[1], reverse=True)
+
+    def is_decided(self, min_agreeing=2):
+        """True once the leading plate has been read often enough to stop running OCR"""
+        ranked = self.ranked()
+        if not ranked or self.counts[ranked[0][0]] < min_agreeing:
+            return False
+        return len(ranked) == 1 or ranked[0][1] >= 2 * ranked[1][1]
+
+    def winner(self):
+        """(plate, share of the vote) of the best-supported reading, or (None, 0.0)"""
+        ranked = self.ranked()
+        if not ranked:
+            return None, 0.0
+        return ranked[0][0], ranked[0][1] / sum(self.scores.values())
+
+
+class LaneCameraWorker:
+    """
+    Samples a video source and reports one result per vehicle pass.
+
+    `on_result(result, detection)` gets the voted result and the most
+    confident detect_plate result of the winning plate, e.g. to learn
+    from the pass once.
+    """
+
+    def __init__(self, source, detector, on_result, sample_fps=4.0, max_ocr_per_pass=6, min_agreeing=2,
+                 dedupe_seconds=30.0, gate=None, reconnect_delay=2.0, stall_timeout=10.0, station_id=None):
+        self.source = source
+        self.detector = detector
+        self.on_result = on_result
+        self.sample_fps = sample_fps
+        self.max_ocr_per_pass = max_ocr_per_pass
+        self.min_agreeing = min_agreeing
+        self.dedupe_seconds = dedupe_seconds
+        self.gate = gate or MotionGate()
+        self.reconnect_delay = reconnect_delay
+        self.stall_timeout = stall_timeout  # Seconds without a new live frame before reconnecting
+        self.station_id = station_id  # Selects the OCR cascade order learned for this camera
+        self.current_pass = None
+        self.last_reported = {}  # plate -> stream time it was last reported
+        self.stopping = False
+        self.started = time.monotonic()
+        self.stats = {
+            'frames_read': 0,
+            'frames_sampled': 0,
+            'frames_dropped': 0,
+            'frames_ocr': 0,
+            'passes': 0,
+            'passes_without_plate': 0,
+            'results': 0,
+            'duplicates': 0
+        }
+
+    def is_live(self):
+        return isinstance(self.source, str) and '://' in self.source
+
+    def run(self, max_seconds=None):
+        """
+        Read the source until it ends (files), stop() is called or max_seconds of stream time pass.
+
+        Live streams are reopened after a dropped connection.
+        """
+        while not self.stopping:
+            capture = cv2.VideoCapture(self.source)
+            if not capture.isOpened():
+                if not self.is_live():
+                    raise IOError(f'Could not open video source {self.source}')
+                print(f"Error opening video source {self.source}, retrying")
+                time.sleep(self.reconnect_delay)
+                continue
+            try:
+                finished = self.read_capture(capture, max_seconds)
+            finally:
+                capture.release()
+            if finished or not self.is_live():
+                break
+            time.sleep(self.reconnect_delay)
+        self.end_pass()
+        return self.stats
+
+    def stop(self):
+        self.stopping = True
+
+    def read_capture(self, capture, max_seconds=None):
+        """Sample frames from one open capture; returns True when reading should stop for good"""
+        if self.is_live():
+            return self.read_live(capture, max_seconds)
+        fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+        stride = max(int(round(fps / self.sample_fps)), 1)
+        frame_index = 0
+        while not self.stopping:
+            # grab() skips the colour conversion of frames that are not sampled
+            if not capture.grab():
+                return False
+            self.stats['frames_read'] += 1
+            frame_index += 1
+            # Files are timed by their frame rate, live streams by the wall clock
+            stream_time = time.monotonic() - self.started if self.is_live() else frame_index / fps
+            if max_seconds is not None and stream_time > max_seconds:
+                return True
+            if frame_index % stride:
+                continue
+            ok, frame = capture.retrieve()
+            if not ok:
+                continue
+            self.stats['frames_sampled'] += 1
+            self.process_frame(frame, stream_time)
+        return True
+
+    def read_live(self, capture, max_seconds=None):
+        """
+        Sample the newest frame of a live capture sample_fps times a second.
+
+        Returns False when the stream ends or stalls, so it is reopened.
+        """
+        reader = LatestFrameReader(capture)
+        interval = 1.0 / self.sample_fps
+        next_sample = time.monotonic()
+        last_id = 0
+        read_before = self.stats['frames_read']
+        try:
+            while not self.stopping:
+                delay = next_sample - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                # After a slow detection, sample the next frame straight away
+                next_sample = max(next_sample + interval, time.monotonic())
+                latest = reader.next_frame(last_id, self.stall_timeout)
+                if latest is None:
+                    return False
+                frame_id, frame = latest
+                self.stats['frames_read'] = read_before + frame_id
+                self.stats['frames_dropped'] += frame_id - last_id - 1
+                last_id = frame_id
+                stream_time = time.monotonic() - self.started
+                if max_seconds is not None and stream_time > max_seconds:
+                    return True
+                self.stats['frames_sampled'] += 1
+                self.process_frame(frame, stream_time)
+            return True
+        finally:
+            reader.stop()
+
+    def process_frame(self, frame, stream_time):
+        """Gate one sampled frame and run the plate pipeline on it while a vehicle is present"""
+        present, _ = self.gate.update(frame)
+        if not present:
+            self.end_pass()
+            return
+
+        if self.current_pass is None:
+            self.current_pass = VehiclePass(stream_time)
+            self.stats['passes'] += 1
+        vehicle_pass = self.current_pass
+        vehicle_pass.frames += 1
+        vehicle_pass.ended_at = stream_time
+
+        if vehicle_pass.ocr_frames >= self.max_ocr_per_pass or vehicle_pass.is_decided(self.min_agreeing):
+            return
+        vehicle_pass.ocr_frames += 1
+        self.stats['frames_ocr'] += 1
+        detection = self.detector.detect_plate(frame, self.station_id)
+        if detection['plate'] and detection['format_valid']:
+            vehicle_pass.add(detection['plate'], detection['confidence'], detection)
+
+    def end_pass(self):
+        """Vote the finished pass into one result and report it unless it is a duplicate"""
+        vehicle_pass = self.current_pass
+        if vehicle_pass is None:
+            return
+        self.current_pass = None
+
+        plate, share = vehicle_pass.winner()
+        if plate is None:
+            self.stats['passes_without_plate'] += 1
+            return
+
+        # Forget plates reported longer ago than the dedupe window
+        cutoff = vehicle_pass.started_at - self.dedupe_seconds
+        self.last_reported = {seen: at for seen, at in self.last_reported.items() if at >= cutoff}
+        last_seen = self.last_reported.get(plate)
+        self.last_reported[plate] = vehicle_pass.ended_at
+        if last_seen is not None and vehicle_pass.started_at - last_seen < self.dedupe_seconds:
+            self.stats['duplicates'] += 1
+            return
+
+        self.stats['results'] += 1
+        self.on_result({
+            'plate': plate,
+            'vote_share': round(share, 3),
+            'readings': vehicle_pass.counts[plate],
+            'ocr_frames': vehicle_pass.ocr_frames,
+            'frames': vehicle_pass.frames,
+            'started_at': round(vehicle_pass.started_at, 2),
+            'ended_at': round(vehicle_pass.ended_at, 2)
+        }, vehicle_pass.detections.get(plate))
@@ -1,13 +1,19 @@
-from geopy.distance import geodesic
-from geopy.geocoders import Nominatim
 from app.models import FuelStation
 from app import db
 from math import radians, cos, sin, asin, sqrt
 
 class LocationService:
     def __init__(self):
-        # Initialize geocoder (using Nominatim for open street map data)
-        self.geocoder = Nominatim(user_agent="fuellens_app")
+        self._geocoder = None
+    
+    @property
+    def geocoder(self):
+        """Nominatim (OpenStreetMap) geocoder, created on first use"""
+        if self._geocoder is None:
+            # geopy is only imported when an address is actually geocoded
+            from geopy.geocoders import Nominatim
+            self._geocoder = Nominatim(user_agent="fuellens_app")
+        return self._geocoder
     
     def get_coordinates_from_address(self, address):
         """
@@ -0,0 +1,171 @@
+"""OCR execution helpers for plate detection.
+
+Kept free of Flask and model imports so the functions here can run inside
+process pool workers without dragging in the whole application.
+"""
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import cv2
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# One pool per process, created lazily so gunicorn workers never inherit
+# a pool that was started in the master before fork
+_pool = None
+_pool_pid = None
+
+# Long-lived OCR backends, one per (process, backend name)
+_backends = {}
+_backends_pid = None
+
+
+class PytesseractBackend:
+    """Runs the tesseract CLI through pytesseract; one subprocess per call"""
+
+    name = 'pytesseract'
+
+    def __init__(self):
+        # Imported on first use, processes running tesserocr never load it
+        import pytesseract
+        self.pytesseract = pytesseract
+
+    def recognize(self, image, config):
+        data = self.pytesseract.image_to_data(image, config=config, output_type=self.pytesseract.Output.DICT)
+        lines = {}
+        confidences = []
+        for i, word in enumerate(data['text']):
+            word = word.strip()
+            if not word:
+                continue
+            # Keep Tesseract's line structure so multi-line plates can be recombined
+            line_key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            lines.setdefault(line_key, []).append(word)
+            confidences.append(max(float(data['conf'][i]), 0.0))
+        if not confidences:
+            return '', 0.0
+        text = '\n'.join(' '.join(words) for words in lines.values())
+        return text, sum(confidences) / len(confidences)
+
+
+class TesserocrBackend:
+    """
+    Keeps one libtesseract engine loaded in-process via tesserocr.
+
+    The language model is loaded once per process instead of once per call,
+    and images are handed over as raw pixel buffers instead of temp PNGs.
+    """
+
+    name = 'tesserocr'
+
+    def __init__(self, lang='eng'):
+        self.api = tesserocr.PyTessBaseAPI(lang=lang, oem=tesserocr.OEM.LSTM_ONLY)
+        self.variables = {}
+
+    def recognize(self, image, config):
+        psm, variables = parse_tesseract_config(config)
+        self.api.SetPageSegMode(psm)
+        for key, value in variables.items():
+            if self.variables.get(key) != value:
+                self.api.SetVariable(key, value)
+                self.variables[key] = value
+
+        if len(image.shape) == 3:
+            # Engines are fed grayscale; plate variants are already single channel
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        height, width = image.shape[:2]
+        buffer = image.tobytes() if image.flags['C_CONTIGUOUS'] else image.copy().tobytes()
+        self.api.SetImageBytes(buffer, width, height, 1, width)
+
+        text = self.api.GetUTF8Text()
+        confidences = [max(float(conf), 0.0) for conf in self.api.AllWordConfidences()]
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+        if not lines or not confidences:
+            return '', 0.0
+        return '\n'.join(lines), sum(confidences) / len(confidences)
+
+
+OCR_BACKENDS = {
+    'pytesseract': PytesseractBackend,
+    'tesserocr': TesserocrBackend,
+}
+
+
+def parse_tesseract_config(config):
+    """Split a tesseract CLI config string into its page segmentation mode and -c variables"""
+    psm_match = re.search(r'--psm\s+(\d+)', config)
+    psm = int(psm_match.group(1)) if psm_match else 3
+    variables = dict(re.findall(r'-c\s+(\w+)=(\S+)', config))
+    return psm, variables
+
+
+def resolve_backend_name(name):
+    """Map a configured backend name ('auto' included) to one that can run here"""
+    if name == 'auto':
+        return 'tesserocr' if tesserocr is not None else 'pytesseract'
+    if name == 'tesserocr' and tesserocr is None:
+        print("tesserocr not installed, falling back to pytesseract. Install it with: pip install tesserocr")
+        return 'pytesseract'
+    if name not in OCR_BACKENDS:
+        raise ValueError(f"Unknown OCR backend: {name}")
+    return name
+
+
+def get_ocr_backend(name='auto'):
+    """Return this process's long-lived OCR backend, creating it on first use"""
+    global _backends, _backends_pid
+    if _backends_pid != os.getpid():
+        # Engines are not fork-safe, a forked child builds its own
+        _backends = {}
+        _backends_pid = os.getpid()
+    name = resolve_backend_name(name)
+    if name not in _backends:
+        try:
+            _backends[name] = OCR_BACKENDS[name]()
+        except RuntimeError as e:
+            # libtesseract could not load its language data
+            if name == 'pytesseract':
+                raise
+            print(f"Could not start {name} OCR engine ({e}), falling back to pytesseract")
+            _backends[name] = get_ocr_backend('pytesseract')
+    return _backends[name]
+
+
+def ocr_with_confidence(image, config, backend='auto'):
+    """
+    OCR an image and return the text with the mean per-word confidence (0-100)
+    """
+    return get_ocr_backend(backend).recognize(image, config)
+
+
+def get_ocr_pool(max_workers=None):
+    """Return this process's OCR process pool, creating it on first use"""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        _pool = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count())
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def reset_ocr_pool():
+    """Drop a broken pool so the next call starts a fresh one"""
+    global _pool
+    if _pool is not None and _pool_pid == os.getpid():
+        try:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        except BrokenProcessPool:
+            pass
+    _pool = None
+
+
+def shutdown_ocr_pool():
+    """Stop the pool's worker processes (e.g. on gunicorn worker exit)"""
+    global _pool
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.shutdown(wait=True, cancel_futures=True)
+    _pool = None
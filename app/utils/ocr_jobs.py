@@ -0,0 +1,377 @@
+"""Background jobs for camera-scan OCR.
+
+In job mode /camera-scan only stores the image and returns a job id; the
+job worker process (ocr_job_worker.py) claims jobs and runs the scans, and
+the client polls for the result. The request that uploads the image and
+each poll are over in milliseconds, and the scans' CPU time is spent
+outside the web workers, so they are no longer tied up for the length of
+an OCR cascade. With OCR_JOB_IN_WEB_WORKERS set the jobs are run by threads
+in each web worker instead; each job then takes a scan slot like an
+inline scan, so job mode is no way around the admission limits. An event
+stream of the result is also offered
+when OCR_JOB_EVENTS_ENABLED is set; an open stream holds its worker, so
+it is only for async worker classes (gevent, eventlet).
+
+Two brokers are available. The SQLite broker keeps jobs in a local file
+shared by every gunicorn worker and the job worker process, so any of
+them can answer for a job; no Redis or Celery is needed. The memory
+broker keeps jobs inside one process and is only suitable for
+single-process development servers; its jobs always run in that process.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from app.utils.error_handler import OCRQueueFullError
+
+# One runner (broker plus worker threads) per process
+_job_runner = None
+_job_runner_pid = None
+
+FINISHED_STATUSES = ('done', 'failed')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS ocr_jobs (
+    id TEXT PRIMARY KEY,
+    owner_id INTEGER,
+    status TEXT NOT NULL,
+    image BLOB,
+    params TEXT NOT NULL,
+    result TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS ix_ocr_jobs_status_created_at ON ocr_jobs (status, created_at);
+'''
+
+
+class MemoryJobBroker:
+    """Jobs kept in this process only"""
+
+    def __init__(self, max_queued=32, result_ttl=300):
+        self.pending = queue.Queue(maxsize=max_queued)
+        self.result_ttl = result_ttl
+        self.jobs = {}  # id -> job dict
+        self.finished = {}  # id -> threading.Event
+        self.lock = threading.Lock()
+
+    def submit(self, image, params, owner_id=None):
+        """Queue a scan image; raises OCRQueueFullError when the queue is full"""
+        job_id = uuid.uuid4().hex
+        with self.lock:
+            self.purge()
+            self.jobs[job_id] = new_job(job_id, owner_id)
+            self.finished[job_id] = threading.Event()
+        try:
+            self.pending.put_nowait((job_id, image, params))
+        except queue.Full:
+            with self.lock:
+                self.jobs.pop(job_id, None)
+                self.finished.pop(job_id, None)
+            raise OCRQueueFullError('OCR job queue is full')
+        return job_id
+
+    def claim(self, timeout=1.0):
+        """Take the oldest queued job as (job_id, image, params), or None"""
+        try:
+            job_id, image, params = self.pending.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job['status'] = 'running'
+                job['started_at'] = time.time()
+        return job_id, image, params
+
+    def finish(self, job_id, result, failed=False):
+        """Store a job's result and wake anyone waiting on it"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job.update(status='failed' if failed else 'done', result=result, finished_at=time.time())
+            self.finished[job_id].set()
+
+    def get(self, job_id):
+        """Current state of a job, or None if it is unknown or expired"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def wait(self, job_id, timeout):
+        """Block until the job finishes or the timeout passes, then return its state"""
+        event = self.finished.get(job_id)
+        if event is not None:
+            event.wait(timeout)
+        return self.get(job_id)
+
+    def stats(self):
+        with self.lock:
+            return count_statuses(job['status'] for job in self.jobs.values())
+
+    def purge(self):
+        """Forget finished jobs older than the result TTL (caller holds the lock)"""
+        cutoff = time.time() - self.result_ttl
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job['finished_at'] and job['finished_at'] < cutoff]:
+            del self.jobs[job_id]
+            del self.finished[job_id]
+
+
+class SQLiteJobBroker:
+    """Jobs kept in a local SQLite file shared by all worker processes"""
+
+    def __init__(self, path, max_queued=32, result_ttl=300, stale_after=300, poll_interval=0.2):
+        self.path = path
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+        # Wakes this process's workers and waiters without waiting for the next poll
+        self.changed = threading.Condition()
+        self.last_purged = 0.0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self.connect()
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def connect(self):
+        """Open a connection tuned for several processes sharing the file"""
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        return conn
+
+    def submit(self, image, params, owner_id=None):
+        """Queue a scan image; raises OCRQueueFullError when the queue is full"""
+        job_id = uuid.uuid4().hex
+        conn = self.connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            queued = conn.execute("SELECT COUNT(*) FROM ocr_jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.max_queued:
+                conn.execute('ROLLBACK')
+                raise OCRQueueFullError('OCR job queue is full')
+            conn.execute(
+                "INSERT INTO ocr_jobs (id, owner_id, status, image, params, created_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, owner_id, sqlite3.Binary(bytes(image)), json.dumps(params), time.time())
+            )
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+        with self.changed:
+            self.changed.notify_all()
+        return job_id
+
+    def claim(self, timeout=1.0):
+        """Take the oldest queued job as (job_id, image, params), or None"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self._claim_next()
+            if job is not None:
+                return job
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            # Jobs submitted through other processes are only seen by polling
+            with self.changed:
+                self.changed.wait(min(self.poll_interval, remaining))
+
+    def finish(self, job_id, result, failed=False):
+        """Store a job's result and drop its image"""
+        conn = self.connect()
+        try:
+            conn.execute(
+                'UPDATE ocr_jobs SET status = ?, result = ?, image = NULL, finished_at = ? WHERE id = ?',
+                ('failed' if failed else 'done', json.dumps(result), time.time(), job_id)
+            )
+        finally:
+            conn.close()
+        with self.changed:
+            self.changed.notify_all()
+
+    def get(self, job_id):
+        """Current state of a job, or None if it is unknown or expired"""
+        conn = self.connect()
+        try:
+            row = conn.execute(
+                'SELECT id, owner_id, status, result, created_at, started_at, finished_at FROM ocr_jobs WHERE id = ?',
+                (job_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return {
+            'id': row[0],
+            'owner_id': row[1],
+            'status': row[2],
+            'result': json.loads(row[3]) if row[3] else None,
+            'created_at': row[4],
+            'started_at': row[5],
+            'finished_at': row[6]
+        }
+
+    def wait(self, job_id, timeout):
+        """Block until the job finishes or the timeout passes, then return its state"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job['status'] in FINISHED_STATUSES or remaining <= 0:
+                return job
+            with self.changed:
+                self.changed.wait(min(self.poll_interval, remaining))
+
+    def stats(self):
+        conn = self.connect()
+        try:
+            rows = conn.execute('SELECT status, COUNT(*) FROM ocr_jobs GROUP BY status').fetchall()
+        finally:
+            conn.close()
+        counts = count_statuses([])
+        counts.update(dict(rows))
+        return counts
+
+    def purge(self, conn):
+        """Delete expired results and fail jobs whose worker died mid-scan"""
+        now = time.time()
+        conn.execute('DELETE FROM ocr_jobs WHERE finished_at < ?', (now - self.result_ttl,))
+        conn.execute(
+            "UPDATE ocr_jobs SET status = 'failed', result = ?, image = NULL, finished_at = ? "
+            "WHERE status = 'running' AND started_at < ?",
+            (json.dumps({'status': 'error', 'error': 'Scan was interrupted, please try again'}), now,
+             now - self.stale_after)
+        )
+        self.last_purged = time.monotonic()
+
+    def _claim_next(self):
+        conn = self.connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            if time.monotonic() - self.last_purged >= self.result_ttl / 4:
+                self.purge(conn)
+            row = conn.execute(
+                "SELECT id, image, params FROM ocr_jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE ocr_jobs SET status = 'running', started_at = ? WHERE id = ?",
+                             (time.time(), row[0]))
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            print(f"Error claiming OCR job: {e}")
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            row = None
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2])
+
+
+class JobRunner:
+    """A broker plus the threads in this process that work its queue, if any"""
+
+    def __init__(self, app, broker, handler, threads=2):
+        self.app = app
+        self.broker = broker
+        self.handler = handler
+        self.threads = [
+            threading.Thread(target=self._work, name=f'ocr-job-worker-{i}', daemon=True)
+            for i in range(threads)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, image, params, owner_id=None):
+        return self.broker.submit(image, params, owner_id)
+
+    def join(self):
+        """Block while the worker threads run, i.e. until the process is stopped"""
+        for thread in self.threads:
+            thread.join()
+
+    def _work(self):
+        while True:
+            job = self.broker.claim(timeout=1.0)
+            if job is None:
+                continue
+            job_id, image, params = job
+            try:
+                with self.app.app_context():
+                    result = self.handler(image, params)
+                self.broker.finish(job_id, result)
+            except Exception as e:
+                print(f"Error running OCR job {job_id}: {e}")
+                self.broker.finish(job_id, {'status': 'error', 'error': 'Error processing image'}, failed=True)
+
+
+def new_job(job_id, owner_id):
+    return {
+        'id': job_id,
+        'owner_id': owner_id,
+        'status': 'queued',
+        'result': None,
+        'created_at': time.time(),
+        'started_at': None,
+        'finished_at': None
+    }
+
+
+def count_statuses(statuses):
+    counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+    for status in statuses:
+        counts[status] = counts.get(status, 0) + 1
+    return counts
+
+
+def new_job_broker(config):
+    """The job broker selected by OCR_JOB_BROKER"""
+    if config.get('OCR_JOB_BROKER', 'sqlite') == 'memory':
+        return MemoryJobBroker(
+            max_queued=config.get('OCR_JOB_QUEUE_SIZE', 32),
+            result_ttl=config.get('OCR_JOB_RESULT_TTL', 300)
+        )
+    return SQLiteJobBroker(
+        config.get('OCR_JOB_DB_PATH', os.path.join('instance', 'ocr_jobs.db')),
+        max_queued=config.get('OCR_JOB_QUEUE_SIZE', 32),
+        result_ttl=config.get('OCR_JOB_RESULT_TTL', 300)
+    )
+
+
+def runs_jobs_in_web_workers(config):
+    """True when web workers run jobs themselves rather than leaving them to ocr_job_worker.py"""
+    return config.get('OCR_JOB_BROKER', 'sqlite') == 'memory' or config.get('OCR_JOB_IN_WEB_WORKERS', False)
+
+
+def get_job_runner(app, handler):
+    """
+    Return this web worker's job runner, creating the broker on first use.
+
+    The runner only submits and looks up jobs, unless jobs run in the web
+    workers; it then also starts the worker threads.
+    """
+    global _job_runner, _job_runner_pid
+    if _job_runner is None or _job_runner_pid != os.getpid():
+        config = app.config
+        threads = config.get('OCR_JOB_WORKERS', 2) if runs_jobs_in_web_workers(config) else 0
+        _job_runner = JobRunner(app, new_job_broker(config), handler, threads=threads)
+        _job_runner_pid = os.getpid()
+    return _job_runner
+
+
+def get_job_stats():
+    """Job counts by status, or None when job mode has not been used in this process"""
+    return _job_runner.broker.stats() if _job_runner is not None else None
@@ -0,0 +1,191 @@
+"""Stage timings and cascade win counters for the plate pipeline.
+
+Every scan records how long each stage took (decode, each enhancement,
+each tesseract call, pattern matching, the database lookup) into a
+per-process window, so /admin/ocr-metrics can show where scan time goes.
+
+Each plate the OCR cascade produces is credited to the (enhancement
+variant, PSM) pair that read it, and every pair a cascade ran counts as
+an attempt, also in cascades that read nothing, per station, since every
+station has a different camera. Once a station has enough wins its cascade tries the
+pairs with the best win rate first; with early exit that cuts the number
+of tesseract calls per scan. The cascade stops at the first winner, so
+raw win counts would only ever confirm the current order: rates are
+smoothed towards the average and a small share of scans tries the least
+tried pair first, so other pairs keep getting a chance. Wins and attempts
+are kept in the detection log too, so the ordering survives worker
+restarts and is shared by all workers.
+"""
+
+import random
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+
+# One set of stage timings and one win table per process
+_stage_metrics = None
+_pair_wins = None
+_pair_wins_built_at = 0.0
+_pair_wins_lock = threading.Lock()
+
+# Attempts' worth of the average win rate every pair starts with
+PRIOR_ATTEMPTS = 5
+
+
+@contextmanager
+def stage_timer(timings, stage):
+    """Add the time spent in the block, in ms, to timings[stage]"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] += (time.perf_counter() - started) * 1000
+
+
+class StageMetrics:
+    """Recent per-stage timings of this process"""
+
+    def __init__(self, window=500):
+        self.window = window
+        self.samples = defaultdict(lambda: deque(maxlen=self.window))
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+    def record(self, stage, elapsed_ms):
+        with self.lock:
+            self.samples[stage].append(elapsed_ms)
+            self.counts[stage] += 1
+
+    def record_all(self, timings):
+        """Record one scan's {stage: ms} timings"""
+        with self.lock:
+            for stage, elapsed_ms in timings.items():
+                self.samples[stage].append(elapsed_ms)
+                self.counts[stage] += 1
+
+    def stats(self):
+        """Count and mean/p50/p95 over the recent window, per stage"""
+        with self.lock:
+            stats = {}
+            for stage, samples in sorted(self.samples.items()):
+                ordered = sorted(samples)
+                stats[stage] = {
+                    'count': self.counts[stage],
+                    'mean_ms': round(sum(ordered) / len(ordered), 2),
+                    'p50_ms': round(ordered[len(ordered) // 2], 2),
+                    'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2)
+                }
+            return stats
+
+
+class PairWins:
+    """
+    How often each (variant, psm) pair was tried and read the plate, per station and overall.
+
+    A station's own counts decide its cascade order once it has min_wins
+    wins; until then the counts of all stations are used, and until
+    those reach min_wins too the default order stands.
+    """
+
+    def __init__(self, detections=(), min_wins=20, explore_rate=0.05):
+        self.min_wins = min_wins
+        self.explore_rate = explore_rate
+        self.by_station = defaultdict(lambda: (Counter(), Counter()))
+        self.overall = (Counter(), Counter())  # (wins, attempts)
+        self.lock = threading.Lock()
+        for station_id, variant, psm, tried in detections:
+            pair = (variant, psm) if variant is not None else None
+            self._add(station_id, pair, tried or ([pair] if pair else []))
+
+    def record(self, station_id, pair, tried=None):
+        """
+        Count one cascade: a win for `pair`, or none when it is None because
+        the cascade read nothing, and an attempt for every pair in `tried`,
+        the winner included
+        """
+        with self.lock:
+            self._add(station_id, pair, tried or ([pair] if pair else []))
+
+    def order(self, pairs, station_id=None):
+        """
+        Reorder (variant, psm) pairs, best smoothed win rate first.
+
+        Pairs with equal rates, and all pairs while there is too little
+        evidence, keep their order in `pairs`. In explore_rate of the calls
+        the least tried pair is moved to the front.
+        """
+        with self.lock:
+            wins, attempts = self.by_station.get(station_id) or self.overall
+            if sum(wins.values()) < self.min_wins:
+                wins, attempts = self.overall
+            if sum(wins.values()) < self.min_wins:
+                return list(pairs)
+            rank = {pair: i for i, pair in enumerate(pairs)}
+            average = sum(wins.values()) / max(sum(attempts.values()), 1)
+
+            def rate(pair):
+                return (wins[pair] + PRIOR_ATTEMPTS * average) / (attempts[pair] + PRIOR_ATTEMPTS)
+
+            ordered = sorted(pairs, key=lambda pair: (-rate(pair), rank[pair]))
+            if random.random() < self.explore_rate:
+                least_tried = min(ordered, key=lambda pair: (attempts[pair], rank[pair]))
+                ordered.remove(least_tried)
+                ordered.insert(0, least_tried)
+            return ordered
+
+    def stats(self, top=10):
+        """Most productive pairs overall and per station"""
+        def ranked(counts):
+            wins, attempts = counts
+            return [{'variant': variant, 'psm': psm, 'wins': count, 'attempts': attempts[(variant, psm)],
+                     'win_rate': round(count / attempts[(variant, psm)], 3)}
+                    for (variant, psm), count in wins.most_common(top)]
+
+        with self.lock:
+            return {
+                'overall': ranked(self.overall),
+                'stations': {str(station_id): ranked(counts)
+                             for station_id, counts in self.by_station.items() if station_id is not None}
+            }
+
+    def _add(self, station_id, pair, tried):
+        tables = [self.overall]
+        if station_id is not None:
+            tables.append(self.by_station[station_id])
+        for wins, attempts in tables:
+            if pair is not None:
+                wins[pair] += 1
+            attempts.update(tried)
+
+
+def get_stage_metrics():
+    """Return this process's stage timings"""
+    global _stage_metrics
+    if _stage_metrics is None:
+        _stage_metrics = StageMetrics()
+    return _stage_metrics
+
+
+def get_pair_wins(detection_log=None, min_wins=20, explore_rate=0.05, max_age=600, history=5000):
+    """Return this process's win counters, rebuilding them from the detection log when stale"""
+    global _pair_wins, _pair_wins_built_at
+    with _pair_wins_lock:
+        if _pair_wins is None or (detection_log is not None and time.monotonic() - _pair_wins_built_at > max_age):
+            detections = []
+            if detection_log is not None:
+                try:
+                    detections = detection_log.recent_wins(history)
+                except Exception as e:
+                    print(f"Error reading detection log for cascade order: {e}")
+            _pair_wins = PairWins(detections, min_wins, explore_rate)
+            _pair_wins_built_at = time.monotonic()
+        return _pair_wins
+
+
+def get_pipeline_stats():
+    """Stage timings and cascade wins for the metrics endpoint"""
+    return {
+        'stages': get_stage_metrics().stats(),
+        'cascade_wins': _pair_wins.stats() if _pair_wins is not None else None
+    }
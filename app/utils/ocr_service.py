@@ -0,0 +1,352 @@
+"""Shared OCR service for all web workers on a host.
+
+Without it every gunicorn worker keeps its own warm OCR engines and
+process pool, so memory and CPU use grow with the number of HTTP workers.
+The service (ocr_service.py) owns one pool of detector processes instead;
+web workers send it the scan image over a Unix domain socket and get the
+detection result back. OCR capacity is then sized to the CPUs, independent
+of HTTP concurrency.
+
+Each message is a fixed 12-byte header (magic, version, message type,
+metadata length, payload length), a small JSON metadata object and the raw
+payload bytes, so images cross the socket without any encoding. Requests
+beyond the service's pending limit are refused straight away with a busy
+reply rather than queued behind the others; web workers turn that into a
+503. A health request reports the pool size, load, counters and stage
+timings.
+
+A scan the service does not finish in time is not retried in the web
+worker: the service is overloaded at that point, and running the scan
+again in-process would push OCR back onto the web workers. Web workers
+wait a little longer than the service's own limit, so the service always
+gives up first.
+"""
+
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from app.utils.error_handler import OCRQueueFullError, OCRServiceUnavailableError, OCRServiceTimeoutError
+from app.utils.ocr_metrics import StageMetrics
+
+MAGIC = b'FL'
+PROTOCOL_VERSION = 1
+
+# magic, version, message type, metadata length, payload length
+HEADER = struct.Struct('!2sBBII')
+
+# Message types
+DETECT = 1
+HEALTH = 2
+RESULT = 3
+BUSY = 4
+ERROR = 5
+
+MAX_META_BYTES = 64 * 1024
+MAX_PAYLOAD_BYTES = 32 * 1024 * 1024
+
+# Seconds a web worker waits for a scan beyond the service's own limit
+CLIENT_TIMEOUT_MARGIN = 5.0
+
+# Detector of a service pool process, set up by init_worker
+_worker_detector = None
+
+
+def service_scan_timeout(time_budget):
+    """The service's limit on one scan, waiting for a pool process included"""
+    return time_budget * 2
+
+
+def client_timeout(time_budget, configured=None):
+    """How long a web worker waits for a scan: at least the service's limit plus a margin"""
+    return max(configured or 0.0, service_scan_timeout(time_budget) + CLIENT_TIMEOUT_MARGIN)
+
+
+class ProtocolError(Exception):
+    """A malformed or oversized message"""
+    pass
+
+
+def send_message(sock, kind, meta=None, payload=b''):
+    """Write one framed message"""
+    meta_bytes = json.dumps(meta or {}).encode()
+    sock.sendall(HEADER.pack(MAGIC, PROTOCOL_VERSION, kind, len(meta_bytes), len(payload)) + meta_bytes)
+    if payload:
+        sock.sendall(payload)
+
+
+def recv_exactly(sock, size):
+    """Read exactly size bytes into a new buffer; raises ConnectionError if the peer closes early"""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            raise ConnectionError('Connection closed mid-message')
+        received += count
+    return buffer
+
+
+def recv_message(sock):
+    """Read one framed message as (message type, metadata dict, payload bytearray)"""
+    magic, version, kind, meta_length, payload_length = HEADER.unpack(recv_exactly(sock, HEADER.size))
+    if magic != MAGIC or version != PROTOCOL_VERSION:
+        raise ProtocolError('Not an OCR service message')
+    if meta_length > MAX_META_BYTES or payload_length > MAX_PAYLOAD_BYTES:
+        raise ProtocolError('Message too large')
+    meta = json.loads(recv_exactly(sock, meta_length)) if meta_length else {}
+    payload = recv_exactly(sock, payload_length) if payload_length else bytearray()
+    return kind, meta, payload
+
+
+class OCRServiceClient:
+    """Sends scans to the OCR service; one short-lived connection per request"""
+
+    def __init__(self, socket_path, timeout=15.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def detect(self, image, station_id=None):
+        """
+        Run the plate pipeline on an image buffer in the service.
+
+        Returns the detect_plate result dict. Raises OCRQueueFullError when
+        the service is at capacity, OCRServiceTimeoutError when the scan is
+        not finished in time and OCRServiceUnavailableError when the service
+        cannot be reached or fails.
+        """
+        kind, meta = self.request(DETECT, {'station_id': station_id}, image)
+        if kind == BUSY:
+            raise OCRQueueFullError(meta.get('error', 'OCR service is busy'))
+        if kind == ERROR and meta.get('timed_out'):
+            raise OCRServiceTimeoutError(meta.get('error', 'Scan timed out in the OCR service'))
+        if kind != RESULT:
+            raise OCRServiceUnavailableError(meta.get('error', 'OCR service failed'))
+        if meta.get('pair'):
+            meta['pair'] = tuple(meta['pair'])
+        return meta
+
+    def health(self):
+        """The service's health report; raises OCRServiceUnavailableError when it is down"""
+        return self.request(HEALTH)[1]
+
+    def request(self, kind, meta=None, payload=b''):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+            send_message(sock, kind, meta, payload)
+            reply_kind, reply_meta, _ = recv_message(sock)
+            return reply_kind, reply_meta
+        except socket.timeout:
+            raise OCRServiceTimeoutError(f'OCR service did not answer within {self.timeout:g}s')
+        except (OSError, ProtocolError, ValueError) as e:
+            raise OCRServiceUnavailableError(f'OCR service unavailable: {e}')
+        finally:
+            sock.close()
+
+
+def worker_settings(config):
+    """Plate settings for the service's pool processes, taken from the app config"""
+    settings = {name: value for name, value in config.items()
+                if name.startswith('PLATE_') or name.startswith('CACHE_')}
+    settings.update(
+        # Each process runs its cascade inline; the service pool is the parallelism
+        PLATE_OCR_WORKERS=1,
+        PLATE_OCR_SERVICE_SOCKET=None,
+        # Vehicles are resolved by the web worker that asked
+        PLATE_INDEX_ENABLED=False
+    )
+    return settings
+
+
+def init_worker(settings):
+    """Pool initializer: build this process's detector under a minimal app config"""
+    global _worker_detector
+    from flask import Flask
+    from app import cache
+    from app.utils.plate_detector import PlateDetector
+
+    app = Flask('ocr_service')
+    app.config.update(settings)
+    cache.init_app(app)
+    app.app_context().push()
+    _worker_detector = PlateDetector()
+
+
+def detect_image(image, station_id):
+    """Pool task: run the plate pipeline on one image"""
+    return _worker_detector.detect_plate(image, station_id)
+
+
+class OCRService:
+    """
+    The service side: a process pool of warm detectors behind a Unix socket.
+
+    At most max_pending scans are admitted at once (running or waiting
+    for a pool process); further requests get a busy reply immediately.
+    A scan keeps its slot until the pool is done with it, also when the
+    web worker has stopped waiting, so slow scans cannot pile up in the
+    pool's queue behind a free-looking limit.
+    """
+
+    def __init__(self, socket_path, settings, workers=None, max_pending=None, timeout=30.0):
+        self.socket_path = socket_path
+        self.settings = settings
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 2
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        self.metrics = StageMetrics()
+        self.lock = threading.Lock()
+        self.counters = {'served': 0, 'rejected': 0, 'failed': 0, 'pool_restarts': 0}
+        self.in_flight = 0
+        # Timed-out scans the pool is still running; they hold their slots
+        self.abandoned = set()
+        self.started = time.monotonic()
+        self.pool = self.new_pool()
+        self.server = None
+
+    def new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker, initargs=(self.settings,))
+
+    def serve_forever(self):
+        """Bind the socket and answer requests until shutdown()"""
+        directory = os.path.dirname(self.socket_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.socket_path):
+            # Left behind by a service that did not shut down cleanly
+            os.unlink(self.socket_path)
+
+        service = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                service.handle_connection(self.request)
+
+        self.server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        self.server.daemon_threads = True
+        # Only the service user and its group (the web workers) may connect
+        os.chmod(self.socket_path, 0o660)
+        # Start the pool processes now so the first scans find warm engines
+        for future in [self.pool.submit(time.sleep, 0) for _ in range(self.workers)]:
+            future.result()
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        if self.server is not None:
+            self.server.shutdown()
+
+    def handle_connection(self, sock):
+        try:
+            kind, meta, payload = recv_message(sock)
+        except (OSError, ProtocolError, ValueError) as e:
+            try:
+                send_message(sock, ERROR, {'error': str(e)})
+            except OSError:
+                pass
+            return
+
+        if kind == HEALTH:
+            send_message(sock, RESULT, self.health())
+        elif kind == DETECT:
+            kind, reply = self.detect(payload, meta.get('station_id'))
+            try:
+                send_message(sock, kind, reply)
+            except OSError:
+                # The web worker stopped waiting for this scan
+                pass
+        else:
+            send_message(sock, ERROR, {'error': f'Unknown message type {kind}'})
+
+    def detect(self, image, station_id):
+        """Admit and run one scan; returns (reply message type, reply metadata)"""
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.counters['rejected'] += 1
+            return BUSY, {'error': 'OCR service is busy', 'max_pending': self.max_pending}
+
+        started = time.perf_counter()
+        with self.lock:
+            self.in_flight += 1
+        future = None
+        try:
+            pool = self.pool
+            future = pool.submit(detect_image, image, station_id)
+            # Frees the slot once the pool is done with the scan, however this request ends
+            future.add_done_callback(self.scan_finished)
+            result = future.result(timeout=self.timeout)
+            with self.lock:
+                self.counters['served'] += 1
+            self.metrics.record_all(result['timings'])
+            return RESULT, result
+        except BrokenProcessPool as e:
+            print(f"Error in OCR service pool, restarting it: {e}")
+            self.restart_pool(pool)
+            return self.failed(e)
+        except FutureTimeoutError:
+            # A scan still waiting for a pool process is dropped; a running one keeps its slot until it ends
+            if not future.cancel():
+                with self.lock:
+                    if not future.done():
+                        self.abandoned.add(future)
+            return self.failed('Scan timed out in the OCR service', timed_out=True)
+        except Exception as e:
+            print(f"Error in OCR service scan: {e}")
+            return self.failed(e)
+        finally:
+            self.metrics.record('service.request', (time.perf_counter() - started) * 1000)
+            if future is None:
+                # Never reached the pool
+                self.scan_finished(None)
+
+    def scan_finished(self, future):
+        """Release an admitted scan's slot once the pool has finished or dropped it"""
+        with self.lock:
+            self.in_flight -= 1
+            self.abandoned.discard(future)
+        self.slots.release()
+
+    def failed(self, error, timed_out=False):
+        with self.lock:
+            self.counters['failed'] += 1
+        return ERROR, {'error': str(error), 'timed_out': timed_out}
+
+    def restart_pool(self, broken_pool):
+        with self.lock:
+            # Several requests see the same broken pool, only replace it once
+            if self.pool is not broken_pool:
+                return
+            self.pool = self.new_pool()
+            self.counters['pool_restarts'] += 1
+        broken_pool.shutdown(wait=False, cancel_futures=True)
+
+    def health(self):
+        """Pool size, current load, counters and recent stage timings"""
+        with self.lock:
+            health = {
+                'status': 'busy' if self.in_flight >= self.max_pending else 'ok',
+                'pid': os.getpid(),
+                'uptime_s': round(time.monotonic() - self.started, 1),
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'in_flight': self.in_flight,
+                'abandoned': len(self.abandoned),
+                **self.counters
+            }
+        health['stages'] = self.metrics.stats()
+        return health
+
@@ -0,0 +1,122 @@
+"""Exact-match cache of plate detection results.
+
+Operators often re-submit the same frame when a scan feels slow. Results
+are keyed by a BLAKE2 hash of the uploaded image bytes (or of the pixels
+of an already decoded frame), so those retries are answered from memory
+without even decoding the image. Only byte-identical images match: two
+frames of different vehicles in the same framing must never share a
+result. A small in-process LRU sits in front of the shared Flask-Caching
+backend (Redis in production), which serves hits across gunicorn workers.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from flask import has_app_context
+
+# One cache per process
+_result_cache = None
+
+
+def content_hash(source):
+    """
+    Hex digest of a scan image: its encoded bytes, or the pixels and shape of a decoded frame
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(source, np.ndarray):
+        digest.update(repr((source.shape, source.dtype.str)).encode('ascii'))
+        digest.update(np.ascontiguousarray(source).data)
+    else:
+        digest.update(source)
+    return digest.hexdigest()
+
+
+class PlateResultCache:
+    def __init__(self, max_entries=256, ttl=120, shared_cache=None, key_prefix='plate_result:'):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared_cache = shared_cache
+        self.key_prefix = key_prefix
+        self.entries = OrderedDict()  # hash -> (expires_at, result)
+        self.lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def get(self, image_hash):
+        """Return the cached result for an image hash, else None"""
+        now = time.monotonic()
+        with self.lock:
+            result = self._get_local(image_hash, now)
+            if result is not None:
+                self.local_hits += 1
+                return result
+
+        result = self._get_shared(image_hash)
+        with self.lock:
+            if result is not None:
+                self.shared_hits += 1
+                self._put_local(image_hash, result, now)
+            else:
+                self.misses += 1
+        return result
+
+    def set(self, image_hash, result):
+        """Store a detection result locally and in the shared backend"""
+        with self.lock:
+            self._put_local(image_hash, result, time.monotonic())
+        if self.shared_cache is not None and has_app_context():
+            try:
+                self.shared_cache.set(self.key_prefix + image_hash, result, timeout=self.ttl)
+            except Exception as e:
+                print(f"Error writing plate result cache: {e}")
+
+    def stats(self):
+        """Hit/miss counters for this process"""
+        with self.lock:
+            lookups = self.local_hits + self.shared_hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'local_hits': self.local_hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.local_hits + self.shared_hits) / lookups, 3) if lookups else 0.0
+            }
+
+    def _get_local(self, image_hash, now):
+        entry = self.entries.get(image_hash)
+        if entry is not None and entry[0] > now:
+            self.entries.move_to_end(image_hash)
+            return entry[1]
+        return None
+
+    def _get_shared(self, image_hash):
+        if self.shared_cache is None or not has_app_context():
+            return None
+        try:
+            return self.shared_cache.get(self.key_prefix + image_hash)
+        except Exception as e:
+            # Cache backend is down, treat it as a miss
+            print(f"Error reading plate result cache: {e}")
+            return None
+
+    def _put_local(self, image_hash, result, now):
+        self.entries[image_hash] = (now + self.ttl, result)
+        self.entries.move_to_end(image_hash)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+def get_result_cache(max_entries=256, ttl=120, shared_cache=None):
+    """Return this process's result cache, creating it on first use"""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = PlateResultCache(max_entries=max_entries, ttl=ttl, shared_cache=shared_cache)
+    return _result_cache
+
+
+def get_result_cache_stats():
+    """Counters of this process's result cache, or None when it has not been used"""
+    return _result_cache.stats() if _result_cache is not None else None
@@ -0,0 +1,269 @@
+"""Position-aware OCR correction for Indian number plates.
+
+Raw OCR strings are mapped to the most likely valid plate in one pass:
+every plate layout that fits the reading (state code, RTO district, series,
+number, or the Bharat series) is scored, and characters that do not fit
+their position's class are swapped for the character OCR most often
+confuses them with. Confusion costs start from a static table of common
+Tesseract mix-ups and are refined with counts mined from the detection log,
+from detections labelled with the registered or operator-entered number.
+Learning from the corrector's own output instead would only reinforce its
+mistakes.
+"""
+
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+
+# State and union territory codes, with the highest RTO district number in
+# use. Used as a soft prior: unknown codes or out-of-range districts are
+# penalized, not rejected.
+STATE_RTO_CODES = {
+    'AN': 1, 'AP': 40, 'AR': 22, 'AS': 34, 'BR': 57, 'CG': 30, 'CH': 4, 'DD': 3,
+    'DL': 14, 'DN': 9, 'GA': 12, 'GJ': 39, 'HP': 99, 'HR': 99, 'JH': 24, 'JK': 22,
+    'KA': 71, 'KL': 99, 'LA': 2, 'LD': 9, 'MH': 51, 'ML': 10, 'MN': 7, 'MP': 71,
+    'MZ': 8, 'NL': 10, 'OD': 35, 'OR': 35, 'PB': 99, 'PY': 5, 'RJ': 59, 'SK': 6,
+    'TN': 99, 'TR': 8, 'TS': 38, 'TG': 38, 'UA': 20, 'UK': 20, 'UP': 96, 'WB': 98,
+}
+
+# Characters Tesseract commonly reads in place of another, as
+# observed -> [(intended, relative weight)]
+STATIC_CONFUSIONS = {
+    '0': [('O', 1.0), ('D', 0.6), ('Q', 0.4), ('U', 0.2)],
+    '1': [('I', 1.0), ('L', 0.4), ('T', 0.3), ('J', 0.2)],
+    '2': [('Z', 1.0)],
+    '3': [('B', 0.3), ('J', 0.2)],
+    '4': [('A', 1.0)],
+    '5': [('S', 1.0)],
+    '6': [('G', 1.0), ('B', 0.3)],
+    '7': [('T', 1.0), ('Z', 0.2)],
+    '8': [('B', 1.0)],
+    '9': [('G', 0.5), ('Q', 0.3)],
+    'O': [('0', 1.0), ('D', 0.4), ('Q', 0.3)],
+    'D': [('0', 1.0), ('O', 0.5)],
+    'Q': [('0', 1.0), ('O', 0.6)],
+    'U': [('0', 0.3), ('V', 0.5)],
+    'I': [('1', 1.0), ('L', 0.3)],
+    'L': [('1', 1.0), ('I', 0.3)],
+    'J': [('1', 0.4), ('3', 0.2)],
+    'T': [('7', 1.0), ('1', 0.4)],
+    'Z': [('2', 1.0), ('7', 0.2)],
+    'A': [('4', 1.0)],
+    'S': [('5', 1.0)],
+    'G': [('6', 1.0), ('9', 0.3), ('C', 0.3)],
+    'B': [('8', 1.0), ('3', 0.3)],
+    'M': [('N', 0.5), ('H', 0.3), ('W', 0.3)],
+    'N': [('M', 0.5), ('H', 0.3)],
+    'H': [('M', 0.4), ('N', 0.3)],
+    'W': [('M', 0.4), ('V', 0.3)],
+    'V': [('U', 0.5), ('W', 0.3)],
+    'C': [('G', 0.4), ('0', 0.2)],
+}
+
+# Layout priors: how unusual each district/series length is
+RTO_LENGTH_COST = {2: 0.0, 1: 0.5}
+SERIES_LENGTH_COST = {2: 0.0, 1: 0.3, 3: 0.6, 0: 0.8}
+
+# Extra costs applied while scoring a reading
+UNKNOWN_STATE_COST = 2.0
+RTO_OUT_OF_RANGE_COST = 1.0
+DROPPED_CHAR_COST = 0.4
+
+# Weight of the static table relative to mined counts
+PRIOR_STRENGTH = 5.0
+
+# Letters never issued in a series, so a reading's I or O before the number
+# is a misread digit rather than the end of the series
+SERIES_UNUSED_LETTERS = 'IO'
+
+
+def build_layouts():
+    """
+    Precompile plate layouts as (class string, layout cost, kind, RTO length) keyed by length.
+
+    Class strings use L for a letter and D for a digit; B and H mark the
+    fixed letters of the Bharat series.
+    """
+    layouts = defaultdict(list)
+    for rto_length, rto_cost in RTO_LENGTH_COST.items():
+        for series_length, series_cost in SERIES_LENGTH_COST.items():
+            classes = 'LL' + 'D' * rto_length + 'L' * series_length + 'DDDD'
+            layouts[len(classes)].append((classes, rto_cost + series_cost, 'state', rto_length))
+    # Bharat series: YY BH NNNN XX (one or two letters)
+    for suffix_length in (1, 2):
+        classes = 'DDBHDDDD' + 'L' * suffix_length
+        layouts[len(classes)].append((classes, 0.0, 'bharat', 0))
+    return dict(layouts)
+
+
+PLATE_LAYOUTS = build_layouts()
+MIN_PLATE_LENGTH = min(PLATE_LAYOUTS)
+MAX_PLATE_LENGTH = max(PLATE_LAYOUTS)
+
+
+class PlateCorrector:
+    def __init__(self, detections=None):
+        self.substitutions = self.compile_substitutions(self.mine_confusions(detections or []))
+
+    @staticmethod
+    def mine_confusions(detections):
+        """
+        Count observed -> actual character pairs from (label, raw_text) detection history.
+
+        The label is the number the scan was resolved to without the
+        corrector (the registered vehicle, or the operator's entry). Raw OCR
+        lines with the same length as the label are aligned position by
+        position; the differences are the confusions OCR made. Detections
+        without a label are skipped.
+        """
+        counts = defaultdict(lambda: defaultdict(int))
+        for detection in detections:
+            label, raw_text = detection[0], detection[1]
+            if not label or not raw_text:
+                continue
+            for line in raw_text.splitlines():
+                reading = re.sub(r'[^A-Z0-9]', '', line.upper())
+                if len(reading) != len(label) or reading == label:
+                    continue
+                for observed, actual in zip(reading, label):
+                    if observed != actual:
+                        counts[observed][actual] += 1
+        return counts
+
+    @staticmethod
+    def compile_substitutions(counts):
+        """
+        Merge mined counts with the static table into substitution costs.
+
+        Returns observed -> {'L': [(char, cost)], 'D': [(char, cost)]}, sorted
+        cheapest first, where cost is the negative log-probability of the
+        substitution.
+        """
+        substitutions = {}
+        observed_chars = set(STATIC_CONFUSIONS) | set(counts)
+        for observed in observed_chars:
+            weights = defaultdict(float)
+            for actual, weight in STATIC_CONFUSIONS.get(observed, []):
+                weights[actual] += weight * PRIOR_STRENGTH
+            for actual, count in counts.get(observed, {}).items():
+                weights[actual] += count
+            total = sum(weights.values()) + PRIOR_STRENGTH
+            options = {'L': [], 'D': []}
+            for actual, weight in weights.items():
+                cost = -math.log(weight / total)
+                options['D' if actual.isdigit() else 'L'].append((actual, cost))
+            for key in options:
+                options[key].sort(key=lambda option: option[1])
+            substitutions[observed] = options
+        return substitutions
+
+    def options(self, char, char_class):
+        """Candidate characters for one position of the given class, as (char, cost)"""
+        if char_class in ('B', 'H'):
+            if char == char_class:
+                return [(char, 0.0)]
+            for actual, cost in self.substitutions.get(char, {}).get('L', []):
+                if actual == char_class:
+                    return [(actual, cost)]
+            return []
+        wanted = 'D' if char_class == 'D' else 'L'
+        if (wanted == 'D') == char.isdigit():
+            # Already the right class; same-class swaps only matter for the state code
+            return [(char, 0.0)] + self.substitutions.get(char, {}).get(wanted, [])
+        return self.substitutions.get(char, {}).get(wanted, [])
+
+    def score_layout(self, reading, classes, layout_cost, kind, rto_length):
+        """Best (plate, cost) for a reading under one layout, or None if it cannot fit"""
+        cost = layout_cost
+        chars = []
+        start = 0
+        if kind == 'state':
+            state, state_cost = self.best_state_code(reading[0], reading[1])
+            if state is None:
+                return None
+            chars.append(state)
+            cost += state_cost
+            start = 2
+
+        for char, char_class in zip(reading[start:], classes[start:]):
+            options = self.options(char, char_class)
+            if char_class in 'DL':
+                # Keep the reading's character when it fits; swap only across classes
+                options = options[:1]
+            if not options:
+                return None
+            chars.append(options[0][0])
+            cost += options[0][1]
+
+        # A letter opening the number block is the end of the series with a
+        # digit lost (KA01AB123), not a misread digit: turning it into one
+        # would invent a different, valid-looking plate
+        number_start = classes.rfind('DDDD')
+        if reading[number_start].isalpha() and reading[number_start] not in SERIES_UNUSED_LETTERS:
+            return None
+
+        plate = ''.join(chars)
+        if kind == 'state':
+            rto = int(plate[2:2 + rto_length])
+            max_rto = STATE_RTO_CODES.get(plate[:2])
+            if rto == 0 or (max_rto is not None and rto > max_rto):
+                cost += RTO_OUT_OF_RANGE_COST
+        return plate, cost
+
+    def best_state_code(self, first, second):
+        """Cheapest pair of letters for the state code, preferring known codes"""
+        best = (None, float('inf'))
+        for a, cost_a in self.options(first, 'L'):
+            for b, cost_b in self.options(second, 'L'):
+                cost = cost_a + cost_b
+                if a + b not in STATE_RTO_CODES:
+                    cost += UNKNOWN_STATE_COST
+                if cost < best[1]:
+                    best = (a + b, cost)
+        return best
+
+    def correct(self, text):
+        """
+        Map raw OCR text to the most likely valid plate.
+
+        Returns (plate, cost), where cost is a negative log-likelihood (0 for
+        a reading that already fits a common layout), or (None, inf).
+        """
+        best = (None, float('inf'))
+        for line in text.upper().splitlines() + [text.upper()]:
+            reading = re.sub(r'[^A-Z0-9]', '', line)
+            for length in range(min(len(reading), MAX_PLATE_LENGTH), MIN_PLATE_LENGTH - 1, -1):
+                dropped_cost = (len(reading) - length) * DROPPED_CHAR_COST
+                if dropped_cost >= best[1]:
+                    break
+                for offset in range(len(reading) - length + 1):
+                    window = reading[offset:offset + length]
+                    for classes, layout_cost, kind, rto_length in PLATE_LAYOUTS.get(length, []):
+                        scored = self.score_layout(window, classes, layout_cost, kind, rto_length)
+                        if scored and scored[1] + dropped_cost < best[1]:
+                            best = (scored[0], scored[1] + dropped_cost)
+        return best
+
+
+# One corrector per process, rebuilt periodically from the detection log
+_corrector = None
+_corrector_built_at = 0.0
+_corrector_lock = threading.Lock()
+
+
+def get_plate_corrector(detection_log=None, max_age=3600, history=5000):
+    """Return this process's corrector, rebuilding it from recent labelled detections when stale"""
+    global _corrector, _corrector_built_at
+    with _corrector_lock:
+        if _corrector is None or time.monotonic() - _corrector_built_at > max_age:
+            detections = []
+            if detection_log is not None:
+                try:
+                    detections = detection_log.recent(history)
+                except Exception as e:
+                    print(f"Error reading detection log for plate corrections: {e}")
+            _corrector = PlateCorrector(detections)
+            _corrector_built_at = time.monotonic()
+        return _corrector
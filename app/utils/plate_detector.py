@@ -1,310 +1,579 @@
-import cv2
 import numpy as np
-import pytesseract
-from PIL import Image
 import re
-import pickle
 import os
-from datetime import datetime
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app
 from app.models import Vehicle
-from app import db
+from app import db, cache
+from app.utils.ocr_engine import ocr_with_confidence, get_ocr_pool, reset_ocr_pool
+from app.utils.plate_localizer import PlateLocalizer
+from app.utils.image_ingest import ImageIngestor
+from app.utils.plate_cache import content_hash, get_result_cache
+from app.utils.detection_log import get_detection_log
+from app.utils.plate_corrector import get_plate_corrector
+from app.utils.plate_index import get_plate_index
+from app.utils.ocr_metrics import stage_timer, get_stage_metrics, get_pair_wins
+from app.utils.plate_enhance import ENHANCEMENT_VARIANTS, EnhancementGraph
+from app.utils.image_quality import RETAKE_MESSAGES, ImageQualityGate
+from app.utils.char_recognizer import get_char_recognizer
+from app.utils.ocr_service import OCRServiceClient, client_timeout
+from app.utils.error_handler import ImageRejectedError, OCRServiceUnavailableError, OCRServiceTimeoutError
+
+# Tesseract configurations tried against each enhanced image, in cascade order.
+# PSM 7 (single text line) fits a plate best, so it is tried first.
+OCR_CONFIGS = [
+    r'--oem 3 --psm 7 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
+    r'--oem 3 --psm 8 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
+    r'--oem 3 --psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
+    r'--oem 3 --psm 13 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
+]
+
+# Page segmentation mode of each config, for metrics and cascade ordering
+OCR_CONFIG_PSMS = [int(re.search(r'--psm (\d+)', config).group(1)) for config in OCR_CONFIGS]
+
+# Common patterns for Indian number plates
+PLATE_PATTERNS = [
+    re.compile(r'[A-Z]{2}[0-9]{1,2}[A-Z]{1,3}[0-9]{1,4}'),  # Standard format: XX00XXX0000
+    re.compile(r'[A-Z]{2}[0-9]{2}[A-Z]{1,2}[0-9]{1,4}'),    # Alternative format
+    re.compile(r'[A-Z]{3}[0-9]{1,4}'),                        # Three letters followed by numbers
+    re.compile(r'[A-Z]{2}[0-9]{4}'),                          # Two letters followed by 4 digits
+    re.compile(r'[A-Z]{2}[0-9]{1,2}[A-Z]{1,2}[0-9]{1,4}'),   # Another common format
+    re.compile(r'[A-Z]{2}[0-9]{1,2}[A-Z]{1}[0-9]{1,4}'),     # Another format
+    re.compile(r'[A-Z0-9]{3,10}'),                           # General alphanumeric pattern
+]
+
+# Pickle file the detection log imports once when it is first created
+LEGACY_LEARNING_FILE = 'plate_detection_learning.pkl'
+
+# Confidence points a reading loses per unit of correction cost (negative
+# log-likelihood), so heavily corrected readings need a clearer OCR result
+# before they stop the cascade
+CORRECTION_CONFIDENCE_PENALTY = 10
+
+
+# (variant index, config index) pairs in the default cascade order: every
+# config against the first variant, then every config against the next
+DEFAULT_PAIR_ORDER = [(variant, config) for variant in range(len(ENHANCEMENT_VARIANTS))
+                      for config in range(len(OCR_CONFIGS))]
+
+
+def cascade_pairs(enhanced_sets, pair_order=DEFAULT_PAIR_ORDER):
+    """
+    Yield (enhanced image, tesseract config, (variant name, psm)) in cascade order
+
+    `enhanced_sets` holds the enhanced images (an EnhancementGraph) of each plate region;
+    each region is worked through in `pair_order` before the next.
+    """
+    for enhanced_images in enhanced_sets:
+        for variant, config in pair_order:
+            yield enhanced_images[variant], OCR_CONFIGS[config], (ENHANCEMENT_VARIANTS[variant], OCR_CONFIG_PSMS[config])
+
+
+def timed_ocr(image, config, backend):
+    """OCR one image; returns (text, confidence, elapsed ms) so pool workers report their own time"""
+    started = time.perf_counter()
+    text, confidence = ocr_with_confidence(image, config, backend)
+    return text, confidence, (time.perf_counter() - started) * 1000
+
+
+def get_setting(name, default):
+    """Read a setting from the active Flask app config, falling back to the default"""
+    try:
+        return current_app.config.get(name, default)
+    except RuntimeError:
+        # Outside an application context (CLI tools, worker processes)
+        return default
+
 
 class PlateDetector:
-    def __init__(self):
+    def __init__(self, confidence_threshold=None, time_budget=None, ocr_workers=None, localize=None,
+                 ocr_backend=None):
         # Configure tesseract
         # You might need to set the path to tesseract executable on Windows
         # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-        pass
+        if confidence_threshold is None:
+            confidence_threshold = get_setting('PLATE_OCR_CONFIDENCE_THRESHOLD', 70)
+        if time_budget is None:
+            time_budget = get_setting('PLATE_OCR_TIME_BUDGET', 8.0)
+        if ocr_workers is None:
+            ocr_workers = get_setting('PLATE_OCR_WORKERS', os.cpu_count() or 1)
+        self.confidence_threshold = confidence_threshold
+        self.time_budget = time_budget
+        self.ocr_workers = ocr_workers
+        self.ocr_backend = ocr_backend or get_setting('PLATE_OCR_BACKEND', 'auto')
+        if localize is None:
+            localize = get_setting('PLATE_LOCALIZATION_ENABLED', True)
+        self.localizer = PlateLocalizer(get_setting('PLATE_MAX_REGIONS', 3)) if localize else None
+        self.result_cache = None
+        if get_setting('PLATE_RESULT_CACHE_ENABLED', True):
+            self.result_cache = get_result_cache(
+                max_entries=get_setting('PLATE_RESULT_CACHE_SIZE', 256),
+                ttl=get_setting('PLATE_RESULT_CACHE_TTL', 120),
+                shared_cache=cache
+            )
+        self.detection_log = None
+        if get_setting('PLATE_DETECTION_LOG_ENABLED', True):
+            self.detection_log = get_detection_log(
+                get_setting('PLATE_DETECTION_LOG_PATH', os.path.join('instance', 'plate_detections.db')),
+                max_age_days=get_setting('PLATE_DETECTION_LOG_MAX_AGE_DAYS', 90),
+                max_rows=get_setting('PLATE_DETECTION_LOG_MAX_ROWS', 50000),
+                legacy_path=LEGACY_LEARNING_FILE
+            )
+        # Batch runs read what was learned without adding their own detections
+        self.learning = get_setting('PLATE_LEARNING_ENABLED', True)
+        # Position-aware corrector, rebuilt periodically from the detection log
+        self.corrector = get_plate_corrector(self.detection_log)
+        self.max_correction_cost = get_setting('PLATE_CORRECTION_MAX_COST', 3.0)
+        self.plate_index = None
+        if get_setting('PLATE_INDEX_ENABLED', True):
+            self.plate_index = get_plate_index(
+                max_distance=get_setting('PLATE_INDEX_MAX_DISTANCE', 2),
+                refresh_interval=get_setting('PLATE_INDEX_REFRESH_INTERVAL', 60)
+            )
+        # Cascade order learned from which (variant, PSM) pairs read plates
+        self.adaptive_order = get_setting('PLATE_CASCADE_ADAPTIVE', True)
+        self.pair_wins = get_pair_wins(self.detection_log, min_wins=get_setting('PLATE_CASCADE_MIN_WINS', 20),
+                                       explore_rate=get_setting('PLATE_CASCADE_EXPLORE_RATE', 0.05))
+        self.stage_metrics = get_stage_metrics()
+        self.ingestor = ImageIngestor(
+            working_max_side=get_setting('PLATE_WORKING_MAX_SIDE', 1280),
+            max_pixels=get_setting('PLATE_MAX_IMAGE_PIXELS', 40000000)
+        )
+        self.quality_gate = None
+        if get_setting('PLATE_QUALITY_GATE_ENABLED', True):
+            self.quality_gate = ImageQualityGate(
+                min_sharpness=get_setting('PLATE_QUALITY_MIN_SHARPNESS', 80.0),
+                min_brightness=get_setting('PLATE_QUALITY_MIN_BRIGHTNESS', 35),
+                max_brightness=get_setting('PLATE_QUALITY_MAX_BRIGHTNESS', 225),
+                max_glare=get_setting('PLATE_QUALITY_MAX_GLARE', 0.15)
+            )
+        # Scans are sent to the shared OCR service when one is configured
+        self.char_recognizer = None
+        if get_setting('PLATE_FAST_PATH_ENABLED', True):
+            self.char_recognizer = get_char_recognizer(
+                get_setting('PLATE_CHAR_MODEL_PATH', os.path.join('instance', 'plate_chars.npz'))
+            )
+        self.fast_path_threshold = get_setting('PLATE_FAST_PATH_MIN_CONFIDENCE', 85)
+        self.service = None
+        self.service_fallback = get_setting('PLATE_OCR_SERVICE_FALLBACK', True)
+        service_socket = get_setting('PLATE_OCR_SERVICE_SOCKET', None)
+        if service_socket:
+            # Wait out the service's own limit, so a slow scan is not abandoned mid-run
+            self.service = OCRServiceClient(service_socket, timeout=client_timeout(
+                self.time_budget, get_setting('PLATE_OCR_SERVICE_TIMEOUT', 25.0)))
     
-    def detect_plate_from_image(self, image_path):
+    def detect_plate(self, source, station_id=None):
         """
-        Detect number plate from an image file
+        Detect number plate from an in-memory image buffer.
+
+        `source` may be raw bytes, a bytearray/memoryview, a file-like
+        upload stream (e.g. a werkzeug FileStorage) or an already decoded
+        video frame (numpy array). The image is decoded in memory to a
+        bounded grayscale working image, nothing is written to disk.
+        `station_id` selects the cascade order learned for that station's
+        camera. Returns a result dict with the detected plate (or None) and
+        the raw OCR text it came from; `format_valid` is set when the plate
+        fits a registration layout, `rejected` when the image was refused
+        before decoding, `retake` names the quality check a hopeless frame
+        failed (it is then not OCR'd), `quality` holds the measurements,
+        `recognizer` says whether character segmentation or the Tesseract
+        cascade read the plate, `pair` names the (variant, psm) that read
+        it, `tried` the pairs the cascade ran, and `timings` holds the ms
+        spent per stage.
+
+        Nothing is learned here: once the caller has resolved the scan to a
+        registered vehicle or a number the operator entered, it passes the
+        result to learn_from_detection with that label.
+
+        With an OCR service configured, image buffers are detected there;
+        raises OCRQueueFullError when it is at capacity and
+        OCRServiceTimeoutError when it does not finish the scan in time.
         """
+        if self.service is not None and not isinstance(source, np.ndarray):
+            if hasattr(source, 'read'):
+                source = source.read()
+            try:
+                result = self.service.detect(source, station_id)
+                self.stage_metrics.record_all(result['timings'])
+                return result
+            except OCRServiceUnavailableError as e:
+                # A timed-out service is overloaded; OCR in the web worker would only add to the load
+                if not self.service_fallback or isinstance(e, OCRServiceTimeoutError):
+                    raise
+                print(f"Error reaching OCR service, scanning in-process: {e}")
+
+        started = time.monotonic()
+        deadline = started + self.time_budget
+        timings = defaultdict(float)
+        result = {
+            'plate': None,
+            'raw_text': '',
+            'confidence': 0.0,
+            'ocr_calls': 0,
+            'timed_out': False,
+            'regions': 0,
+            'elapsed_ms': 0.0,
+            'rejected': False,
+            'cached': False,
+            'format_valid': False,
+            'retake': None,
+            'quality': None,
+            'recognizer': None,
+            'pair': None,
+            'tried': [],
+            'timings': {},
+            'error': None
+        }
+        enhanced_sets = []
         try:
-            # Load image
-            img = cv2.imread(image_path)
-            if img is None:
-                return None
-            
-            # Apply advanced image enhancement techniques
-            enhanced_images = self.enhance_image_for_plate_detection(img)
-            
-            # Try OCR on different enhanced versions of the image
-            text_options = []
-            
-            # Define custom configs for tesseract
-            custom_config = r'--oem 3 --psm 8 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
-            custom_config_psm6 = r'--oem 3 --psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
-            custom_config_psm7 = r'--oem 3 --psm 7 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
-            custom_config_psm13 = r'--oem 3 --psm 13 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
-            
-            # Process each enhanced image with different OCR configurations
-            for i, enhanced_img in enumerate(enhanced_images):
-                # Try with default config
-                text1 = pytesseract.image_to_string(enhanced_img, config=custom_config)
-                text_options.append(text1)
-                
-                # Try with PSM 6
-                text2 = pytesseract.image_to_string(enhanced_img, config=custom_config_psm6)
-                text_options.append(text2)
-                
-                # Try with PSM 7
-                text3 = pytesseract.image_to_string(enhanced_img, config=custom_config_psm7)
-                text_options.append(text3)
-                
-                # Try with PSM 13
-                text4 = pytesseract.image_to_string(enhanced_img, config=custom_config_psm13)
-                text_options.append(text4)
-            
-            # Common patterns for Indian number plates
-            plate_patterns = [
-                r'[A-Z]{2}[0-9]{1,2}[A-Z]{1,3}[0-9]{1,4}',  # Standard format: XX00XXX0000
-                r'[A-Z]{2}[0-9]{2}[A-Z]{1,2}[0-9]{1,4}',    # Alternative format
-                r'[A-Z]{3}[0-9]{1,4}',                        # Three letters followed by numbers
-                r'[A-Z]{2}[0-9]{4}',                          # Two letters followed by 4 digits
-                r'[A-Z]{2}[0-9]{1,2}[A-Z]{1,2}[0-9]{1,4}',   # Another common format
-                r'[A-Z]{2}[0-9]{1,2}[A-Z]{1}[0-9]{1,4}',     # Another format
-                r'[A-Z0-9]{3,10}'                            # General alphanumeric pattern
-            ]
-            
-            detected_plate = None
-            
-            # Check each text option
-            for text in text_options:
-                for pattern in plate_patterns:
-                    matches = re.findall(pattern, text)
-                    if matches:
-                        detected_plate = matches[0]
-                        break
-                if detected_plate:
-                    break
-            
-            # If still no detection, try combining lines from multi-line OCR
-            if not detected_plate:
-                for text in text_options:
-                    lines = text.strip().split('\n')
-                    if len(lines) >= 2:
-                        # Try combining consecutive lines to form a plate
-                        for i in range(len(lines) - 1):
-                            combined = re.sub(r'[^A-Za-z0-9]', '', lines[i] + lines[i+1])
-                            for pattern in plate_patterns:
-                                matches = re.findall(pattern, combined)
-                                if matches:
-                                    detected_plate = matches[0]
-                                    break
-                            if detected_plate:
-                                break
-                    if detected_plate:
-                        break
-            
-            # If no pattern matches, return the most alphanumeric text from all options
+            # Re-submitted images are answered from the result cache before decoding
+            image_hash = None
+            if self.result_cache is not None:
+                with stage_timer(timings, 'result_cache'):
+                    if hasattr(source, 'read'):
+                        source = source.read()
+                    cached = None
+                    if source is not None and len(source):
+                        image_hash = content_hash(source)
+                        cached = self.result_cache.get(image_hash)
+                if cached is not None:
+                    result.update(cached)
+                    result['cached'] = True
+                    return self.finish_result(result, timings, started)
+
+            with stage_timer(timings, 'decode'):
+                gray = self.decode_image(source)
+
+            # Localize plate regions first so only small crops are enhanced and OCR'd
+            with stage_timer(timings, 'localize'):
+                regions = self.localizer.localize(gray) if self.localizer else []
+            result['regions'] = len(regions)
+
+            # Blurred, badly exposed or glare-washed plates are sent back for a
+            # retake; they are judged on the plate crops, not the whole frame
+            if self.quality_gate is not None:
+                with stage_timer(timings, 'quality'):
+                    retake, result['quality'] = self.quality_gate.check(gray, regions)
+                if retake:
+                    result['retake'] = retake
+                    result['error'] = RETAKE_MESSAGES[retake]
+                    return self.finish_result(result, timings, started)
+
+            # Read the plate crops by character segmentation first; Tesseract
+            # only runs when that reading is not confident enough
+            cascade = None
+            recognizer = 'segmentation'
+            if self.char_recognizer is not None and regions:
+                cascade = self.run_fast_path(regions, timings)
+                if cascade['confidence'] < self.fast_path_threshold:
+                    cascade = None
+
+            if cascade is None:
+                recognizer = 'tesseract'
+                # Apply advanced image enhancement techniques; each variant is only
+                # computed once the cascade reaches it
+                enhanced_sets = [self.enhance_image_for_plate_detection(region, timings) for region in regions]
+                if not enhanced_sets:
+                    # Nothing plate-shaped was found, fall back to the whole frame
+                    enhanced_sets = [self.enhance_image_for_plate_detection(gray, timings)]
+
+                # Run the OCR cascade, stopping at the first confident plate
+                cascade = self.run_ocr_cascade(enhanced_sets, deadline, self.pair_order(station_id), timings)
+            result.update({
+                'confidence': cascade['confidence'],
+                'ocr_calls': cascade['ocr_calls'],
+                'timed_out': cascade['timed_out'],
+                'format_valid': cascade['plate'] is not None,
+                'recognizer': recognizer,
+                'pair': cascade['pair'],
+                'tried': cascade['tried']
+            })
+            # The raw readings, one OCR line per line so the corrector can
+            # align each of them with the label the caller learns them under
+            result['raw_text'] = '\n'.join(cascade['texts'])
+
+            detected_plate = cascade['plate']
             if not detected_plate:
-                all_text = ' '.join(text_options)
-                alphanumeric_text = re.sub(r'[^A-Za-z0-9]', '', all_text)
-                if len(alphanumeric_text) >= 3:
-                    # Try to find the most likely plate format
-                    for pattern in plate_patterns[:-1]:  # Exclude the general pattern for this check
-                        matches = re.findall(pattern, all_text)
-                        if matches:
-                            detected_plate = matches[0]
-                            break
-                    
-                    if not detected_plate and len(alphanumeric_text) >= 3:
-                        detected_plate = alphanumeric_text[:10]  # Limit to 10 characters
-            
+                # Nothing corrected to a valid plate, fall back to the loose patterns
+                with stage_timer(timings, 'pattern_match'):
+                    detected_plate = self.extract_plate_from_text(cascade['texts'])
+
             # Validate the detected plate - ensure it has a proper format
             if detected_plate:
-                # Store the original text for learning purposes
-                original_text = ' '.join(text_options)
-                detected_plate = self.validate_and_correct_plate(detected_plate)
-                # Learn from this detection to improve future accuracy
-                self.learn_from_detection(original_text, detected_plate)
-            
-            return detected_plate
+                with stage_timer(timings, 'pattern_match'):
+                    detected_plate = self.validate_and_correct_plate(detected_plate)
+
+            result['plate'] = detected_plate
+            if detected_plate and image_hash is not None:
+                self.result_cache.set(image_hash, {
+                    'plate': detected_plate,
+                    'raw_text': result['raw_text'],
+                    'confidence': result['confidence'],
+                    'regions': result['regions'],
+                    'format_valid': result['format_valid'],
+                    'recognizer': result['recognizer'],
+                    'pair': result['pair']
+                })
+        except ImageRejectedError as e:
+            result['error'] = str(e)
+            result['rejected'] = True
         except Exception as e:
             print(f"Error in plate detection: {e}")
-            return None
-    
-    def detect_plate_from_bytes(self, image_bytes):
+            result['error'] = str(e)
+        finally:
+            for enhanced in enhanced_sets:
+                enhanced.close()
+
+        return self.finish_result(result, timings, started)
+
+    def finish_result(self, result, timings, started):
+        """Stamp the elapsed time and stage timings on a result and add them to the process metrics"""
+        result['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+        timings['total'] = result['elapsed_ms']
+        result['timings'] = {stage: round(elapsed_ms, 2) for stage, elapsed_ms in timings.items()}
+        self.stage_metrics.record_all(timings)
+        return result
+
+    def pair_order(self, station_id=None):
+        """(variant index, config index) pairs in the order this station's cascade tries them"""
+        if not self.adaptive_order:
+            return DEFAULT_PAIR_ORDER
+        named = {(ENHANCEMENT_VARIANTS[variant], OCR_CONFIG_PSMS[config]): (variant, config)
+                 for variant, config in DEFAULT_PAIR_ORDER}
+        ordered = self.pair_wins.order(list(named), station_id)
+        return [named[pair] for pair in ordered]
+
+    def run_ocr_cascade(self, enhanced_sets, deadline, pair_order=DEFAULT_PAIR_ORDER, timings=None):
         """
-        Detect number plate from image bytes (e.g., from camera input)
+        Run OCR over (enhanced image, config) pairs in order, best candidates first.
+
+        Stops as soon as a reading corrects to a valid plate with a
+        confidence at or above the threshold, or when the deadline passes,
+        and returns the best candidate seen so far.
         """
-        try:
-            # Convert bytes to numpy array
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if img is None:
-                return None
-            
-            # Apply advanced image enhancement techniques
-            enhanced_images = self.enhance_image_for_plate_detection(img)
+        if timings is None:
+            timings = defaultdict(float)
+        if self.ocr_workers > 1:
+            return self.run_parallel_ocr_cascade(enhanced_sets, deadline, pair_order, timings)
 
-            # Try OCR on different enhanced versions of the image
-            text_options = []
-            
-            # Define custom configs for tesseract
-            custom_config = r'--oem 3 --psm 8 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
-            custom_config_psm6 = r'--oem 3 --psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
-            custom_config_psm7 = r'--oem 3 --psm 7 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
-            custom_config_psm13 = r'--oem 3 --psm 13 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
-            
-            # Process each enhanced image with different OCR configurations
-            for i, enhanced_img in enumerate(enhanced_images):
-                # Try with default config
-                text1 = pytesseract.image_to_string(enhanced_img, config=custom_config)
-                text_options.append(text1)
-                
-                # Try with PSM 6
-                text2 = pytesseract.image_to_string(enhanced_img, config=custom_config_psm6)
-                text_options.append(text2)
-                
-                # Try with PSM 7
-                text3 = pytesseract.image_to_string(enhanced_img, config=custom_config_psm7)
-                text_options.append(text3)
-                
-                # Try with PSM 13
-                text4 = pytesseract.image_to_string(enhanced_img, config=custom_config_psm13)
-                text_options.append(text4)
-            
-            # Common patterns for Indian number plates
-            plate_patterns = [
-                r'[A-Z]{2}[0-9]{1,2}[A-Z]{1,3}[0-9]{1,4}',  # Standard format: XX00XXX0000
-                r'[A-Z]{2}[0-9]{2}[A-Z]{1,2}[0-9]{1,4}',    # Alternative format
-                r'[A-Z]{3}[0-9]{1,4}',                        # Three letters followed by numbers
-                r'[A-Z]{2}[0-9]{4}',                          # Two letters followed by 4 digits
-                r'[A-Z]{2}[0-9]{1,2}[A-Z]{1,2}[0-9]{1,4}',   # Another common format
-                r'[A-Z]{2}[0-9]{1,2}[A-Z]{1}[0-9]{1,4}',     # Another format
-                r'[A-Z0-9]{3,10}'                            # General alphanumeric pattern
-            ]
-            
-            detected_plate = None
-            
-            # Check each text option
-            for text in text_options:
-                for pattern in plate_patterns:
-                    matches = re.findall(pattern, text)
-                    if matches:
-                        detected_plate = matches[0]
+        cascade = self.new_cascade()
+        for enhanced_img, config, pair in cascade_pairs(enhanced_sets, pair_order):
+            if time.monotonic() >= deadline:
+                cascade['timed_out'] = True
+                break
+
+            text, confidence, elapsed_ms = timed_ocr(enhanced_img, config, self.ocr_backend)
+            timings[f'ocr.psm{pair[1]}'] += elapsed_ms
+            cascade['texts'].append(text)
+            if self.record_candidate(cascade, text, confidence, pair, timings):
+                break
+        return cascade
+
+    def run_parallel_ocr_cascade(self, enhanced_sets, deadline, pair_order, timings):
+        """
+        Fan the cascade pairs out over the OCR process pool.
+
+        Pairs are handed out in cascade order, one per pool process, and the
+        next pair is only taken (and its enhanced variant built) when one
+        finishes. Once a winning candidate comes back, or the deadline
+        passes, the pairs still running are cancelled and the variants not
+        reached yet are never computed.
+        """
+        cascade = self.new_cascade()
+        pool = get_ocr_pool(self.ocr_workers)
+        pairs = enumerate(cascade_pairs(enhanced_sets, pair_order))
+        futures = {}
+        texts = {}
+        pending = set()
+        try:
+            while True:
+                # Top up to one pair in flight per pool process
+                while len(pending) < self.ocr_workers and time.monotonic() < deadline:
+                    next_pair = next(pairs, None)
+                    if next_pair is None:
                         break
-                if detected_plate:
+                    order, (enhanced_img, config, pair) = next_pair
+                    future = pool.submit(timed_ocr, enhanced_img, config, self.ocr_backend)
+                    futures[future] = (order, pair)
+                    pending.add(future)
+                if not pending:
+                    cascade['timed_out'] = time.monotonic() >= deadline
                     break
-            
-            # If still no detection, try combining lines from multi-line OCR
-            if not detected_plate:
-                for text in text_options:
-                    lines = text.strip().split('\n')
-                    if len(lines) >= 2:
-                        # Try combining consecutive lines to form a plate
-                        for i in range(len(lines) - 1):
-                            combined = re.sub(r'[^A-Za-z0-9]', '', lines[i] + lines[i+1])
-                            for pattern in plate_patterns:
-                                matches = re.findall(pattern, combined)
-                                if matches:
-                                    detected_plate = matches[0]
-                                    break
-                            if detected_plate:
-                                break
-                    if detected_plate:
-                        break
-            
-            # If no pattern matches, return the most alphanumeric text from all options
-            if not detected_plate:
-                all_text = ' '.join(text_options)
-                alphanumeric_text = re.sub(r'[^A-Za-z0-9]', '', all_text)
-                if len(alphanumeric_text) >= 3:
-                    # Try to find the most likely plate format
-                    for pattern in plate_patterns[:-1]:  # Exclude the general pattern for this check
-                        matches = re.findall(pattern, all_text)
-                        if matches:
-                            detected_plate = matches[0]
-                            break
-                    
-                    if not detected_plate and len(alphanumeric_text) >= 3:
-                        detected_plate = alphanumeric_text[:10]  # Limit to 10 characters
-            
-            # Validate the detected plate - ensure it has a proper format
-            if detected_plate:
-                # Store the original text for learning purposes
-                original_text = ' '.join(text_options)
-                detected_plate = self.validate_and_correct_plate(detected_plate)
-                # Learn from this detection to improve future accuracy
-                self.learn_from_detection(original_text, detected_plate)
-            
-            return detected_plate
-        except Exception as e:
-            print(f"Error in plate detection from bytes: {e}")
-            return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    cascade['timed_out'] = True
+                    break
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                winner = False
+                for future in done:
+                    text, confidence, elapsed_ms = future.result()
+                    order, pair = futures[future]
+                    texts[order] = text
+                    timings[f'ocr.psm{pair[1]}'] += elapsed_ms
+                    winner = self.record_candidate(cascade, text, confidence, pair, timings) or winner
+                if winner:
+                    break
+        except BrokenProcessPool:
+            reset_ocr_pool()
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
+
+        # Keep the texts in cascade order for the loose-pattern fallback
+        cascade['texts'] = [texts[order] for order in sorted(texts)]
+        return cascade
+
+    def run_fast_path(self, regions, timings):
+        """
+        Read the localized plate crops with the character recognizer.
+
+        Returns cascade state like run_ocr_cascade, with no OCR calls; the
+        reading goes through the same corrector, so its confidence is
+        penalized for corrections the same way.
+        """
+        cascade = self.new_cascade()
+        for region in regions:
+            with stage_timer(timings, 'segment'):
+                text, confidence = self.char_recognizer.read(region)
+            if not text:
+                continue
+            cascade['texts'].append(text)
+            with stage_timer(timings, 'pattern_match'):
+                plate, cost = self.corrector.correct(text)
+            if not plate or cost > self.max_correction_cost:
+                continue
+            confidence = max(confidence - cost * CORRECTION_CONFIDENCE_PENALTY, 0.0)
+            if confidence > cascade['confidence']:
+                cascade['plate'] = plate
+                cascade['confidence'] = confidence
+            if confidence >= self.fast_path_threshold:
+                break
+        return cascade
+
+    def new_cascade(self):
+        """Empty cascade state"""
+        return {
+            'plate': None,
+            'confidence': 0.0,
+            'ocr_calls': 0,
+            'timed_out': False,
+            'pair': None,
+            'tried': [],
+            'texts': []
+        }
+
+    def record_candidate(self, cascade, text, confidence, pair=None, timings=None):
+        """
+        Record one OCR reading in the cascade state; returns True when it is good enough to stop
+        """
+        cascade['ocr_calls'] += 1
+        if pair is not None:
+            cascade['tried'].append(pair)
+        started = time.perf_counter()
+        plate, cost = self.corrector.correct(text)
+        if timings is not None:
+            timings['pattern_match'] += (time.perf_counter() - started) * 1000
+        if not plate or cost > self.max_correction_cost:
+            return False
+        confidence = max(confidence - cost * CORRECTION_CONFIDENCE_PENALTY, 0.0)
+        if cascade['plate'] is None or confidence > cascade['confidence']:
+            cascade['plate'] = plate
+            cascade['confidence'] = confidence
+            cascade['pair'] = pair
+        return confidence >= self.confidence_threshold
+
+    def detect_plate_from_image(self, image_path):
+        """
+        Detect number plate from an image file
+        """
+        with open(image_path, 'rb') as f:
+            return self.detect_plate(f)['plate']
+
+    def decode_image(self, source):
+        """
+        Decode an image buffer (bytes, memoryview or readable stream) to the grayscale working image
+        """
+        if isinstance(source, np.ndarray):
+            # Frame already decoded by a video capture
+            return self.ingestor.load_frame(source)
+        return self.ingestor.load(source)
+
+    def extract_plate_from_text(self, text_options):
+        """
+        Pick the most plausible plate string out of a list of raw OCR outputs
+        """
+        # Check each text option
+        for text in text_options:
+            for pattern in PLATE_PATTERNS:
+                matches = pattern.findall(text)
+                if matches:
+                    return matches[0]
+
+        # If still no detection, try combining lines from multi-line OCR
+        for text in text_options:
+            lines = text.strip().split('\n')
+            # Try combining consecutive lines to form a plate
+            for i in range(len(lines) - 1):
+                combined = re.sub(r'[^A-Za-z0-9]', '', lines[i] + lines[i+1])
+                for pattern in PLATE_PATTERNS:
+                    matches = pattern.findall(combined)
+                    if matches:
+                        return matches[0]
+
+        # If no pattern matches, return the most alphanumeric text from all options
+        all_text = ' '.join(text_options)
+        alphanumeric_text = re.sub(r'[^A-Za-z0-9]', '', all_text)
+        if len(alphanumeric_text) >= 3:
+            # Try to find the most likely plate format
+            for pattern in PLATE_PATTERNS[:-1]:  # Exclude the general pattern for this check
+                matches = pattern.findall(all_text)
+                if matches:
+                    return matches[0]
+            return alphanumeric_text[:10]  # Limit to 10 characters
+
+        return None
     
-    def validate_plate_in_db(self, plate_number):
+    def validate_plate_in_db(self, plate_number, fuzzy=True):
         """
         Check if the detected plate exists in the database
+
+        With `fuzzy`, a reading one or two characters off a registered number
+        resolves to that vehicle through the in-memory plate index.
         """
+        started = time.perf_counter()
         try:
-            vehicle = Vehicle.query.filter_by(vehicle_number=plate_number.upper()).first()
+            plate_number = plate_number.upper()
+            if self.plate_index is not None:
+                self.plate_index.sync()
+                match = self.plate_index.lookup(plate_number, None if fuzzy else 0)
+                if match is not None:
+                    vehicle = db.session.get(Vehicle, match[0])
+                    if vehicle is not None:
+                        return vehicle
+            # Not indexed yet, e.g. registered by another worker since the last refresh
+            vehicle = Vehicle.query.filter_by(vehicle_number=plate_number).first()
             return vehicle
         except Exception as e:
             print(f"Error validating plate in DB: {e}")
             return None
+        finally:
+            self.stage_metrics.record('db_lookup', (time.perf_counter() - started) * 1000)
     
-    def enhance_image_for_plate_detection(self, img):
+    def enhance_image_for_plate_detection(self, img, timings=None):
         """
         Apply advanced image enhancement techniques specifically for number plate detection
+
+        Returns a lazy EnhancementGraph indexed like a list of one image per
+        ENHANCEMENT_VARIANTS entry; a variant is only computed when the
+        cascade first asks for it. With `timings`, the ms spent on each
+        node is added under 'enhance.<node>'. Close the graph once its
+        images are no longer needed so its buffers are reused.
         """
-        # Convert to grayscale if not already
-        if len(img.shape) == 3:
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = img
-        
-        # Apply multiple enhancement techniques
-        enhanced_images = []
-        
-        # 1. Basic CLAHE (Contrast Limited Adaptive Histogram Equalization)
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        enhanced1 = clahe.apply(gray)
-        enhanced_images.append(enhanced1)
-        
-        # 2. Bilateral filter to reduce noise while keeping edges sharp
-        bilateral = cv2.bilateralFilter(gray, 9, 75, 75)
-        enhanced2 = clahe.apply(bilateral)
-        enhanced_images.append(enhanced2)
-        
-        # 3. Morphological operations to enhance text
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-        morph1 = cv2.morphologyEx(gray, cv2.MORPH_CLOSE, kernel)
-        morph1 = clahe.apply(morph1)
-        enhanced_images.append(morph1)
-        
-        # 4. Top-hat transformation to enhance bright text on dark background
-        kernel_tophat = cv2.getStructuringElement(cv2.MORPH_RECT, (15, 15))
-        tophat = cv2.morphologyEx(gray, cv2.MORPH_TOPHAT, kernel_tophat)
-        tophat_enhanced = clahe.apply(tophat)
-        enhanced_images.append(tophat_enhanced)
-        
-        # 5. Sharpening filter
-        kernel_sharpen = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
-        sharpened = cv2.filter2D(gray, -1, kernel_sharpen)
-        enhanced5 = clahe.apply(sharpened)
-        enhanced_images.append(enhanced5)
-        
-        # 6. Combine techniques: bilateral + clahe + sharpening
-        bilateral_sharp = cv2.filter2D(bilateral, -1, kernel_sharpen)
-        enhanced6 = clahe.apply(bilateral_sharp)
-        enhanced_images.append(enhanced6)
-        
-        # 7. Apply different thresholding methods
-        _, thresh_otsu = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        enhanced_images.append(thresh_otsu)
-        
-        _, thresh_binary = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY)
-        enhanced_images.append(thresh_binary)
-        
-        # 8. Adaptive threshold
-        adaptive_thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
-        enhanced_images.append(adaptive_thresh)
-        
-        return enhanced_images
+        return EnhancementGraph(img, timings)
     
     def validate_and_correct_plate(self, plate):
         """
@@ -315,28 +584,15 @@ class PlateDetector:
             
         # Remove any spaces and convert to uppercase
         plate = plate.replace(' ', '').upper()
-        
-        # Common OCR mistakes corrections
-        corrections = {
-            '1': 'I',  # Sometimes 'I' is recognized as '1'
-            '0': 'O',  # Sometimes 'O' is recognized as '0'
-            '5': 'S',  # Sometimes 'S' is recognized as '5'
-            '8': 'B',  # Sometimes 'B' is recognized as '8'
-            '2': 'Z',  # Sometimes 'Z' is recognized as '2'
-        }
-        
-        # Apply corrections based on context (letters vs numbers in specific positions)
-        corrected_plate = ''
-        for i, char in enumerate(plate):
-            if char.isdigit():
-                # For positions likely to be numbers (after letters), keep as numbers
-                corrected_plate += char
-            elif char.isalpha():
-                corrected_plate += char
-            else:
-                # Remove any other characters
-                continue
-        
+
+        # Map common OCR mistakes (O/0, I/1, B/8, ...) according to each character's position
+        corrected_plate = self.apply_learning_corrections(plate)
+        if corrected_plate != plate:
+            return corrected_plate
+
+        # Not a recognizable registration, keep only letters and digits
+        corrected_plate = re.sub(r'[^A-Z0-9]', '', plate)
+
         # Ensure the plate has the right format: 2 letters + numbers + letters + numbers
         # This is a simple validation - more sophisticated validation can be added
         if len(corrected_plate) >= 3:
@@ -347,67 +603,38 @@ class PlateDetector:
         # If no specific corrections, return the cleaned plate
         return plate
     
-    def learn_from_detection(self, original_text, corrected_plate):
+    def learn_from_detection(self, detection, station_id=None, label=None):
         """
-        Store successful detection patterns to improve future detections
+        Store a detect_plate result to improve future detections
+
+        `label` is the number the scan was resolved to independently of the
+        OCR: the registered vehicle validate_plate_in_db matched, or a number
+        the operator entered. Only labelled detections teach the corrector.
+        Every Tesseract cascade counts towards the station's cascade order,
+        also one that read nothing: the pairs it ran as attempts and the
+        (variant, psm) pair that read the plate, if any, as a win.
         """
-        # Create a simple learning data file to store successful patterns
-        learning_file = 'plate_detection_learning.pkl'
-        learning_data = {}
-        
-        # Load existing learning data if it exists
-        if os.path.exists(learning_file):
-            try:
-                with open(learning_file, 'rb') as f:
-                    learning_data = pickle.load(f)
-            except:
-                learning_data = {}
-        
-        # Add the successful detection to learning data
-        if corrected_plate:
-            # Store the original text and the corrected plate for future reference
-            if 'successful_detections' not in learning_data:
-                learning_data['successful_detections'] = []
-            
-            # Store the detection pair
-            detection_pair = {
-                'original': original_text,
-                'corrected': corrected_plate,
-                'timestamp': str(datetime.now())
-            }
-            learning_data['successful_detections'].append(detection_pair)
-            
-            # Keep only the last 100 successful detections to avoid the file growing too large
-            if len(learning_data['successful_detections']) > 100:
-                learning_data['successful_detections'] = learning_data['successful_detections'][-100:]
-        
-        # Save the updated learning data
-        try:
-            with open(learning_file, 'wb') as f:
-                pickle.dump(learning_data, f)
-        except:
-            # If we can't save, just continue
-            pass
+        if not self.learning or detection['cached'] or detection['rejected'] or detection['retake']:
+            return
+        plate = detection['plate']
+        # Results from the OCR service come back as JSON, with lists for pairs
+        pair = tuple(detection['pair']) if detection['pair'] else None
+        tried = [tuple(tried_pair) for tried_pair in detection['tried']]
+        if not plate and not label and not tried:
+            return
+        variant, psm = pair or (None, None)
+        if tried:
+            self.pair_wins.record(station_id, pair, tried)
+        if self.detection_log is not None:
+            # Queued in memory; a background thread appends it to the detection log
+            self.detection_log.record(detection['raw_text'], plate, detection['confidence'], station_id, variant,
+                                      psm, tried or None, label)
     
     def apply_learning_corrections(self, text):
         """
         Apply learned corrections to improve detection
         """
-        learning_file = 'plate_detection_learning.pkl'
-        
-        if os.path.exists(learning_file):
-            try:
-                with open(learning_file, 'rb') as f:
-                    learning_data = pickle.load(f)
-                
-                # This is a simple implementation - in a real system, you could use more
-                # sophisticated pattern matching to apply learned corrections
-                if 'successful_detections' in learning_data:
-                    # For now, just return the text as is
-                    # In a more advanced implementation, you could analyze patterns
-                    # in the learning data to improve future detections
-                    pass
-            except:
-                pass
-        
+        plate, cost = self.corrector.correct(text)
+        if plate and cost <= self.max_correction_cost:
+            return plate
         return text
\ No newline at end of file
@@ -0,0 +1,175 @@
+"""Lazy enhancement graph for plate images.
+
+The nine enhanced variants the OCR cascade tries share most of their
+work: six of them run CLAHE over a filtered image, two reuse the same
+bilateral filter. They are expressed as a small graph of named nodes,
+each computed only when the cascade first asks for a variant that needs
+it, so a scan that stops after the first variant never pays for the
+other eight.
+
+The CLAHE instance and the structuring/sharpening kernels are built once
+(CLAHE once per thread, since OpenCV keeps scratch buffers in it), and
+node outputs are written into buffers recycled from the previous scans
+on the same thread instead of allocating fresh arrays every time.
+"""
+
+import threading
+import cv2
+import numpy as np
+from app.utils.ocr_metrics import stage_timer
+
+# Names of the enhanced variants, in cascade order
+ENHANCEMENT_VARIANTS = [
+    'clahe',
+    'bilateral_clahe',
+    'close_clahe',
+    'tophat_clahe',
+    'sharpen_clahe',
+    'bilateral_sharpen_clahe',
+    'otsu',
+    'binary_127',
+    'adaptive_gaussian',
+]
+
+CLOSE_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+TOPHAT_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (15, 15))
+SHARPEN_KERNEL = np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]], np.float32)
+
+_local = threading.local()
+
+
+def get_clahe():
+    """This thread's CLAHE instance"""
+    clahe = getattr(_local, 'clahe', None)
+    if clahe is None:
+        clahe = _local.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    return clahe
+
+
+def threshold_binary(image, out):
+    return cv2.threshold(image, 127, 255, cv2.THRESH_BINARY, dst=out)[1]
+
+
+def threshold_otsu(image, out):
+    return cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=out)[1]
+
+
+# node -> (input nodes, function(*inputs, out) returning the output image)
+NODES = {
+    'bilateral': (('gray',), lambda gray, out: cv2.bilateralFilter(gray, 9, 75, 75, dst=out)),
+    'closed': (('gray',), lambda gray, out: cv2.morphologyEx(gray, cv2.MORPH_CLOSE, CLOSE_KERNEL, dst=out)),
+    'tophat': (('gray',), lambda gray, out: cv2.morphologyEx(gray, cv2.MORPH_TOPHAT, TOPHAT_KERNEL, dst=out)),
+    'sharpened': (('gray',), lambda gray, out: cv2.filter2D(gray, -1, SHARPEN_KERNEL, dst=out)),
+    'bilateral_sharpened': (('bilateral',), lambda image, out: cv2.filter2D(image, -1, SHARPEN_KERNEL, dst=out)),
+    'clahe': (('gray',), lambda image, out: get_clahe().apply(image, out)),
+    'bilateral_clahe': (('bilateral',), lambda image, out: get_clahe().apply(image, out)),
+    'close_clahe': (('closed',), lambda image, out: get_clahe().apply(image, out)),
+    'tophat_clahe': (('tophat',), lambda image, out: get_clahe().apply(image, out)),
+    'sharpen_clahe': (('sharpened',), lambda image, out: get_clahe().apply(image, out)),
+    'bilateral_sharpen_clahe': (('bilateral_sharpened',), lambda image, out: get_clahe().apply(image, out)),
+    'otsu': (('gray',), threshold_otsu),
+    'binary_127': (('gray',), threshold_binary),
+    'adaptive_gaussian': (('gray',), lambda gray, out: cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2, dst=out)),
+}
+
+
+class BufferPool:
+    """
+    Flat uint8 buffers handed out as contiguous 2-D views and taken back for reuse.
+
+    Buffers are kept by capacity, so crops of different widths share them.
+    At most max_bytes of free buffers are kept.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.free = []  # flat buffers, smallest first
+        self.free_bytes = 0
+        self.allocated = 0
+        self.reused = 0
+
+    def take(self, shape):
+        size = shape[0] * shape[1]
+        for i, buffer in enumerate(self.free):
+            if buffer.size >= size:
+                del self.free[i]
+                self.free_bytes -= buffer.size
+                self.reused += 1
+                return buffer, buffer[:size].reshape(shape)
+        self.allocated += 1
+        buffer = np.empty(size, np.uint8)
+        return buffer, buffer.reshape(shape)
+
+    def give(self, buffer):
+        if self.free_bytes + buffer.size > self.max_bytes:
+            return
+        self.free.append(buffer)
+        self.free.sort(key=len)
+        self.free_bytes += buffer.size
+
+
+def get_buffer_pool():
+    """This thread's buffer pool"""
+    pool = getattr(_local, 'buffers', None)
+    if pool is None:
+        pool = _local.buffers = BufferPool()
+    return pool
+
+
+class EnhancementGraph:
+    """
+    The enhanced variants of one grayscale image, computed on first access.
+
+    Indexes like the list of ENHANCEMENT_VARIANTS images it replaces. The
+    arrays it hands out live in recycled buffers: they stay valid until
+    close(), after which the next scan on this thread may overwrite them.
+    """
+
+    def __init__(self, image, timings=None, pool=None):
+        if len(image.shape) == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        self.nodes = {'gray': np.ascontiguousarray(image)}
+        self.timings = timings
+        self.pool = pool or get_buffer_pool()
+        self.buffers = []
+
+    def __len__(self):
+        return len(ENHANCEMENT_VARIANTS)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.node(name) for name in ENHANCEMENT_VARIANTS[index]]
+        return self.node(ENHANCEMENT_VARIANTS[index])
+
+    def __iter__(self):
+        for name in ENHANCEMENT_VARIANTS:
+            yield self.node(name)
+
+    def node(self, name):
+        """Output of a node, computing it and its inputs if needed"""
+        image = self.nodes.get(name)
+        if image is not None:
+            return image
+        inputs, function = NODES[name]
+        args = [self.node(input_name) for input_name in inputs]
+        buffer, out = self.pool.take(self.nodes['gray'].shape)
+        self.buffers.append(buffer)
+        if self.timings is not None:
+            with stage_timer(self.timings, f'enhance.{name}'):
+                image = function(*args, out)
+        else:
+            image = function(*args, out)
+        self.nodes[name] = image
+        return image
+
+    def computed(self):
+        """Names of the nodes computed so far"""
+        return [name for name in self.nodes if name != 'gray']
+
+    def close(self):
+        """Return the buffers for reuse; the images handed out must not be used afterwards"""
+        for buffer in self.buffers:
+            self.pool.give(buffer)
+        self.buffers = []
+        self.nodes = {'gray': self.nodes['gray']}
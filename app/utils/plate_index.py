@@ -0,0 +1,262 @@
+"""In-memory index of registered vehicle numbers.
+
+Resolves OCR output to a registered vehicle without a database query per
+guess. Exact hits come from a dict. Near misses are found through segment
+indexes: a number split into n + 1 pieces keeps at least one piece intact
+under n edits, so only numbers sharing a piece with the reading need to be
+verified. Readings one edit away (a wrong, missing or extra character) are
+resolved first; readings with two wrong characters after that.
+
+The index follows vehicle inserts, renames and deletes committed in this
+process through SQLAlchemy events, and picks up changes made by other
+workers with a periodic delta query.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from collections import defaultdict
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app import db
+from app.models import Vehicle
+
+# One index per process
+_plate_index = None
+_plate_index_pid = None
+
+
+def within_one_edit(a, b):
+    """True if b is a with at most one character substituted, inserted or deleted"""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    i = 0
+    shortest = min(len(a), len(b))
+    while i < shortest and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:]
+    if len(a) > len(b):
+        return a[i + 1:] == b[i:]
+    return a[i:] == b[i + 1:]
+
+
+def count_substitutions(a, b):
+    """Number of positions where two equally long strings differ"""
+    return sum(char_a != char_b for char_a, char_b in zip(a, b))
+
+
+def split_segments(length, parts):
+    """(start, size) of `parts` near-equal pieces covering a string of this length"""
+    size, extra = divmod(length, parts)
+    segments = []
+    start = 0
+    for i in range(parts):
+        piece = size + (1 if i < extra else 0)
+        segments.append((start, piece))
+        start += piece
+    return segments
+
+
+class PlateIndex:
+    def __init__(self, max_distance=2):
+        self.max_distance = max_distance
+        self.ids_by_number = {}
+        self.numbers_by_id = {}
+        # Segment index per distance: (length, piece, text) -> numbers
+        self.segments = {distance: defaultdict(set) for distance in range(1, max_distance + 1)}
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.ids_by_number)
+
+    def add(self, vehicle_id, number):
+        """Index a vehicle number, replacing any previous number of the same vehicle"""
+        number = number.upper()
+        with self.lock:
+            if self.numbers_by_id.get(vehicle_id) == number:
+                return
+            self.remove(vehicle_id)
+            self.ids_by_number[number] = vehicle_id
+            self.numbers_by_id[vehicle_id] = number
+            for distance, segments in self.segments.items():
+                for key in self._segment_keys(number, distance):
+                    segments[key].add(number)
+
+    def remove(self, vehicle_id):
+        """Drop a vehicle from the index"""
+        with self.lock:
+            number = self.numbers_by_id.pop(vehicle_id, None)
+            if number is None:
+                return
+            self.ids_by_number.pop(number, None)
+            for distance, segments in self.segments.items():
+                for key in self._segment_keys(number, distance):
+                    bucket = segments.get(key)
+                    if bucket is not None:
+                        bucket.discard(number)
+                        if not bucket:
+                            del segments[key]
+
+    def lookup(self, text, max_distance=None):
+        """
+        Resolve a reading to (vehicle_id, number, distance), or None.
+
+        An exact hit always wins. Otherwise the closest number within
+        max_distance edits is returned, unless two numbers are equally
+        close, in which case the reading is too ambiguous to resolve.
+        Distance 1 covers any single edit; beyond that only substitutions
+        are considered.
+        """
+        if max_distance is None:
+            max_distance = self.max_distance
+        text = text.upper()
+        with self.lock:
+            vehicle_id = self.ids_by_number.get(text)
+            if vehicle_id is not None:
+                return vehicle_id, text, 0
+
+            for distance in range(1, min(max_distance, self.max_distance) + 1):
+                matches = [number for number in self._candidates(text, distance)
+                           if self._within(text, number, distance)]
+                if len(matches) > 1:
+                    return None
+                if matches:
+                    return self.ids_by_number[matches[0]], matches[0], distance
+            return None
+
+    @staticmethod
+    def _within(text, number, distance):
+        if distance == 1:
+            return within_one_edit(text, number)
+        return len(text) == len(number) and count_substitutions(text, number) <= distance
+
+    def _segment_keys(self, number, distance):
+        length = len(number)
+        return [(length, piece, number[start:start + size])
+                for piece, (start, size) in enumerate(split_segments(length, distance + 1))]
+
+    def _candidates(self, text, distance):
+        """Indexed numbers sharing an intact piece with the reading"""
+        segments = self.segments[distance]
+        candidates = set()
+        if distance == 1:
+            # A missing or extra character shifts the piece after it by one
+            lengths = (len(text) - 1, len(text), len(text) + 1)
+        else:
+            lengths = (len(text),)
+        for length in lengths:
+            if length <= distance:
+                continue
+            shift = len(text) - length
+            for piece, (start, size) in enumerate(split_segments(length, distance + 1)):
+                offsets = {start, start + shift} if piece else {start}
+                for offset in offsets:
+                    bucket = segments.get((length, piece, text[offset:offset + size]))
+                    if bucket:
+                        candidates.update(bucket)
+        return candidates
+
+
+class RegisteredPlateIndex(PlateIndex):
+    """PlateIndex kept in sync with the vehicles table"""
+
+    def __init__(self, max_distance=2, refresh_interval=60, full_refresh_interval=900):
+        super().__init__(max_distance)
+        self.refresh_interval = refresh_interval
+        self.full_refresh_interval = full_refresh_interval
+        self.synced_at = None  # UTC time of the last delta query
+        self.last_refresh = 0.0
+        self.last_full_refresh = 0.0
+
+    def sync(self):
+        """
+        Bring the index up to date if it is stale.
+
+        Changes committed in this process are applied by the session events
+        right away; this catches vehicles added or renamed by other workers
+        (delta by updated_at) and, on the slower full refresh, deletions.
+        """
+        now = time.monotonic()
+        if self.synced_at is not None and now - self.last_refresh < self.refresh_interval:
+            return
+        try:
+            if self.synced_at is None or now - self.last_full_refresh >= self.full_refresh_interval:
+                self.full_refresh()
+            else:
+                self.delta_refresh()
+        except Exception as e:
+            print(f"Error refreshing plate index: {e}")
+        self.last_refresh = now
+
+    def full_refresh(self):
+        """Rebuild the index from every registered vehicle number"""
+        started_at = datetime.utcnow()
+        rows = db.session.query(Vehicle.id, Vehicle.vehicle_number).all()
+        with self.lock:
+            current = {vehicle_id for vehicle_id, _ in rows}
+            for vehicle_id in list(self.numbers_by_id):
+                if vehicle_id not in current:
+                    self.remove(vehicle_id)
+            for vehicle_id, number in rows:
+                self.add(vehicle_id, number)
+        self.synced_at = started_at
+        self.last_full_refresh = time.monotonic()
+
+    def delta_refresh(self):
+        """Apply vehicles created or updated since the last refresh"""
+        started_at = datetime.utcnow()
+        # Allow for commits that were in flight during the previous query
+        since = self.synced_at - timedelta(seconds=5)
+        rows = db.session.query(Vehicle.id, Vehicle.vehicle_number).filter(Vehicle.updated_at >= since).all()
+        for vehicle_id, number in rows:
+            self.add(vehicle_id, number)
+        self.synced_at = started_at
+
+
+def get_plate_index(max_distance=2, refresh_interval=60, full_refresh_interval=900):
+    """Return this process's registered-plate index, creating it on first use"""
+    global _plate_index, _plate_index_pid
+    if _plate_index is None or _plate_index_pid != os.getpid():
+        _plate_index = RegisteredPlateIndex(max_distance, refresh_interval, full_refresh_interval)
+        _plate_index_pid = os.getpid()
+    return _plate_index
+
+
+# Incremental updates: vehicle changes are collected per session at flush
+# time and applied to the index only once the transaction commits
+
+@event.listens_for(Vehicle, 'after_insert')
+@event.listens_for(Vehicle, 'after_update')
+def _queue_vehicle_upsert(mapper, connection, target):
+    history = inspect(target).attrs.vehicle_number.history
+    if history.has_changes():
+        _pending_changes(target).append(('add', target.id, target.vehicle_number))
+
+
+@event.listens_for(Vehicle, 'after_delete')
+def _queue_vehicle_delete(mapper, connection, target):
+    _pending_changes(target).append(('remove', target.id, None))
+
+
+def _pending_changes(target):
+    session = inspect(target).session
+    return session.info.setdefault('plate_index_changes', [])
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_vehicle_changes(session):
+    changes = session.info.pop('plate_index_changes', None)
+    if not changes or _plate_index is None or _plate_index_pid != os.getpid():
+        return
+    for action, vehicle_id, number in changes:
+        if action == 'add':
+            _plate_index.add(vehicle_id, number)
+        else:
+            _plate_index.remove(vehicle_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_vehicle_changes(session):
+    session.info.pop('plate_index_changes', None)
@@ -0,0 +1,136 @@
+"""Number plate localization for the plate detection pipeline.
+
+Finds plate-shaped, text-dense regions in a camera frame so only those small
+crops are enhanced and OCR'd instead of the whole frame.
+"""
+
+import cv2
+import numpy as np
+
+# Single-row Indian plates are about 500x120mm (4.2:1), two-row ones about
+# 340x200mm (1.7:1); leave some slack for perspective
+MIN_ASPECT_RATIO = 1.5
+MAX_ASPECT_RATIO = 6.5
+
+# Candidate area as a fraction of the frame
+MIN_AREA_FRACTION = 0.002
+MAX_AREA_FRACTION = 0.5
+
+# Share of edge pixels inside a candidate; plate text is dense in edges
+MIN_EDGE_DENSITY = 0.08
+
+# Contour area over its rotated rectangle area; rejects ragged blobs
+MIN_FILL_RATIO = 0.45
+
+# Height the deskewed crop is resized to before enhancement and OCR
+ROI_HEIGHT = 96
+
+# Wide closing kernel joins the characters of a plate into one blob
+CLOSE_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (17, 5))
+
+
+class PlateLocalizer:
+    def __init__(self, max_candidates=3):
+        self.max_candidates = max_candidates
+
+    def localize(self, gray):
+        """
+        Return deskewed grayscale crops of the most plate-like regions, best first
+        """
+        return [self.crop_and_deskew(gray, candidate['box'])
+                for candidate in self.find_candidates(gray)]
+
+    def find_candidates(self, gray):
+        """
+        Find plate-shaped regions using edges, contours, aspect ratio and edge density
+        """
+        frame_area = gray.shape[0] * gray.shape[1]
+
+        # Vertical strokes dominate plate text, so Sobel-x highlights it well
+        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+        grad_x = cv2.Sobel(blurred, cv2.CV_16S, 1, 0, ksize=3)
+        grad_x = cv2.convertScaleAbs(grad_x)
+        _, edges = cv2.threshold(grad_x, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+        closed = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, CLOSE_KERNEL)
+        contours, _ = cv2.findContours(closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        candidates = []
+        for contour in contours:
+            rect = cv2.minAreaRect(contour)
+            (_, _), (w, h), _ = rect
+            if w == 0 or h == 0:
+                continue
+
+            area = w * h
+            if not MIN_AREA_FRACTION * frame_area <= area <= MAX_AREA_FRACTION * frame_area:
+                continue
+
+            aspect_ratio = max(w, h) / min(w, h)
+            if not MIN_ASPECT_RATIO <= aspect_ratio <= MAX_ASPECT_RATIO:
+                continue
+
+            if cv2.contourArea(contour) / area < MIN_FILL_RATIO:
+                continue
+
+            x, y, bw, bh = cv2.boundingRect(contour)
+            edge_density = cv2.countNonZero(edges[y:y + bh, x:x + bw]) / float(bw * bh)
+            if edge_density < MIN_EDGE_DENSITY:
+                continue
+
+            candidates.append({
+                'box': cv2.boxPoints(rect),
+                'bounds': (x, y, bw, bh),
+                'score': edge_density
+            })
+
+        candidates.sort(key=lambda c: c['score'], reverse=True)
+
+        # Drop candidates that mostly overlap a better one
+        selected = []
+        for candidate in candidates:
+            if all(overlap_ratio(candidate['bounds'], kept['bounds']) < 0.5 for kept in selected):
+                selected.append(candidate)
+            if len(selected) >= self.max_candidates:
+                break
+        return selected
+
+    def crop_and_deskew(self, gray, box):
+        """
+        Warp a rotated candidate box to an upright crop of ROI_HEIGHT pixels
+        """
+        src = order_box_points(box)
+        width = int(max(np.linalg.norm(src[1] - src[0]), np.linalg.norm(src[2] - src[3])))
+        height = int(max(np.linalg.norm(src[3] - src[0]), np.linalg.norm(src[2] - src[1])))
+        width, height = max(width, 1), max(height, 1)
+
+        dst = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], dtype=np.float32)
+        matrix = cv2.getPerspectiveTransform(src, dst)
+        roi = cv2.warpPerspective(gray, matrix, (width, height))
+
+        scale = ROI_HEIGHT / float(height)
+        interpolation = cv2.INTER_CUBIC if scale > 1 else cv2.INTER_AREA
+        return cv2.resize(roi, (max(int(width * scale), 1), ROI_HEIGHT), interpolation=interpolation)
+
+
+def order_box_points(box):
+    """Order four corner points as top-left, top-right, bottom-right, bottom-left"""
+    pts = np.asarray(box, dtype=np.float32)
+    sums = pts.sum(axis=1)
+    diffs = np.diff(pts, axis=1).ravel()
+    return np.array([
+        pts[np.argmin(sums)],
+        pts[np.argmin(diffs)],
+        pts[np.argmax(sums)],
+        pts[np.argmax(diffs)]
+    ], dtype=np.float32)
+
+
+def overlap_ratio(a, b):
+    """Intersection area over the smaller of two (x, y, w, h) rectangles"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    smaller = min(aw * ah, bw * bh)
+    return (ix * iy) / float(smaller) if smaller else 0.0
@@ -0,0 +1,56 @@
+"""Synthetic number plate renderer.
+
+Draws plate text the way Indian plates print it: black characters on a
+white plate with a border, long numbers squeezed horizontally to fit.
+The character recognizer learns its glyph templates from these plates,
+and the plate pipeline benchmark builds its test scenes from them.
+"""
+
+import numpy as np
+
+# Bold sans and mono faces commonly installed on Linux, macOS and Windows
+PLATE_FONT_PATHS = [
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSansMono-Bold.ttf',
+    '/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf',
+    '/usr/share/fonts/truetype/liberation/LiberationMono-Bold.ttf',
+    '/usr/share/fonts/truetype/freefont/FreeSansBold.ttf',
+    '/usr/share/fonts/TTF/DejaVuSans-Bold.ttf',
+    '/Library/Fonts/Arial Bold.ttf',
+    '/System/Library/Fonts/Supplemental/Arial Bold.ttf',
+    'C:\\Windows\\Fonts\\arialbd.ttf',
+]
+
+
+def render_plate(text, font, size=(520, 120)):
+    """
+    Black text on a white plate with a border, as a grayscale numpy array
+
+    `font` is a PIL truetype font, or None for PIL's built-in bitmap font
+    scaled up to plate height.
+    """
+    from PIL import Image, ImageDraw, ImageFont
+
+    width, height = size
+    plate = Image.new('L', size, 245)
+    draw = ImageDraw.Draw(plate)
+    draw.rectangle([3, 3, width - 4, height - 4], outline=0, width=4)
+    if font is None:
+        # Bitmap font: draw small and scale the glyphs up to plate height
+        small = Image.new('L', (width // 6, height // 6), 245)
+        ImageDraw.Draw(small).text((3, 5), text, fill=0, font=ImageFont.load_default())
+        glyphs = small.resize((width - 16, height - 16), Image.NEAREST)
+        plate.paste(glyphs, (8, 8))
+        return np.array(plate)
+    left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+    scale = min((width - 30) / (right - left), (height - 24) / (bottom - top), 1.0)
+    if scale < 1.0:
+        # Long numbers: render at full size and squeeze horizontally like real plates
+        wide = Image.new('L', (right - left + 20, height), 245)
+        ImageDraw.Draw(wide).text((10 - left, (height - (bottom - top)) // 2 - top), text, fill=0, font=font)
+        wide = wide.resize((width - 30, height))
+        plate.paste(wide.crop((0, 8, width - 30, height - 8)), (15, 8))
+    else:
+        draw.text(((width - (right - left)) // 2 - left, (height - (bottom - top)) // 2 - top),
+                  text, fill=0, font=font)
+    return np.array(plate)
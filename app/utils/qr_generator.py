@@ -1,9 +1,111 @@
-import qrcode
-import json
+import hashlib
+import io
+import threading
+from collections import OrderedDict
 from datetime import datetime
-import os
+from flask import current_app
 from app.models import QRCode as QRCodeModel, Vehicle
 from app import db
+from app.utils.qr_payload import decode_qr_payload, get_qr_signing_key
+from app.utils.error_handler import QRPayloadError
+
+# Formats QR images are served in -> mimetype
+QR_IMAGE_FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+# Bumped when rendering changes, so browsers holding old images get new ETags
+QR_RENDER_VERSION = 1
+
+# One rendered-image cache per process
+_qr_image_cache = None
+
+
+def qr_image_etag(qr_content, image_format):
+    """Strong ETag for a QR image; the same content always renders to the same bytes"""
+    digest = hashlib.sha256(f'{QR_RENDER_VERSION}:{image_format}:{qr_content}'.encode('utf-8'))
+    return digest.hexdigest()[:32]
+
+
+def render_qr_image(qr_content, image_format='png'):
+    """Render QR content to PNG or SVG bytes in memory"""
+    # qrcode and PIL are only loaded when an image is rendered
+    import qrcode
+    buffer = io.BytesIO()
+    if image_format == 'svg':
+        from qrcode.image.svg import SvgPathImage
+        qrcode.make(qr_content, image_factory=SvgPathImage).save(buffer)
+    else:
+        qrcode.make(qr_content).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def read_qr_codes(gray):
+    """
+    Decode the QR codes in a grayscale image (numpy array); returns their texts.
+
+    Uses pyzbar, or OpenCV's QR detector where the zbar library is not
+    installed. The ArUco-based detector (OpenCV 4.8+) is preferred: it is
+    faster and still finds codes in noisy, JPEG-compressed camera frames.
+    """
+    try:
+        from pyzbar import pyzbar
+        from pyzbar.pyzbar import ZBarSymbol
+    except ImportError:
+        import cv2
+        detector = cv2.QRCodeDetectorAruco() if hasattr(cv2, 'QRCodeDetectorAruco') else cv2.QRCodeDetector()
+        text, _, _ = detector.detectAndDecode(gray)
+        return [text] if text else []
+    return [symbol.data.decode('utf-8', 'replace') for symbol in pyzbar.decode(gray, symbols=[ZBarSymbol.QRCODE])]
+
+
+class QRImageCache:
+    """In-process LRU of rendered QR images, keyed by ETag"""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # etag -> image bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, qr_content, image_format='png'):
+        """Return (image bytes, etag), rendering the image on a miss"""
+        etag = qr_image_etag(qr_content, image_format)
+        with self.lock:
+            image = self.entries.get(etag)
+            if image is not None:
+                self.entries.move_to_end(etag)
+                self.hits += 1
+                return image, etag
+            self.misses += 1
+
+        image = render_qr_image(qr_content, image_format)
+        with self.lock:
+            self.entries[etag] = image
+            self.entries.move_to_end(etag)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return image, etag
+
+    def stats(self):
+        """Hit/miss counters for this process"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': sum(len(image) for image in self.entries.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+def get_qr_image_cache(max_entries=512):
+    """Return this process's QR image cache, creating it on first use"""
+    global _qr_image_cache
+    if _qr_image_cache is None:
+        _qr_image_cache = QRImageCache(max_entries=max_entries)
+    return _qr_image_cache
+
 
 class QRGenerator:
     def __init__(self):
@@ -12,44 +114,25 @@ class QRGenerator:
     def generate_qr_code(self, vehicle_id, vehicle_number, expiry_date, user_id):
         """
         Generate a QR code for a vehicle with compliance information
+
+        Only the content is stored; images are rendered on demand by the
+        QR image endpoint. Returns (QR code record, content).
         """
         try:
-            # Create QR code content with vehicle info
-            qr_data = {
-                'vehicle_id': vehicle_id,
-                'vehicle_number': vehicle_number,
-                'expiry_date': expiry_date.isoformat() if expiry_date else None,
-                'generated_at': datetime.utcnow().isoformat(),
-                'status': 'valid',  # This will be checked against database when scanned
-                'user_id': user_id
-            }
-            
-            qr_content = json.dumps(qr_data)
-            
-            # Create QR code image
-            qr_img = qrcode.make(qr_content)
-            
-            # Create filename
-            qr_filename = f"qr_{vehicle_id}_{vehicle_number.replace(' ', '_').replace('/', '_')}.png"
-            qr_path = os.path.join('app', 'static', 'qr_codes', qr_filename)
-            
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(qr_path), exist_ok=True)
-            
-            # Save QR code image
-            qr_img.save(qr_path)
+            # Create signed QR code content with vehicle info
+            from app.utils.helpers import generate_qr_content
+            qr_content = generate_qr_content(vehicle_id, vehicle_number, expiry_date)
             
             # Create QR code record in database
             qr_code = QRCodeModel(
                 vehicle_id=vehicle_id,
-                qr_code_path=qr_path,
                 qr_content=qr_content
             )
             
             db.session.add(qr_code)
             db.session.commit()
             
-            return qr_path, qr_content
+            return qr_code, qr_content
         except Exception as e:
             print(f"Error generating QR code: {e}")
             return None, None
@@ -59,9 +142,9 @@ class QRGenerator:
         Validate QR code content against database
         """
         try:
-            # Parse QR content
-            qr_data = json.loads(qr_content)
-            vehicle_id = qr_data.get('vehicle_id')
+            # Parse QR content (signed payload or legacy JSON)
+            qr_data = decode_qr_payload(qr_content, get_qr_signing_key(current_app.config))
+            vehicle_id = qr_data['vehicle_id']
             
             # Get vehicle from database
             vehicle = Vehicle.query.get(vehicle_id)
@@ -77,23 +160,17 @@ class QRGenerator:
             compliance_status = calculate_compliance_status(vehicle.cng_expiry_date)
             
             # Check if QR code has expired (generated more than 24 hours ago)
-            generated_at = datetime.fromisoformat(qr_data['generated_at'])
-            if (datetime.utcnow() - generated_at).days > 0:
+            generated_at = qr_data['issued_at']
+            if generated_at is None or (datetime.utcnow() - generated_at).days > 0:
                 # QR code is still valid but generated long ago, update the data
-                updated_data = {
-                    'vehicle_id': vehicle.id,
-                    'vehicle_number': vehicle.vehicle_number,
-                    'expiry_date': vehicle.cng_expiry_date.isoformat() if vehicle.cng_expiry_date else None,
-                    'generated_at': datetime.utcnow().isoformat(),
-                    'status': compliance_status,
-                    'user_id': vehicle.user_id
-                }
+                from app.utils.helpers import generate_qr_content
+                updated_data = generate_qr_content(vehicle.id, vehicle.vehicle_number, vehicle.cng_expiry_date)
                 
                 return {
                     'valid': True,
                     'message': 'QR code validated successfully',
                     'vehicle': vehicle,
-                    'updated_data': json.dumps(updated_data),
+                    'updated_data': updated_data,
                     'compliance_status': compliance_status
                 }
             
@@ -103,10 +180,10 @@ class QRGenerator:
                 'vehicle': vehicle,
                 'compliance_status': compliance_status
             }
-        except json.JSONDecodeError:
+        except QRPayloadError as e:
             return {
                 'valid': False,
-                'message': 'Invalid QR code format',
+                'message': str(e),
                 'vehicle': None
             }
         except Exception as e:
@@ -122,24 +199,17 @@ class QRGenerator:
         Scan QR code from an image file
         """
         try:
-            from pyzbar import pyzbar
+            import numpy as np
             from PIL import Image
             
             # Load image
-            img = Image.open(image_path)
+            img = Image.open(image_path).convert('L')
             
             # Decode QR codes
-            decoded_objects = pyzbar.decode(img)
+            decoded = read_qr_codes(np.array(img))
             
-            if decoded_objects:
-                # Return the first QR code found
-                return decoded_objects[0].data.decode('utf-8')
-            else:
-                return None
-        except ImportError:
-            # If pyzbar is not installed, return None
-            print("pyzbar not installed. Install it with: pip install pyzbar")
-            return None
+            # Return the first QR code found
+            return decoded[0] if decoded else None
         except Exception as e:
             print(f"Error scanning QR code from image: {e}")
             return None
\ No newline at end of file
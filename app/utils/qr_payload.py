@@ -0,0 +1,182 @@
+"""Compact signed QR code payloads.
+
+The first QR codes held verbose JSON (vehicle id, plate, ISO timestamps),
+which needs a large QR version, and every scan had to look the vehicle up
+in the database. A payload now packs the vehicle id, plate, CNG expiry
+date and issue time into a few bytes, signs them with a truncated
+HMAC-SHA256 and encodes the result in base45 (RFC 9285). Base45 only uses
+characters of the QR alphanumeric mode, so the code stays small and quick
+to scan, and a verifier holding the key can trust the expiry without a
+database round trip.
+
+Layout (version 1), base45-encoded after the 'FL:' prefix:
+
+    version     1 byte
+    vehicle id  4 bytes
+    expiry      2 bytes, days since 2000-01-01 plus one (0 when there is
+                none); dates outside 2000-01-01..2179-06-05 are clamped
+                to that range, which only matters to the date shown, not
+                to whether the vehicle is expired
+    issued at   4 bytes, Unix time in seconds
+    plate       1 length byte, then the plate in ASCII
+    signature   8 bytes, HMAC-SHA256 of everything above
+
+Codes holding the old JSON are still decoded, marked as unsigned.
+"""
+
+import hashlib
+import hmac
+import json
+import struct
+from datetime import date, datetime, timedelta
+from app.utils.error_handler import QRPayloadError
+
+PAYLOAD_PREFIX = 'FL:'
+PAYLOAD_VERSION = 1
+
+# version, vehicle id, expiry days, issued at, plate length
+HEADER = struct.Struct('!BIHIB')
+
+SIGNATURE_BYTES = 8
+
+EXPIRY_EPOCH = date(2000, 1, 1)
+
+# Largest value of the 2-byte expiry and the 4-byte vehicle id and issue time
+MAX_EXPIRY_DAYS = 0xFFFF
+MAX_UINT32 = 0xFFFFFFFF
+
+BASE45_CHARSET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:'
+BASE45_VALUES = {char: value for value, char in enumerate(BASE45_CHARSET)}
+
+
+def b45encode(data):
+    """Base45-encode bytes (RFC 9285)"""
+    chars = []
+    for index in range(0, len(data) - 1, 2):
+        value = data[index] * 256 + data[index + 1]
+        value, low = divmod(value, 45)
+        high, middle = divmod(value, 45)
+        chars.extend((BASE45_CHARSET[low], BASE45_CHARSET[middle], BASE45_CHARSET[high]))
+    if len(data) % 2:
+        high, low = divmod(data[-1], 45)
+        chars.extend((BASE45_CHARSET[low], BASE45_CHARSET[high]))
+    return ''.join(chars)
+
+
+def b45decode(text):
+    """Decode base45 text to bytes; raises QRPayloadError on malformed input"""
+    try:
+        values = [BASE45_VALUES[char] for char in text]
+    except KeyError:
+        raise QRPayloadError('Invalid character in QR code data')
+    if len(values) % 3 == 1:
+        raise QRPayloadError('Truncated QR code data')
+    data = bytearray()
+    for index in range(0, len(values), 3):
+        chunk = values[index:index + 3]
+        value = sum(digit * 45 ** position for position, digit in enumerate(chunk))
+        if len(chunk) == 3:
+            if value > 0xFFFF:
+                raise QRPayloadError('Invalid QR code data')
+            data.extend(divmod(value, 256))
+        else:
+            if value > 0xFF:
+                raise QRPayloadError('Invalid QR code data')
+            data.append(value)
+    return bytes(data)
+
+
+def get_qr_signing_key(config):
+    """HMAC key for QR payloads: QR_SIGNING_KEY, else derived from SECRET_KEY"""
+    secret = config.get('QR_SIGNING_KEY') or config.get('SECRET_KEY') or ''
+    # Derived so the raw secret is never used for anything but this purpose
+    return hashlib.sha256(b'fuellens-qr-payload:' + secret.encode('utf-8')).digest()
+
+
+def sign(body, key):
+    return hmac.new(key, body, hashlib.sha256).digest()[:SIGNATURE_BYTES]
+
+
+def encode_qr_payload(vehicle_id, vehicle_number, expiry_date, key, issued_at=None):
+    """
+    Signed, base45-encoded QR content for a vehicle
+
+    Raises QRPayloadError when the vehicle id or the issue time do not fit
+    the payload; expiry dates outside its range are clamped.
+    """
+    if not 0 <= vehicle_id <= MAX_UINT32:
+        raise QRPayloadError(f'Vehicle id {vehicle_id} does not fit a QR payload')
+    plate = (vehicle_number or '').encode('ascii', 'ignore')[:255]
+    expiry_days = 0
+    if expiry_date:
+        if isinstance(expiry_date, datetime):
+            expiry_date = expiry_date.date()
+        # Day 1 is the epoch itself; 0 stands for no expiry
+        expiry_days = min(max((expiry_date - EXPIRY_EPOCH).days + 1, 1), MAX_EXPIRY_DAYS)
+    issued_at = issued_at or datetime.utcnow()
+    timestamp = int((issued_at - datetime(1970, 1, 1)).total_seconds())
+    if not 0 <= timestamp <= MAX_UINT32:
+        raise QRPayloadError(f'Issue time {issued_at} does not fit a QR payload')
+    body = HEADER.pack(PAYLOAD_VERSION, vehicle_id, expiry_days, timestamp, len(plate)) + plate
+    return PAYLOAD_PREFIX + b45encode(body + sign(body, key))
+
+
+def decode_qr_payload(content, key):
+    """
+    Decode QR content, either a signed payload or the legacy JSON.
+
+    Returns a dict with vehicle_id, vehicle_number, expiry_date (date or
+    None), issued_at (datetime or None), version (0 for legacy JSON) and
+    signed. Raises QRPayloadError when the content is neither, or when
+    the signature does not match.
+    """
+    content = (content or '').strip()
+    if content.startswith(PAYLOAD_PREFIX):
+        return decode_signed_payload(content[len(PAYLOAD_PREFIX):], key)
+    return decode_legacy_payload(content)
+
+
+def decode_signed_payload(text, key):
+    data = b45decode(text)
+    if len(data) < HEADER.size + SIGNATURE_BYTES:
+        raise QRPayloadError('Truncated QR code data')
+    body, signature = data[:-SIGNATURE_BYTES], data[-SIGNATURE_BYTES:]
+    if not hmac.compare_digest(sign(body, key), signature):
+        raise QRPayloadError('QR code signature does not match')
+
+    version, vehicle_id, expiry_days, timestamp, plate_length = HEADER.unpack_from(body)
+    if version != PAYLOAD_VERSION:
+        raise QRPayloadError(f'Unsupported QR code version {version}')
+    plate = body[HEADER.size:]
+    if len(plate) != plate_length:
+        raise QRPayloadError('Truncated QR code data')
+    return {
+        'vehicle_id': vehicle_id,
+        'vehicle_number': plate.decode('ascii'),
+        'expiry_date': EXPIRY_EPOCH + timedelta(days=expiry_days - 1) if expiry_days else None,
+        'issued_at': datetime(1970, 1, 1) + timedelta(seconds=timestamp),
+        'version': version,
+        'signed': True
+    }
+
+
+def decode_legacy_payload(content):
+    try:
+        data = json.loads(content)
+    except ValueError:
+        raise QRPayloadError('Invalid QR code format')
+    if not isinstance(data, dict) or not isinstance(data.get('vehicle_id'), int):
+        raise QRPayloadError('Invalid QR code format')
+    try:
+        expiry_date = date.fromisoformat(data['expiry_date']) if data.get('expiry_date') else None
+        issued_at = datetime.fromisoformat(data['generated_at']) if data.get('generated_at') else None
+    except (TypeError, ValueError):
+        raise QRPayloadError('Invalid QR code format')
+    return {
+        'vehicle_id': data['vehicle_id'],
+        'vehicle_number': data.get('vehicle_number'),
+        'expiry_date': expiry_date,
+        'issued_at': issued_at,
+        'version': 0,
+        'signed': False
+    }
@@ -0,0 +1,228 @@
+"""Admission control for synchronous camera scans.
+
+A camera scan can hold a sync gunicorn worker for seconds. In a rush
+enough of them arrive together to occupy every worker, and logins,
+nearby-station lookups and dashboards queue behind them. So a scan needs
+a slot before it runs: at most PLATE_SCAN_MAX_ACTIVE at once, and at most
+PLATE_SCAN_MAX_PER_STATION for any one station. A scan that finds no free
+slot waits in a short bounded queue; when the queue is full or the wait
+runs out it is refused at once and the client gets a 503 with Retry-After.
+
+A sync worker only runs one request at a time, so a limit kept inside
+each worker would bound nothing. The slots live in shared memory created
+by create_app; with gunicorn's preload_app that runs in the master, so
+every worker it forks shares one set of slots. Each slot records the pid
+holding it, and slots held by a worker that was killed mid-scan are
+reclaimed. The lock guarding the slots cannot be reclaimed that way, so
+it is only ever waited for briefly: a worker killed (e.g. by a gunicorn
+timeout) while holding it makes scans answer 503 instead of hanging.
+"""
+
+import multiprocessing
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from multiprocessing.sharedctypes import RawArray
+from app.utils.error_handler import OCRQueueFullError
+
+# Shared counters, by index in the counters array
+COUNTERS = ['admitted', 'waited', 'rejected_queue_full', 'rejected_timeout', 'rejected_lock_timeout', 'reclaimed',
+            'wait_ms_total', 'wait_ms_max']
+
+# How often a waiting scan looks for a freed slot or one left by a killed worker, in seconds
+POLL_INTERVAL = 0.05
+
+# Longest wait for the slot lock, which is only ever held for microseconds, in seconds
+LOCK_TIMEOUT = 1.0
+
+# Created by create_app and inherited by forked workers
+_admission = None
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ScanAdmission:
+    """Scan slots and a bounded wait queue shared by every worker forked after it is created"""
+
+    def __init__(self, max_active=2, max_per_station=1, max_waiting=1, max_wait=1.0):
+        self.max_active = max_active
+        self.max_per_station = max_per_station
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self.lock = multiprocessing.Lock()
+        # (holder pid, station id) per slot; pid 0 marks a free slot
+        self.slots = RawArray('q', max_active * 2)
+        # pid per queue place; 0 marks a free place
+        self.waiters = RawArray('q', max_waiting)
+        self.counters = RawArray('q', len(COUNTERS))
+
+    def count(self, name, value=1):
+        self.counters[COUNTERS.index(name)] += value
+
+    @contextmanager
+    def locked(self):
+        """
+        Hold the slot lock for the block; raises OCRQueueFullError when it cannot be taken in time.
+
+        A multiprocessing lock is not freed when its holder dies, so it is
+        never waited for without a timeout.
+        """
+        if not self.lock.acquire(timeout=LOCK_TIMEOUT):
+            # Not under the lock, a lost increment does not matter
+            self.count('rejected_lock_timeout')
+            raise OCRQueueFullError('Scan admission is not responding')
+        try:
+            yield
+        finally:
+            self.lock.release()
+
+    def reclaim(self):
+        """Free slots and queue places of workers that died holding them (lock held)"""
+        for index in range(self.max_active):
+            pid = self.slots[index * 2]
+            if pid and not pid_alive(pid):
+                self.slots[index * 2] = self.slots[index * 2 + 1] = 0
+                self.count('reclaimed')
+        for index, pid in enumerate(self.waiters):
+            if pid and not pid_alive(pid):
+                self.waiters[index] = 0
+
+    def free_slot(self, station_key):
+        """Index of a slot a scan for this station may take, or None (lock held)"""
+        free = None
+        station_active = 0
+        for index in range(self.max_active):
+            pid, station = self.slots[index * 2], self.slots[index * 2 + 1]
+            if not pid:
+                if free is None:
+                    free = index
+            elif station_key and station == station_key:
+                station_active += 1
+        if station_active >= self.max_per_station:
+            return None
+        return free
+
+    def acquire(self, station_id=None):
+        """
+        Take a scan slot, waiting up to max_wait for one; returns the slot index.
+
+        Raises OCRQueueFullError when the wait queue is full, no slot
+        frees up in time or the slot lock cannot be taken.
+        """
+        station_key = station_id or 0
+        pid = os.getpid()
+        started = time.monotonic()
+        with self.locked():
+            self.reclaim()
+            slot = self.free_slot(station_key)
+            if slot is not None:
+                self.take(slot, pid, station_key)
+                return slot
+            place = next((index for index, waiter in enumerate(self.waiters) if not waiter), None)
+            if place is None:
+                self.count('rejected_queue_full')
+                raise OCRQueueFullError('Too many scans in progress')
+            self.waiters[place] = pid
+            self.count('waited')
+
+        # Wait outside the lock, looking for a free slot every POLL_INTERVAL
+        try:
+            deadline = started + self.max_wait
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.count('rejected_timeout')
+                    raise OCRQueueFullError('Timed out waiting for a scan slot')
+                time.sleep(min(remaining, POLL_INTERVAL))
+                with self.locked():
+                    self.reclaim()
+                    slot = self.free_slot(station_key)
+                    if slot is not None:
+                        self.take(slot, pid, station_key)
+                        break
+        finally:
+            self.waiters[place] = 0
+        wait_ms = int((time.monotonic() - started) * 1000)
+        self.count('wait_ms_total', wait_ms)
+        longest = COUNTERS.index('wait_ms_max')
+        self.counters[longest] = max(self.counters[longest], wait_ms)
+        return slot
+
+    def take(self, slot, pid, station_key):
+        """Mark a free slot as held by this worker (lock held)"""
+        self.slots[slot * 2] = pid
+        self.slots[slot * 2 + 1] = station_key
+        self.count('admitted')
+
+    def release(self, slot):
+        # Only the holder writes its slot, so it is freed even when the lock is stuck
+        self.slots[slot * 2 + 1] = 0
+        self.slots[slot * 2] = 0
+
+    @contextmanager
+    def admit(self, station_id=None):
+        """Hold a scan slot for the block"""
+        slot = self.acquire(station_id)
+        try:
+            yield
+        finally:
+            self.release(slot)
+
+    def stats(self):
+        """Scans running and waiting now, by station, plus the counters since startup"""
+        # Read without the lock, a stuck lock must not take the metrics page with it
+        stations = [self.slots[index * 2 + 1] for index in range(self.max_active) if self.slots[index * 2]]
+        waiting = sum(1 for waiter in self.waiters if waiter)
+        counters = dict(zip(COUNTERS, self.counters))
+        return {
+            'active': len(stations),
+            'waiting': waiting,
+            'active_by_station': {str(station): count for station, count in Counter(stations).items() if station},
+            'max_active': self.max_active,
+            'max_per_station': self.max_per_station,
+            'max_waiting': self.max_waiting,
+            'max_wait': self.max_wait,
+            **counters
+        }
+
+
+def init_scan_admission(config):
+    """Create the shared scan slots; create_app calls this so gunicorn workers inherit them"""
+    global _admission
+    _admission = None
+    if config.get('PLATE_SCAN_ADMISSION_ENABLED', True):
+        _admission = ScanAdmission(
+            max_active=config.get('PLATE_SCAN_MAX_ACTIVE', 2),
+            max_per_station=config.get('PLATE_SCAN_MAX_PER_STATION', 1),
+            max_waiting=config.get('PLATE_SCAN_MAX_WAITING', 1),
+            max_wait=config.get('PLATE_SCAN_MAX_WAIT', 1.0)
+        )
+    return _admission
+
+
+@contextmanager
+def scan_slot(station_id=None):
+    """
+    Hold a scan slot for the block; raises OCRQueueFullError when the scan is shed.
+
+    Does nothing when admission control is disabled.
+    """
+    if _admission is None:
+        yield
+        return
+    with _admission.admit(station_id):
+        yield
+
+
+def get_scan_admission_stats():
+    """Shared admission state and counters, or None when admission control is disabled"""
+    return _admission.stats() if _admission is not None else None
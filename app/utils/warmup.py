@@ -0,0 +1,139 @@
+"""Warm the plate pipeline before gunicorn forks its workers.
+
+With preload_app the app is built once in the gunicorn master, but the
+first camera scan on every worker still pays the pipeline's one-time
+costs: importing OpenCV and NumPy, compiling the plate regexes, creating
+CLAHE and OpenCV's lazily initialised kernels, loading the OCR library,
+reading the detection log into the corrector and cascade order and
+loading the character templates.
+Doing that in the master (PLATE_WARMUP_ENABLED) lets every worker share
+the result copy-on-write.
+
+Tesseract engines are not fork-safe, so each worker builds its own in the
+post_fork hook (warm_worker) rather than on its first scan.
+"""
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Step timings of the warmup run in this process (inherited by forked workers)
+_warmup_report = None
+
+
+def warm_imports():
+    import cv2
+    import numpy
+    import app.utils.plate_detector
+
+
+def warm_regexes():
+    from app.utils.security import validate_vehicle_number
+    # Patterns passed to re functions as strings are compiled into re's cache on first use
+    validate_vehicle_number('MH12AB1234')
+
+
+def warm_detector():
+    """
+    Build a detector: the corrector, cascade order and character templates are read here
+
+    The detection log is only read; its writer thread and connection are
+    started by each worker's first detection, after the fork.
+    """
+    from app.utils.plate_detector import PlateDetector
+    return PlateDetector()
+
+
+def warm_pipeline(detector):
+    """Run decoding, localization and every enhancement once on a synthetic plate"""
+    import cv2
+    import numpy as np
+
+    image = np.full((240, 320), 90, np.uint8)
+    cv2.rectangle(image, (80, 100), (240, 140), 255, -1)
+    cv2.putText(image, 'MH12AB1234', (88, 130), cv2.FONT_HERSHEY_SIMPLEX, 0.6, 0, 2)
+    gray = detector.decode_image(cv2.imencode('.png', image)[1].tobytes())
+    regions = detector.localizer.localize(gray) if detector.localizer else []
+    if detector.char_recognizer is not None:
+        detector.char_recognizer.read(regions[0] if regions else gray)
+    graph = detector.enhance_image_for_plate_detection(regions[0] if regions else gray)
+    try:
+        list(graph)
+    finally:
+        graph.close()
+
+
+def warm_ocr_library(backend):
+    """Load the OCR library; the engine itself is built per worker"""
+    from app.utils.ocr_engine import OCR_BACKENDS, resolve_backend_name
+    name = resolve_backend_name(backend)
+    if name == 'pytesseract':
+        OCR_BACKENDS[name]()
+    return name
+
+
+def warm_up(app):
+    """
+    Initialise the plate pipeline's one-time state in this process.
+
+    Called from create_app when PLATE_WARMUP_ENABLED is set. A step that
+    fails is logged and skipped; the worker then pays for it on first
+    use as before. Returns the timing report.
+    """
+    global _warmup_report
+    started = time.perf_counter()
+    steps = {}
+    report = {'steps': steps, 'backend': None}
+
+    def timed(step, function, *args):
+        step_started = time.perf_counter()
+        try:
+            return function(*args)
+        except Exception as e:
+            logger.warning(f"Warmup step {step} failed: {e}")
+            return None
+        finally:
+            steps[step] = round((time.perf_counter() - step_started) * 1000, 1)
+
+    with app.app_context():
+        timed('imports', warm_imports)
+        timed('regexes', warm_regexes)
+        detector = timed('detector', warm_detector)
+        if detector is not None:
+            timed('pipeline', warm_pipeline, detector)
+        if not app.config.get('PLATE_OCR_SERVICE_SOCKET'):
+            report['backend'] = timed('ocr_library', warm_ocr_library, app.config.get('PLATE_OCR_BACKEND', 'auto'))
+
+    report['total_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    _warmup_report = report
+    logger.info(f"Warmup finished in {report['total_ms']:.0f} ms "
+                f"({', '.join(f'{step} {ms:.0f} ms' for step, ms in steps.items())})")
+    return report
+
+
+def warm_worker():
+    """
+    Build this worker's OCR engine right after fork (gunicorn post_fork hook).
+
+    Does nothing unless the master ran warm_up, when scans go to the
+    shared OCR service, or for pytesseract, which starts tesseract per call.
+    """
+    if _warmup_report is None or _warmup_report['backend'] != 'tesserocr':
+        return
+    import numpy as np
+    from app.utils.ocr_engine import ocr_with_confidence
+
+    started = time.perf_counter()
+    try:
+        # One call on a blank image finishes the engine's lazy setup too
+        ocr_with_confidence(np.full((32, 96), 255, np.uint8), '--psm 7', 'tesserocr')
+    except Exception as e:
+        logger.warning(f"Worker OCR warmup failed: {e}")
+        return
+    logger.info(f"Worker OCR engine ready in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+def get_warmup_report():
+    """Timings of the warmup this process inherited, or None when it did not run"""
+    return _warmup_report
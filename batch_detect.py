@@ -0,0 +1,66 @@
+"""Batch plate detection: check a folder or ZIP archive of photos against the registry.
+
+Writes one CSV row or JSON line per image, e.g.
+
+    python batch_detect.py enforcement_photos.zip --output results.csv
+    python batch_detect.py photos/ --format jsonl --workers 8 > results.jsonl
+
+With --worker it runs the archives uploaded to /batch-detect instead,
+one at a time, until stopped:
+
+    python batch_detect.py --worker
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from app import create_app
+from app.utils.batch_detect import OUTPUT_FORMATS, iter_images, run_batch, get_batch_runner
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', nargs='?', help='Directory or ZIP archive of images')
+    parser.add_argument('--worker', action='store_true', help='Run the batches uploaded to /batch-detect')
+    parser.add_argument('--format', choices=sorted(OUTPUT_FORMATS), default='csv', help='Output format')
+    parser.add_argument('--output', help='Write results to this file instead of stdout')
+    parser.add_argument('--workers', type=int, help='OCR processes (default: BATCH_DETECT_WORKERS)')
+    parser.add_argument('--chunk-size', type=int, help='Results resolved per vehicle query')
+    parser.add_argument('--exact', action='store_true', help='Only match registered numbers exactly')
+    args = parser.parse_args()
+    if bool(args.source) == args.worker:
+        parser.error('give either a source or --worker')
+
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+    if args.worker:
+        with app.app_context():
+            runner = get_batch_runner(threads=1)
+        print(f"Batch worker {os.getpid()} waiting for uploaded batches", file=sys.stderr)
+        runner.join()
+        return
+
+    try:
+        images = iter_images(args.source)
+    except (ValueError, OSError) as e:
+        parser.error(str(e))
+
+    output = open(args.output, 'w', newline='') if args.output else sys.stdout
+    started = time.monotonic()
+    with app.app_context():
+        try:
+            counts = run_batch(images, output, app.config, args.format, workers=args.workers,
+                               chunk_size=args.chunk_size, exact=args.exact)
+        finally:
+            if args.output:
+                output.close()
+
+    elapsed = time.monotonic() - started
+    counts['seconds'] = round(elapsed, 1)
+    counts['images_per_second'] = round(counts['images'] / elapsed, 2) if elapsed else None
+    print(json.dumps({'stats': counts}), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+"""Performance benchmarks for FuelLens. Run each module with `python -m benchmarks.<name>`."""
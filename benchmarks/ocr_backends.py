@@ -0,0 +1,82 @@
+"""Per-call overhead of the OCR backends used by PlateDetector.
+
+Renders a plate crop like the ones the localizer produces and times repeated
+OCR calls on every backend that can run on this machine, e.g.
+
+    python -m benchmarks.ocr_backends --calls 50 --json results.json
+
+The pytesseract numbers are the "before" (one tesseract process per call),
+the tesserocr numbers the "after" (one engine kept loaded per process).
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+import cv2
+import numpy as np
+
+from app.utils.ocr_engine import OCR_BACKENDS, get_ocr_backend, tesserocr
+
+# Same config the cascade tries first
+OCR_CONFIG = r'--oem 3 --psm 7 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+
+
+def render_plate(text='MH12AB1234'):
+    """Render a clean 96px-high plate crop"""
+    plate = np.full((96, 480), 240, np.uint8)
+    cv2.rectangle(plate, (2, 2), (477, 93), 0, 3)
+    cv2.putText(plate, text, (16, 70), cv2.FONT_HERSHEY_SIMPLEX, 1.9, 0, 5)
+    return plate
+
+
+def time_backend(name, image, calls):
+    """Time `calls` OCR calls on one backend; the engine start-up is reported separately"""
+    started = time.perf_counter()
+    backend = get_ocr_backend(name)
+    startup_ms = (time.perf_counter() - started) * 1000
+
+    timings = []
+    text = ''
+    for _ in range(calls):
+        started = time.perf_counter()
+        text, _ = backend.recognize(image, OCR_CONFIG)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    timings.sort()
+    return {
+        'backend': backend.name,
+        'calls': calls,
+        'startup_ms': round(startup_ms, 2),
+        'mean_ms': round(statistics.mean(timings), 2),
+        'p50_ms': round(timings[len(timings) // 2], 2),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        'text': text,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=30, help='OCR calls per backend')
+    parser.add_argument('--json', dest='json_path', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    image = render_plate()
+    backends = [name for name in OCR_BACKENDS if name != 'tesserocr' or tesserocr is not None]
+
+    results = [time_backend(name, image, args.calls) for name in backends]
+    for result in results:
+        print(f"{result['backend']:<12} startup {result['startup_ms']:>8.2f} ms  "
+              f"mean {result['mean_ms']:>8.2f} ms  p50 {result['p50_ms']:>8.2f} ms  "
+              f"p95 {result['p95_ms']:>8.2f} ms  text={result['text']!r}")
+    if tesserocr is None:
+        print("tesserocr not installed, only the pytesseract baseline was measured")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
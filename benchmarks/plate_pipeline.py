@@ -0,0 +1,440 @@
+"""Accuracy and latency of the plate pipeline per enhancement variant and PSM.
+
+Renders synthetic Indian plates (several fonts, blur, perspective, noise,
+glare) into street-like frames, optionally adds a directory of real
+captures, and runs every sample through the pipeline twice:
+
+* the full grid: every enhancement variant x every tesseract config, with
+  no early exit, to show which combinations read the plate at all
+* the end-to-end PlateDetector.detect_plate call, as /camera-scan runs it
+
+e.g.
+
+    python -m benchmarks.plate_pipeline --samples 60 --json release-1.4.json
+    python -m benchmarks.plate_pipeline --captures captures/ --compare release-1.3.json
+
+Real captures are named after the plate they show (MH12AB1234.jpg, or
+MH12AB1234_2.jpg for several shots of the same plate).
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import time
+from collections import defaultdict
+
+import cv2
+import numpy as np
+from flask import Flask
+from PIL import Image, ImageFilter, ImageFont
+
+from app.utils.ocr_engine import ocr_with_confidence
+from app.utils.plate_corrector import STATE_RTO_CODES
+from app.utils.plate_detector import ENHANCEMENT_VARIANTS, OCR_CONFIGS, PlateDetector
+from app.utils.plate_render import PLATE_FONT_PATHS, render_plate
+
+# Distortion applied to each synthetic sample, in rotation
+DISTORTIONS = ['clean', 'blur', 'perspective', 'noise', 'glare', 'combined']
+
+CAPTURE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+STAGES = ['decode', 'localize', 'segment', 'enhance', 'ocr', 'correct']
+
+
+def psm_of(config):
+    return int(re.search(r'--psm (\d+)', config).group(1))
+
+
+def load_fonts(paths, size=84):
+    """Truetype fonts that exist on this machine, or PIL's built-in bitmap font"""
+    fonts = []
+    for path in paths:
+        if os.path.exists(path):
+            try:
+                fonts.append((os.path.basename(path), ImageFont.truetype(path, size)))
+            except OSError as e:
+                print(f"Error loading font {path}: {e}")
+    if not fonts:
+        print("No truetype fonts found, using PIL's bitmap font (pass --font to add one)")
+        fonts.append(('default', None))
+    return fonts
+
+
+def random_plate_text(rng):
+    """A plausible registration number: state + RTO + series + number, or a BH-series plate"""
+    letters = 'ABCDEFGHJKLMNPRSTUVWXYZ'
+    number = f'{rng.integers(1, 10000):04d}'
+    if rng.random() < 0.1:
+        suffix = ''.join(rng.choice(list(letters), size=rng.integers(1, 3)))
+        return f'{rng.integers(21, 27)}BH{number}{suffix}'
+    state = rng.choice(sorted(STATE_RTO_CODES))
+    rto = rng.integers(1, STATE_RTO_CODES[state] + 1)
+    series = ''.join(rng.choice(list(letters), size=rng.integers(1, 3)))
+    return f'{state}{rto:02d}{series}{number}'
+
+
+def warp_perspective(plate, rng, strength):
+    """Tilt the plate as if the camera were off-axis"""
+    height, width = plate.shape
+    jitter = strength * np.array([width, height], np.float32)
+    src = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    dst = src + rng.uniform(-1, 1, (4, 2)).astype(np.float32) * jitter
+    dst -= dst.min(axis=0)
+    out_w, out_h = (int(v) + 1 for v in dst.max(axis=0))
+    matrix = cv2.getPerspectiveTransform(src, dst)
+    return cv2.warpPerspective(plate, matrix, (out_w, out_h), borderValue=70)
+
+
+def add_glare(frame, rng, center):
+    """Blend a bright elliptical highlight over part of the frame"""
+    mask = np.zeros(frame.shape[:2], np.float32)
+    axes = (int(rng.integers(60, 160)), int(rng.integers(30, 80)))
+    cv2.ellipse(mask, center, axes, float(rng.uniform(0, 180)), 0, 360, 1.0, -1)
+    mask = cv2.GaussianBlur(mask, (0, 0), 25) * rng.uniform(0.6, 0.95)
+    return (frame * (1 - mask) + 255 * mask).astype(np.uint8)
+
+
+def render_scene(text, font, distortion, rng):
+    """Encode a 1280x720 street-like frame with the plate on a car body as JPEG bytes"""
+    frame = rng.normal(115, 22, (720, 1280)).clip(0, 255).astype(np.uint8)
+    left, top = int(rng.integers(150, 500)), int(rng.integers(120, 260))
+    cv2.rectangle(frame, (left, top), (left + 700, top + 420), int(rng.integers(40, 90)), -1)
+
+    plate = render_plate(text, font)
+    if distortion in ('perspective', 'combined'):
+        plate = warp_perspective(plate, rng, 0.08)
+    scale = rng.uniform(0.55, 1.0)
+    plate = cv2.resize(plate, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    plate_h, plate_w = plate.shape
+    x, y = left + (700 - plate_w) // 2, top + 260
+    frame[y:y + plate_h, x:x + plate_w] = plate
+
+    frame = Image.fromarray(frame)
+    if distortion in ('blur', 'combined'):
+        frame = frame.filter(ImageFilter.GaussianBlur(rng.uniform(1.2, 2.4)))
+    frame = np.array(frame)
+    if distortion in ('noise', 'combined'):
+        frame = (frame + rng.normal(0, 18, frame.shape)).clip(0, 255).astype(np.uint8)
+    if distortion in ('glare', 'combined'):
+        frame = add_glare(frame, rng, (x + int(rng.integers(0, plate_w)), y + plate_h // 2))
+
+    ok, encoded = cv2.imencode('.jpg', cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR),
+                               [cv2.IMWRITE_JPEG_QUALITY, int(rng.integers(70, 95))])
+    return encoded.tobytes()
+
+
+def synthetic_samples(count, fonts, seed):
+    rng = np.random.default_rng(seed)
+    samples = []
+    for i in range(count):
+        text = random_plate_text(rng)
+        font_name, font = fonts[i % len(fonts)]
+        distortion = DISTORTIONS[i % len(DISTORTIONS)]
+        samples.append({
+            'name': f'synthetic-{i:04d}',
+            'truth': text,
+            'source': 'synthetic',
+            'font': font_name,
+            'distortion': distortion,
+            'data': render_scene(text, font, distortion, rng),
+        })
+    return samples
+
+
+def capture_samples(directory):
+    """Real captures; the ground truth is the file name up to the first underscore or dot"""
+    samples = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(CAPTURE_EXTENSIONS):
+            continue
+        truth = re.sub(r'[^A-Z0-9]', '', os.path.splitext(name)[0].split('_')[0].upper())
+        with open(os.path.join(directory, name), 'rb') as f:
+            samples.append({
+                'name': name,
+                'truth': truth,
+                'source': 'capture',
+                'font': None,
+                'distortion': 'capture',
+                'data': f.read(),
+            })
+    return samples
+
+
+def run_grid(detector, sample):
+    """
+    OCR every (variant, config) pair of one sample without early exit.
+
+    Returns the stage timings in ms and, per pair, whether it read the plate
+    and how long its OCR calls took.
+    """
+    timings = defaultdict(float)
+
+    started = time.perf_counter()
+    gray = detector.decode_image(sample['data'])
+    timings['decode'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    regions = detector.localizer.localize(gray) if detector.localizer else []
+    timings['localize'] = (time.perf_counter() - started) * 1000
+
+    if detector.char_recognizer is not None:
+        started = time.perf_counter()
+        for region in regions:
+            detector.char_recognizer.read(region)
+        timings['segment'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    # Variants are computed lazily; the grid needs all of them
+    enhanced = [list(detector.enhance_image_for_plate_detection(region)) for region in regions or [gray]]
+    timings['enhance'] = (time.perf_counter() - started) * 1000
+
+    pairs = {}
+    for variant, name in enumerate(ENHANCEMENT_VARIANTS):
+        for config in OCR_CONFIGS:
+            hit = False
+            ocr_ms = 0.0
+            for images in enhanced:
+                started = time.perf_counter()
+                text, _ = ocr_with_confidence(images[variant], config, detector.ocr_backend)
+                elapsed = (time.perf_counter() - started) * 1000
+                ocr_ms += elapsed
+                timings['ocr'] += elapsed
+
+                started = time.perf_counter()
+                plate, cost = detector.corrector.correct(text)
+                timings['correct'] += (time.perf_counter() - started) * 1000
+                hit = hit or (plate == sample['truth'] and cost <= detector.max_correction_cost)
+            pairs[(name, psm_of(config))] = {'hit': hit, 'ms': ocr_ms}
+    return dict(timings), pairs
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else None
+
+
+def latency_summary(values):
+    return {
+        'mean_ms': round(statistics.mean(values), 2) if values else None,
+        'p50_ms': round(percentile(values, 0.5), 2) if values else None,
+        'p95_ms': round(percentile(values, 0.95), 2) if values else None,
+    }
+
+
+def summarize(samples, grid_results, end_to_end):
+    """Aggregate the per-sample measurements into the report"""
+    report = {}
+
+    elapsed = [run['elapsed_ms'] for run in end_to_end]
+    report['end_to_end'] = {
+        'samples': len(end_to_end),
+        'accuracy': round(sum(run['correct'] for run in end_to_end) / len(end_to_end), 4),
+        'mean_ocr_calls': round(statistics.mean(run['ocr_calls'] for run in end_to_end), 2),
+        'timeouts': sum(run['timed_out'] for run in end_to_end),
+        'retakes': sum(bool(run['retake']) for run in end_to_end),
+        **latency_summary(elapsed),
+    }
+
+    fast = [run for run in end_to_end if run['recognizer'] == 'segmentation']
+    report['fast_path'] = {
+        'share': round(len(fast) / len(end_to_end), 4),
+        'accuracy': round(sum(run['correct'] for run in fast) / len(fast), 4) if fast else None,
+        **latency_summary([run['elapsed_ms'] for run in fast]),
+    }
+
+    groups = defaultdict(list)
+    for sample, run in zip(samples, end_to_end):
+        groups[sample['distortion']].append(run)
+    report['by_distortion'] = {
+        name: {
+            'samples': len(runs),
+            'accuracy': round(sum(run['correct'] for run in runs) / len(runs), 4),
+            'retakes': sum(bool(run['retake']) for run in runs),
+            **latency_summary([run['elapsed_ms'] for run in runs]),
+        }
+        for name, runs in groups.items()
+    }
+
+    if not grid_results:
+        return report
+
+    report['stages'] = {
+        stage: latency_summary([timings.get(stage, 0.0) for timings, _ in grid_results])
+        for stage in STAGES
+    }
+
+    count = len(grid_results)
+    psms = [psm_of(config) for config in OCR_CONFIGS]
+    report['pairs'] = []
+    for name in ENHANCEMENT_VARIANTS:
+        for psm in psms:
+            runs = [pairs[(name, psm)] for _, pairs in grid_results]
+            report['pairs'].append({
+                'variant': name,
+                'psm': psm,
+                'hit_rate': round(sum(run['hit'] for run in runs) / count, 4),
+                'ocr_mean_ms': round(statistics.mean(run['ms'] for run in runs), 2),
+            })
+
+    # A variant earns its place if it reads plates no other variant reads
+    report['variants'] = []
+    for name in ENHANCEMENT_VARIANTS:
+        hits = unique = 0
+        for _, pairs in grid_results:
+            own = any(pairs[(name, psm)]['hit'] for psm in psms)
+            others = any(hit['hit'] for (variant, _), hit in pairs.items() if variant != name)
+            hits += own
+            unique += own and not others
+        report['variants'].append({
+            'variant': name,
+            'hit_rate': round(hits / count, 4),
+            'unique_hits': unique,
+            'ocr_mean_ms': round(sum(pair['ocr_mean_ms'] for pair in report['pairs']
+                                     if pair['variant'] == name), 2),
+        })
+
+    report['psm'] = []
+    for psm in psms:
+        hits = unique = 0
+        for _, pairs in grid_results:
+            own = any(pairs[(name, psm)]['hit'] for name in ENHANCEMENT_VARIANTS)
+            others = any(hit['hit'] for (_, other), hit in pairs.items() if other != psm)
+            hits += own
+            unique += own and not others
+        report['psm'].append({
+            'psm': psm,
+            'hit_rate': round(hits / count, 4),
+            'unique_hits': unique,
+            'ocr_mean_ms': round(sum(pair['ocr_mean_ms'] for pair in report['pairs']
+                                     if pair['psm'] == psm), 2),
+        })
+    report['grid_reachable'] = round(
+        sum(any(hit['hit'] for hit in pairs.values()) for _, pairs in grid_results) / count, 4
+    )
+    return report
+
+
+def print_report(report):
+    e2e = report['end_to_end']
+    print(f"end-to-end  samples {e2e['samples']}  accuracy {e2e['accuracy']:.1%}  "
+          f"p50 {e2e['p50_ms']:.1f} ms  p95 {e2e['p95_ms']:.1f} ms  "
+          f"ocr calls {e2e['mean_ocr_calls']:.1f}  timeouts {e2e['timeouts']}  retakes {e2e['retakes']}")
+    fast = report['fast_path']
+    if fast['accuracy'] is not None:
+        print(f"fast path   share {fast['share']:.1%}  accuracy {fast['accuracy']:.1%}  "
+              f"p50 {fast['p50_ms']:.1f} ms  p95 {fast['p95_ms']:.1f} ms")
+    for name, group in report['by_distortion'].items():
+        print(f"  {name:<12} accuracy {group['accuracy']:>7.1%}  p50 {group['p50_ms']:>8.1f} ms  "
+              f"retakes {group['retakes']}")
+
+    if 'stages' not in report:
+        return
+    print(f"grid        any pair reads the plate on {report['grid_reachable']:.1%} of samples")
+    for stage, timing in report['stages'].items():
+        print(f"  {stage:<12} mean {timing['mean_ms']:>8.2f} ms  p95 {timing['p95_ms']:>8.2f} ms")
+    for variant in report['variants']:
+        print(f"  {variant['variant']:<24} hit rate {variant['hit_rate']:>7.1%}  "
+              f"unique {variant['unique_hits']:>3}  ocr {variant['ocr_mean_ms']:>8.1f} ms")
+    for psm in report['psm']:
+        print(f"  psm {psm['psm']:<20} hit rate {psm['hit_rate']:>7.1%}  "
+              f"unique {psm['unique_hits']:>3}  ocr {psm['ocr_mean_ms']:>8.1f} ms")
+
+
+def print_comparison(report, baseline):
+    """Differences from an earlier --json report"""
+    print("change against baseline:")
+    for key in ('accuracy', 'p50_ms', 'p95_ms', 'mean_ocr_calls'):
+        before, after = baseline['end_to_end'].get(key), report['end_to_end'].get(key)
+        if before is not None and after is not None:
+            print(f"  {key:<24} {before:>10} -> {after:<10} ({after - before:+.4g})")
+    old_variants = {variant['variant']: variant for variant in baseline.get('variants', [])}
+    for variant in report.get('variants', []):
+        old = old_variants.get(variant['variant'])
+        if old is not None and old['hit_rate'] != variant['hit_rate']:
+            print(f"  {variant['variant']:<24} hit rate {old['hit_rate']:.1%} -> {variant['hit_rate']:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--samples', type=int, default=30, help='Synthetic plates to render')
+    parser.add_argument('--captures', help='Directory of real captures named after their plate')
+    parser.add_argument('--font', action='append', default=[], help='Extra truetype font for synthetic plates')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for the synthetic plates')
+    parser.add_argument('--backend', default='auto', help='OCR backend (see app.utils.ocr_engine)')
+    parser.add_argument('--workers', type=int, default=1, help='OCR processes for the end-to-end run')
+    parser.add_argument('--no-grid', action='store_true', help='Only run the end-to-end pipeline')
+    parser.add_argument('--no-fast-path', action='store_true',
+                        help='Read every plate with Tesseract, skipping character segmentation')
+    parser.add_argument('--json', dest='json_path', help='Also write the results to this file')
+    parser.add_argument('--compare', help='Earlier --json results to compare against')
+    args = parser.parse_args()
+
+    samples = synthetic_samples(args.samples, load_fonts(args.font + PLATE_FONT_PATHS), args.seed)
+    if args.captures:
+        samples.extend(capture_samples(args.captures))
+    if not samples:
+        parser.error('no samples to run')
+
+    # Caches, the detection log, the registered-plate index and a cascade
+    # order learned during the run would all skew the numbers
+    app = Flask(__name__)
+    app.config.update(
+        PLATE_RESULT_CACHE_ENABLED=False,
+        PLATE_DETECTION_LOG_ENABLED=False,
+        PLATE_INDEX_ENABLED=False,
+        PLATE_CASCADE_ADAPTIVE=False,
+        PLATE_OCR_WORKERS=args.workers,
+        PLATE_OCR_BACKEND=args.backend,
+        PLATE_FAST_PATH_ENABLED=not args.no_fast_path,
+    )
+    grid_results = []
+    end_to_end = []
+    with app.app_context():
+        detector = PlateDetector()
+        for sample in samples:
+            if not args.no_grid:
+                grid_results.append(run_grid(detector, sample))
+            result = detector.detect_plate(sample['data'])
+            end_to_end.append({
+                'name': sample['name'],
+                'truth': sample['truth'],
+                'plate': result['plate'],
+                'correct': result['plate'] == sample['truth'],
+                'elapsed_ms': result['elapsed_ms'],
+                'ocr_calls': result['ocr_calls'],
+                'timed_out': result['timed_out'],
+                'retake': result['retake'],
+                'recognizer': result['recognizer'],
+            })
+
+    report = {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'backend': args.backend,
+            'workers': args.workers,
+            'seed': args.seed,
+            'synthetic_samples': args.samples,
+            'captures': len(samples) - args.samples,
+            'variants': ENHANCEMENT_VARIANTS,
+            'psm': [psm_of(config) for config in OCR_CONFIGS],
+        },
+        **summarize(samples, grid_results, end_to_end),
+        'samples': end_to_end,
+    }
+    print_report(report)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(report, json.load(f))
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Import time of the app and its entry points.
+
+Runs each target in a fresh interpreter under ``python -X importtime`` and
+reports the wall time, the import time per top-level package and which of
+the heavy optional modules (the CV/OCR stack, geopy, qrcode, pyzbar) got
+loaded, e.g.
+
+    python -m benchmarks.startup --runs 5 --json startup.json
+
+Booting the web app must not load any of them; they are imported on first
+use. The command exits non-zero when a target loads a module it should
+not, so it can gate a release.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+HEAVY_MODULES = ['cv2', 'numpy', 'pytesseract', 'tesserocr', 'PIL', 'geopy', 'qrcode', 'pyzbar']
+
+# name -> (code run in a fresh interpreter, whether heavy modules are allowed)
+TARGETS = {
+    'import_app': ('from app import create_app', False),
+    'create_app': ("from app import create_app; create_app('testing')", False),
+    'reminder_scheduler': ('import app.utils.reminder_scheduler', False),
+    'plate_detector': ('import app.utils.plate_detector', True),
+}
+
+REPORT_CODE = '; import sys, json; print(json.dumps([m for m in {heavy!r} if m in sys.modules]))'
+
+
+def parse_importtime(stderr):
+    """Import time (us) per top-level package from -X importtime output"""
+    packages = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_time, _, name = line[len('import time:'):].split('|')
+        # Self times, so a package is not also charged for what it imports
+        packages[name.strip().split('.')[0]] += int(self_time)
+    return packages
+
+
+def run_target(code, env):
+    """Run one target once; returns (wall ms, {package: us}, heavy modules loaded)"""
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code + REPORT_CODE.format(heavy=HEAVY_MODULES)],
+        capture_output=True, text=True, env=env
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'failed')
+    return wall_ms, parse_importtime(completed.stderr), json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def measure(name, code, heavy_allowed, runs, env, top):
+    walls = []
+    import_times = []
+    packages = defaultdict(list)
+    heavy = []
+    for _ in range(runs):
+        wall_ms, run_packages, heavy = run_target(code, env)
+        walls.append(wall_ms)
+        import_times.append(sum(run_packages.values()) / 1000)
+        for package, micros in run_packages.items():
+            packages[package].append(micros / 1000)
+
+    slowest = sorted(((statistics.median(times), package) for package, times in packages.items()), reverse=True)
+    return {
+        'target': name,
+        'runs': runs,
+        'wall_ms': round(statistics.median(walls), 1),
+        'import_ms': round(statistics.median(import_times), 1),
+        'slowest_packages': [{'package': package, 'ms': round(ms, 1)} for ms, package in slowest[:top]],
+        'heavy_loaded': heavy,
+        'ok': heavy_allowed or not heavy,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3, help='Fresh interpreters per target (median reported)')
+    parser.add_argument('--target', action='append', choices=sorted(TARGETS), help='Only measure these targets')
+    parser.add_argument('--top', type=int, default=10, help='Slowest packages listed per target')
+    parser.add_argument('--database-url', help='Database create_app creates its tables in (default: TEST_DATABASE_URL)')
+    parser.add_argument('--json', dest='json_path', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.database_url:
+        env['TEST_DATABASE_URL'] = args.database_url
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.getcwd(), env.get('PYTHONPATH')]))
+
+    results = []
+    for name in args.target or TARGETS:
+        code, heavy_allowed = TARGETS[name]
+        try:
+            result = measure(name, code, heavy_allowed, args.runs, env, args.top)
+        except RuntimeError as e:
+            print(f"{name:<20} failed: {e}")
+            results.append({'target': name, 'error': str(e), 'ok': False})
+            continue
+        results.append(result)
+        print(f"{name:<20} wall {result['wall_ms']:>8.1f} ms  imports {result['import_ms']:>8.1f} ms  "
+              f"heavy {','.join(result['heavy_loaded']) or '-'}{'' if result['ok'] else '  <- should be lazy'}")
+        for package in result['slowest_packages']:
+            print(f"    {package['package']:<28} {package['ms']:>8.1f} ms")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(0 if all(result['ok'] for result in results) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -49,12 +49,93 @@ class Config:
     # Redis configuration
     REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
     
+    # Cache configuration (Flask-Caching)
+    CACHE_TYPE = os.environ.get('CACHE_TYPE', 'SimpleCache')
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', REDIS_URL)
+    CACHE_DEFAULT_TIMEOUT = 300
+    
     # Celery configuration
     CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
     CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
     
     # OCR and Image processing
     TESSERACT_CMD = os.environ.get('TESSERACT_CMD', '/usr/bin/tesseract')
+    PLATE_OCR_CONFIDENCE_THRESHOLD = int(os.environ.get('PLATE_OCR_CONFIDENCE_THRESHOLD', 70))  # Mean word confidence (0-100) to stop the cascade
+    PLATE_OCR_TIME_BUDGET = float(os.environ.get('PLATE_OCR_TIME_BUDGET', 8.0))  # Seconds per scan before returning the best result so far
+    PLATE_OCR_BACKEND = os.environ.get('PLATE_OCR_BACKEND', 'auto')  # auto, tesserocr (in-process engine) or pytesseract (CLI per call)
+    PLATE_WORKING_MAX_SIDE = int(os.environ.get('PLATE_WORKING_MAX_SIDE', 1280))  # Scan images are downsampled to this long side
+    PLATE_MAX_IMAGE_PIXELS = int(os.environ.get('PLATE_MAX_IMAGE_PIXELS', 40000000))  # Header-checked before decoding
+    PLATE_RESULT_CACHE_ENABLED = os.environ.get('PLATE_RESULT_CACHE_ENABLED', 'True').lower() == 'true'  # Answer repeated frames from cache
+    PLATE_RESULT_CACHE_SIZE = int(os.environ.get('PLATE_RESULT_CACHE_SIZE', 256))  # In-process entries per worker
+    PLATE_RESULT_CACHE_TTL = int(os.environ.get('PLATE_RESULT_CACHE_TTL', 120))  # Seconds
+    PLATE_DETECTION_LOG_ENABLED = os.environ.get('PLATE_DETECTION_LOG_ENABLED', 'True').lower() == 'true'
+    PLATE_DETECTION_LOG_PATH = os.environ.get('PLATE_DETECTION_LOG_PATH', os.path.join('instance', 'plate_detections.db'))  # Local SQLite, shared by all workers
+    PLATE_DETECTION_LOG_MAX_AGE_DAYS = int(os.environ.get('PLATE_DETECTION_LOG_MAX_AGE_DAYS', 90))
+    PLATE_DETECTION_LOG_MAX_ROWS = int(os.environ.get('PLATE_DETECTION_LOG_MAX_ROWS', 50000))
+    PLATE_LEARNING_ENABLED = os.environ.get('PLATE_LEARNING_ENABLED', 'True').lower() == 'true'  # Record detections for learned corrections and cascade order
+    PLATE_CORRECTION_MAX_COST = float(os.environ.get('PLATE_CORRECTION_MAX_COST', 3.0))  # Largest correction (negative log-likelihood) accepted for a reading
+    PLATE_INDEX_ENABLED = os.environ.get('PLATE_INDEX_ENABLED', 'True').lower() == 'true'  # Resolve near-miss readings to registered vehicles in memory
+    PLATE_INDEX_MAX_DISTANCE = int(os.environ.get('PLATE_INDEX_MAX_DISTANCE', 2))  # Characters a reading may be off a registered number
+    PLATE_INDEX_REFRESH_INTERVAL = int(os.environ.get('PLATE_INDEX_REFRESH_INTERVAL', 60))  # Seconds between delta refreshes from the database
+    PLATE_LOCALIZATION_ENABLED = os.environ.get('PLATE_LOCALIZATION_ENABLED', 'True').lower() == 'true'  # OCR only plate-shaped crops
+    PLATE_MAX_REGIONS = int(os.environ.get('PLATE_MAX_REGIONS', 3))  # Candidate plate crops OCR'd per frame
+    PLATE_CASCADE_ADAPTIVE = os.environ.get('PLATE_CASCADE_ADAPTIVE', 'True').lower() == 'true'  # Try each station's most productive (variant, PSM) pairs first
+    PLATE_CASCADE_MIN_WINS = int(os.environ.get('PLATE_CASCADE_MIN_WINS', 20))  # Plates read before a station's own order is used
+    PLATE_CASCADE_EXPLORE_RATE = float(os.environ.get('PLATE_CASCADE_EXPLORE_RATE', 0.05))  # Share of scans that try the least tried pair first
+    WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 4))  # Gunicorn worker processes (read by gunicorn.conf.py)
+    PLATE_OCR_WORKERS = int(os.environ.get('PLATE_OCR_WORKERS', max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)))  # OCR process pool size per web worker, so all workers' pools share the cores; 1 runs the cascade inline
+    PLATE_QUALITY_GATE_ENABLED = os.environ.get('PLATE_QUALITY_GATE_ENABLED', 'True').lower() == 'true'  # Ask for a retake instead of OCR'ing hopeless frames
+    PLATE_QUALITY_MIN_SHARPNESS = float(os.environ.get('PLATE_QUALITY_MIN_SHARPNESS', 80.0))  # Laplacian variance of the plate crops (or the frame's thumbnail); lower is too blurred
+    PLATE_QUALITY_MIN_BRIGHTNESS = int(os.environ.get('PLATE_QUALITY_MIN_BRIGHTNESS', 35))  # Mean gray level (0-255) of the plate crops
+    PLATE_QUALITY_MAX_BRIGHTNESS = int(os.environ.get('PLATE_QUALITY_MAX_BRIGHTNESS', 225))
+    PLATE_QUALITY_MAX_GLARE = float(os.environ.get('PLATE_QUALITY_MAX_GLARE', 0.15))  # Share of saturated pixels, when no dark print is left
+    PLATE_FAST_PATH_ENABLED = os.environ.get('PLATE_FAST_PATH_ENABLED', 'True').lower() == 'true'  # Read localized plates by character segmentation before trying Tesseract
+    PLATE_FAST_PATH_MIN_CONFIDENCE = float(os.environ.get('PLATE_FAST_PATH_MIN_CONFIDENCE', 85))  # Below this the Tesseract cascade runs
+    PLATE_CHAR_MODEL_PATH = os.environ.get('PLATE_CHAR_MODEL_PATH', os.path.join('instance', 'plate_chars.npz'))  # Glyph templates, segmented from synthetic plates when missing
+    PLATE_WARMUP_ENABLED = os.environ.get('PLATE_WARMUP_ENABLED', 'False').lower() == 'true'  # Load the plate pipeline in create_app, before gunicorn forks
+    
+    # Shared OCR service (ocr_service.py); web workers send scans to it instead of running OCR themselves
+    PLATE_OCR_SERVICE_SOCKET = os.environ.get('PLATE_OCR_SERVICE_SOCKET')  # Unix socket path; unset runs OCR in each web worker
+    PLATE_OCR_SERVICE_WORKERS = int(os.environ.get('PLATE_OCR_SERVICE_WORKERS', os.cpu_count() or 1))  # Detector processes in the service
+    PLATE_OCR_SERVICE_MAX_PENDING = int(os.environ.get('PLATE_OCR_SERVICE_MAX_PENDING', 2 * (os.cpu_count() or 1)))  # Scans admitted at once; more are refused with 503
+    PLATE_OCR_SERVICE_TIMEOUT = float(os.environ.get('PLATE_OCR_SERVICE_TIMEOUT', 25.0))  # Seconds a web worker waits for a result; never less than the service's limit (2 x PLATE_OCR_TIME_BUDGET) plus 5
+    PLATE_OCR_SERVICE_FALLBACK = os.environ.get('PLATE_OCR_SERVICE_FALLBACK', 'True').lower() == 'true'  # Run OCR in-process while the service is down (not when it times out)
+    
+    # Camera-scan load shedding, so OCR bursts cannot take every web worker
+    PLATE_SCAN_ADMISSION_ENABLED = os.environ.get('PLATE_SCAN_ADMISSION_ENABLED', 'True').lower() == 'true'  # Shed camera scans with 503 once the limits below are reached
+    PLATE_SCAN_MAX_ACTIVE = int(os.environ.get('PLATE_SCAN_MAX_ACTIVE', 2))  # Camera scans running at once across all gunicorn workers; keep below the worker count
+    PLATE_SCAN_MAX_PER_STATION = int(os.environ.get('PLATE_SCAN_MAX_PER_STATION', 1))
+    PLATE_SCAN_MAX_WAITING = int(os.environ.get('PLATE_SCAN_MAX_WAITING', 1))  # Scans that may wait for a slot; each one holds a worker too
+    PLATE_SCAN_MAX_WAIT = float(os.environ.get('PLATE_SCAN_MAX_WAIT', 1.0))  # Seconds a scan waits for a slot before it is refused
+    PLATE_SCAN_RETRY_AFTER = int(os.environ.get('PLATE_SCAN_RETRY_AFTER', 5))  # Retry-After seconds sent with a refused scan
+    
+    # QR images are rendered from the stored content on request, never written to disk
+    QR_IMAGE_CACHE_SIZE = int(os.environ.get('QR_IMAGE_CACHE_SIZE', 512))  # Rendered images kept in memory per worker
+    QR_IMAGE_MAX_AGE = int(os.environ.get('QR_IMAGE_MAX_AGE', 31536000))  # Browser cache lifetime in seconds; a QR code's image never changes
+    
+    # QR code payloads are signed so a scan can be verified without the database
+    QR_SIGNING_KEY = os.environ.get('QR_SIGNING_KEY')  # Defaults to a key derived from SECRET_KEY; changing it invalidates issued codes
+    QR_SIGNED_MAX_AGE_DAYS = int(os.environ.get('QR_SIGNED_MAX_AGE_DAYS', 30))  # Older signed codes are checked against the database
+    
+    # Asynchronous camera-scan jobs
+    OCR_JOB_BROKER = os.environ.get('OCR_JOB_BROKER', 'sqlite')  # sqlite (shared by all workers) or memory (single-process dev server only)
+    OCR_JOB_DB_PATH = os.environ.get('OCR_JOB_DB_PATH', os.path.join('instance', 'ocr_jobs.db'))
+    OCR_JOB_QUEUE_SIZE = int(os.environ.get('OCR_JOB_QUEUE_SIZE', 32))  # Queued scans beyond this are refused with 503
+    OCR_JOB_WORKERS = int(os.environ.get('OCR_JOB_WORKERS', 2))  # Job threads of ocr_job_worker.py (or of each web worker, see below)
+    OCR_JOB_IN_WEB_WORKERS = os.environ.get('OCR_JOB_IN_WEB_WORKERS', 'False').lower() == 'true'  # Run jobs in the web workers instead of ocr_job_worker.py; each job takes a scan slot
+    OCR_JOB_RESULT_TTL = int(os.environ.get('OCR_JOB_RESULT_TTL', 300))  # Seconds a finished result can be fetched
+    OCR_JOB_EVENTS_ENABLED = os.environ.get('OCR_JOB_EVENTS_ENABLED', 'False').lower() == 'true'  # Event stream of job results; only with an async worker class (gevent/eventlet), a sync worker is held per open stream
+    OCR_JOB_STREAM_TIMEOUT = int(os.environ.get('OCR_JOB_STREAM_TIMEOUT', 60))  # Seconds an event stream waits for a result
+    
+    # Batch plate detection (batch_detect.py, and uploads to /batch-detect run by batch_detect.py --worker)
+    BATCH_DETECT_WORKERS = int(os.environ.get('BATCH_DETECT_WORKERS', os.cpu_count() or 1))  # OCR processes per batch
+    BATCH_DETECT_CHUNK_SIZE = int(os.environ.get('BATCH_DETECT_CHUNK_SIZE', 200))  # Results resolved per vehicle query
+    BATCH_DETECT_QUALITY_GATE = os.environ.get('BATCH_DETECT_QUALITY_GATE', 'False').lower() == 'true'  # Skip hopeless photos instead of reading every one
+    BATCH_DETECT_DIR = os.environ.get('BATCH_DETECT_DIR', os.path.join('instance', 'batch_jobs'))  # Uploaded archives and their results
+    BATCH_DETECT_DB_PATH = os.environ.get('BATCH_DETECT_DB_PATH', os.path.join('instance', 'batch_jobs.db'))
+    BATCH_DETECT_QUEUE_SIZE = int(os.environ.get('BATCH_DETECT_QUEUE_SIZE', 4))  # Queued uploads beyond this are refused with 503
+    BATCH_DETECT_RESULT_TTL = int(os.environ.get('BATCH_DETECT_RESULT_TTL', 86400))  # Seconds a finished batch's results can be downloaded
+    BATCH_DETECT_STALE_AFTER = int(os.environ.get('BATCH_DETECT_STALE_AFTER', 6 * 3600))  # A batch running longer is taken as interrupted
     
     # Logging
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
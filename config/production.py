@@ -33,6 +33,9 @@ class ProductionConfig(Config):
     RATELIMIT_ENABLED = True
     RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL', 'redis://localhost:6379/1')
     
+    # Caching shared by all gunicorn workers
+    CACHE_TYPE = os.environ.get('CACHE_TYPE', 'RedisCache')
+    
     # Security
     WTF_CSRF_SSL_STRICT = True
     
@@ -1,11 +1,13 @@
 """Gunicorn configuration file for FuelLens application."""
 
+import os
+
 # Server socket
 bind = "0.0.0.0:5000"
 backlog = 2048
 
 # Worker processes
-workers = 4  # Number of worker processes
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))  # Number of worker processes; each OCR pool gets an equal share of the cores
 worker_class = "sync"  # Worker type (sync, gevent, eventlet, etc.)
 worker_connections = 1000  # Max simultaneous connections per worker
 max_requests = 1000  # Restart workers after this many requests
@@ -40,4 +42,16 @@ tmp_upload_dir = None
 # certfile = "/path/to/certfile"
 
 # Additional settings
-worker_tmp_dir = "/dev/shm"  # Use tmpfs for worker temporary files
\ No newline at end of file
+worker_tmp_dir = "/dev/shm"  # Use tmpfs for worker temporary files
+
+
+def post_fork(server, worker):
+    """Build the worker's OCR engine now instead of on its first scan (when PLATE_WARMUP_ENABLED)"""
+    from app.utils.warmup import warm_worker
+    warm_worker()
+
+
+def worker_exit(server, worker):
+    """Stop the worker's OCR process pool so recycled workers leave no OCR processes behind"""
+    from app.utils.ocr_engine import shutdown_ocr_pool
+    shutdown_ocr_pool()
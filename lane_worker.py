@@ -0,0 +1,75 @@
+"""Lane camera worker: continuous plate recognition for one station lane.
+
+Reads a video file or an MJPEG/HTTP stream and prints one JSON line per
+vehicle that passes, e.g.
+
+    python lane_worker.py --source http://camera.local/video.mjpg
+    python lane_worker.py --source lane_sample.mp4 --output passes.jsonl
+"""
+
+import argparse
+import json
+import os
+import sys
+from app import create_app
+from app.utils.plate_detector import PlateDetector
+from app.utils.lane_camera import LaneCameraWorker
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--source', required=True, help='Video file path or stream URL')
+    parser.add_argument('--sample-fps', type=float, default=4.0, help='Frames per second fed to the motion gate')
+    parser.add_argument('--max-ocr-per-pass', type=int, default=6, help='Most frames OCR\'d for one vehicle')
+    parser.add_argument('--dedupe-seconds', type=float, default=30.0,
+                        help='Ignore the same plate passing again within this many seconds')
+    parser.add_argument('--max-seconds', type=float, help='Stop after this much stream time')
+    parser.add_argument('--station-id', type=int, help='Station the camera belongs to')
+    parser.add_argument('--output', help='Also append results to this JSON lines file')
+    args = parser.parse_args()
+
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+    # Each sampled frame must be read on its own: cached results would count
+    # one reading as several votes and hand the last car's plate to the next
+    app.config['PLATE_RESULT_CACHE_ENABLED'] = False
+    output = open(args.output, 'a') if args.output else None
+
+    with app.app_context():
+        detector = PlateDetector()
+
+        def report(result, detection):
+            vehicle = detector.validate_plate_in_db(result['plate'])
+            # Learn from the pass once, not from every OCR'd frame: up to
+            # max_ocr_per_pass near-identical samples per car would outweigh
+            # the web app's scans in the corrector and the cascade order
+            detector.learn_from_detection(detection, args.station_id, vehicle.vehicle_number if vehicle else None)
+            result['vehicle_number'] = vehicle.vehicle_number if vehicle else result['plate']
+            result['vehicle_exists'] = vehicle is not None
+            if vehicle:
+                result['compliance_status'] = vehicle.calculate_compliance_status()
+            line = json.dumps(result)
+            print(line, flush=True)
+            if output:
+                output.write(line + '\n')
+                output.flush()
+
+        worker = LaneCameraWorker(
+            args.source, detector, report,
+            sample_fps=args.sample_fps,
+            max_ocr_per_pass=args.max_ocr_per_pass,
+            dedupe_seconds=args.dedupe_seconds,
+            station_id=args.station_id
+        )
+        try:
+            stats = worker.run(max_seconds=args.max_seconds)
+        except KeyboardInterrupt:
+            stats = worker.stats
+        finally:
+            if output:
+                output.close()
+
+    print(json.dumps({'stats': stats}), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
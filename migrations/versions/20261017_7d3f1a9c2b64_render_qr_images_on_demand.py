@@ -0,0 +1,25 @@
+"""Render QR images on demand instead of storing image files
+
+Revision ID: 20261017_7d3f1a9c2b64
+Revises: 20251229_0c8e9b0a4f1d
+Create Date: 2026-10-17 10:12:41.503218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers
+revision = '20261017_7d3f1a9c2b64'
+down_revision = '20251229_0c8e9b0a4f1d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_column('qr_codes', 'qr_code_path')
+
+
+def downgrade():
+    op.add_column('qr_codes', sa.Column('qr_code_path', sa.String(length=500), nullable=False, server_default=''))
+    op.alter_column('qr_codes', 'qr_code_path', server_default=None)
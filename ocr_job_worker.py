@@ -0,0 +1,42 @@
+"""OCR job worker: runs the queued camera scans (mode=async) outside the web workers.
+
+Run one per host next to gunicorn; it works the same SQLite job queue
+(OCR_JOB_DB_PATH) the web workers submit to, e.g.
+
+    python ocr_job_worker.py --threads 2
+"""
+
+import argparse
+import os
+import sys
+from app import create_app
+from app.controllers.operator import run_scan_job
+from app.utils.ocr_jobs import JobRunner, new_job_broker
+from app.utils.scan_admission import init_scan_admission
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, help='Scans run at once (default: OCR_JOB_WORKERS)')
+    args = parser.parse_args()
+
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+    config = app.config
+    if config.get('OCR_JOB_BROKER', 'sqlite') == 'memory':
+        parser.error('OCR_JOB_BROKER=memory keeps jobs inside the web server process; use the sqlite broker')
+    # The thread count bounds the scans run here; queued jobs wait their
+    # turn instead of being shed like the web workers' inline scans
+    init_scan_admission({'PLATE_SCAN_ADMISSION_ENABLED': False})
+
+    threads = args.threads or config.get('OCR_JOB_WORKERS', 2)
+    runner = JobRunner(app, new_job_broker(config), run_scan_job, threads=threads)
+    print(f"OCR job worker running {threads} scans at a time from {config.get('OCR_JOB_DB_PATH')}",
+          file=sys.stderr)
+    try:
+        runner.join()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Shared OCR service: one pool of warm plate detectors for all web workers on a host.
+
+Set PLATE_OCR_SERVICE_SOCKET for both the service and the web app, e.g.
+
+    PLATE_OCR_SERVICE_SOCKET=instance/ocr.sock python ocr_service.py --workers 4
+    python ocr_service.py --health --socket instance/ocr.sock
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+from app import create_app
+from app.utils.ocr_service import OCRService, OCRServiceClient, worker_settings, service_scan_timeout
+from app.utils.error_handler import OCRServiceUnavailableError
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--socket', help='Unix socket path (default: PLATE_OCR_SERVICE_SOCKET)')
+    parser.add_argument('--workers', type=int, help='Detector processes (default: PLATE_OCR_SERVICE_WORKERS)')
+    parser.add_argument('--max-pending', type=int,
+                        help='Scans admitted at once (default: PLATE_OCR_SERVICE_MAX_PENDING)')
+    parser.add_argument('--health', action='store_true',
+                        help='Print the running service\'s health and exit non-zero if it is down')
+    args = parser.parse_args()
+
+    if args.health:
+        socket_path = args.socket or os.getenv('PLATE_OCR_SERVICE_SOCKET')
+        if not socket_path:
+            parser.error('--socket or PLATE_OCR_SERVICE_SOCKET is required')
+        try:
+            print(json.dumps(OCRServiceClient(socket_path, timeout=5.0).health()))
+        except OCRServiceUnavailableError as e:
+            print(json.dumps({'status': 'down', 'error': str(e)}))
+            sys.exit(1)
+        return
+
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+    config = app.config
+    socket_path = args.socket or config.get('PLATE_OCR_SERVICE_SOCKET')
+    if not socket_path:
+        parser.error('--socket or PLATE_OCR_SERVICE_SOCKET is required')
+
+    service = OCRService(
+        socket_path,
+        worker_settings(config),
+        workers=args.workers or config.get('PLATE_OCR_SERVICE_WORKERS'),
+        max_pending=args.max_pending or config.get('PLATE_OCR_SERVICE_MAX_PENDING'),
+        timeout=service_scan_timeout(config.get('PLATE_OCR_TIME_BUDGET', 8.0))
+    )
+    # shutdown() waits for the serve loop, which runs in this thread
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=service.shutdown).start())
+
+    print(f"OCR service listening on {socket_path} with {service.workers} workers", file=sys.stderr)
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+from config.testing import TestingConfig
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """
+    The app in testing mode, with its logs and instance files under tmp_path
+
+    Without TEST_DATABASE_URL it runs on a SQLite file, which the job
+    threads see as well. The plate pipeline keeps no detection log, so
+    tests learn nothing.
+    """
+    monkeypatch.chdir(tmp_path)
+    if not os.environ.get('TEST_DATABASE_URL'):
+        monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'test.db'}")
+        monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_ENGINE_OPTIONS', {})
+    # Flask-Session opens no session without a backend
+    monkeypatch.setattr(TestingConfig, 'SESSION_TYPE', 'filesystem', raising=False)
+    monkeypatch.setattr(TestingConfig, 'SESSION_FILE_DIR', str(tmp_path / 'sessions'), raising=False)
+    monkeypatch.setattr(TestingConfig, 'PLATE_DETECTION_LOG_ENABLED', False)
+    monkeypatch.setattr(TestingConfig, 'PLATE_OCR_WORKERS', 1)
+    monkeypatch.setattr(TestingConfig, 'OCR_JOB_BROKER', 'memory')
+
+    from app import create_app, db
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def plate_scene():
+    """Render a street frame showing the given plate number as JPEG bytes"""
+    import numpy as np
+    from PIL import ImageFont
+
+    from app.utils.plate_render import PLATE_FONT_PATHS
+    from benchmarks.plate_pipeline import render_scene
+
+    font = ImageFont.truetype(PLATE_FONT_PATHS[0], 84)
+
+    def render(number, distortion='clean', seed=0):
+        return render_scene(number, font, distortion, np.random.default_rng(seed))
+    return render
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def operator(app, client):
+    """A station operator of an approved station, logged in on `client`"""
+    from app import db
+    from app.models import FuelStation, StationEmployee, User
+
+    user = User(email='operator@example.com', first_name='Station', last_name='Operator', role='station_operator')
+    user.set_password('Operator-pass-1')
+    db.session.add(user)
+    db.session.flush()
+    station = FuelStation(name='Test Station', owner_id=user.id, address='1 Main Road', city='Pune',
+                          state='Maharashtra', pincode='411001', is_approved=True)
+    db.session.add(station)
+    db.session.flush()
+    db.session.add(StationEmployee(station_id=station.id, employee_id=user.id))
+    db.session.commit()
+
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    return user
+
+
+@pytest.fixture
+def admin(app, client):
+    """An admin, logged in on `client`"""
+    from app import db
+    from app.models import User
+
+    user = User(email='admin@example.com', first_name='Site', last_name='Admin', role='admin')
+    user.set_password('Admin-pass-1')
+    db.session.add(user)
+    db.session.commit()
+
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    return user
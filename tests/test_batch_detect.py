@@ -0,0 +1,142 @@
+import io
+import json
+import time
+import zipfile
+
+import cv2
+import pytest
+from PIL import ImageFont
+
+from app.utils import batch_detect
+from app.utils.batch_detect import RESULT_FIELDS, format_rows, iter_images, resolve_vehicles, run_batch, worker_settings
+from app.utils.plate_index import PlateIndex
+from app.utils.plate_render import PLATE_FONT_PATHS, render_plate
+
+
+def plate_archive(numbers):
+    font = ImageFont.truetype(PLATE_FONT_PATHS[0], 80)
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zf:
+        for number in numbers:
+            ok, encoded = cv2.imencode('.jpg', render_plate(number, font))
+            zf.writestr(f'{number}.jpg', encoded.tobytes())
+    archive.seek(0)
+    return archive
+
+
+def test_batch_workers_keep_out_of_the_learning_data_and_read_every_photo(app):
+    settings = worker_settings(app.config)
+    assert settings['PLATE_DETECTION_LOG_ENABLED'] is False
+    assert settings['PLATE_LEARNING_ENABLED'] is False
+    assert settings['PLATE_QUALITY_GATE_ENABLED'] is False
+
+    app.config['BATCH_DETECT_QUALITY_GATE'] = True
+    assert worker_settings(app.config)['PLATE_QUALITY_GATE_ENABLED'] is True
+
+
+def test_uploaded_batch_is_queued_and_its_results_downloaded(app, client, admin, monkeypatch):
+    monkeypatch.setattr(batch_detect, '_batch_runner', None)
+    app.config['BATCH_DETECT_WORKERS'] = 1
+    response = client.post('/batch-detect', data={
+        'archive': (plate_archive(['MH12AB1234', 'KA01AB123']), 'photos.zip'),
+        'format': 'jsonl'
+    })
+    assert response.status_code == 202
+    poll_url = response.get_json()['poll_url']
+
+    deadline = time.monotonic() + 60
+    while (response := client.get(poll_url)).status_code == 202:
+        assert time.monotonic() < deadline
+        time.sleep(0.2)
+    job = response.get_json()
+    assert job['status'] == 'done'
+    assert job['stats']['images'] == 2
+
+    results = client.get(job['results_url'])
+    assert results.status_code == 200
+    assert results.mimetype == 'application/x-ndjson'
+    assert len(results.get_data(as_text=True).splitlines()) == 2
+
+
+def test_upload_must_be_a_zip_archive(client, admin):
+    response = client.post('/batch-detect', data={'archive': (io.BytesIO(b'not a zip'), 'photos.zip')})
+    assert response.status_code == 400
+    response = client.post('/batch-detect', data={
+        'archive': (plate_archive(['MH12AB1234']), 'photos.zip'), 'format': 'xml'
+    })
+    assert response.status_code == 400
+
+
+def test_batch_detect_is_for_admins_only(client, operator):
+    response = client.post('/batch-detect', data={
+        'archive': (plate_archive(['MH12AB1234']), 'photos.zip')
+    })
+    assert response.status_code == 403
+
+
+def test_images_are_read_from_directories_and_archives(tmp_path):
+    (tmp_path / 'photos' / 'lane2').mkdir(parents=True)
+    (tmp_path / 'photos' / 'b.jpg').write_bytes(b'b')
+    (tmp_path / 'photos' / 'a.PNG').write_bytes(b'a')
+    (tmp_path / 'photos' / 'notes.txt').write_bytes(b'x')
+    (tmp_path / 'photos' / '.hidden.jpg').write_bytes(b'x')
+    (tmp_path / 'photos' / 'lane2' / 'c.jpg').write_bytes(b'c')
+    assert list(iter_images(str(tmp_path / 'photos'))) == [('a.PNG', b'a'), ('b.jpg', b'b'), ('lane2/c.jpg', b'c')]
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr('a.jpg', b'a')
+        zf.writestr('__MACOSX/._a.jpg', b'x')
+        zf.writestr('readme.txt', b'x')
+    assert list(iter_images(archive)) == [('a.jpg', b'a')]
+
+    with pytest.raises(ValueError):
+        iter_images(io.BytesIO(b'not an archive'))
+
+
+def test_rows_are_written_as_csv_or_json_lines():
+    rows = [dict.fromkeys(RESULT_FIELDS, None) | {'name': 'a.jpg', 'plate': 'MH12AB1234'}]
+    lines = ''.join(format_rows(iter(rows), 'csv')).splitlines()
+    assert lines[0] == ','.join(RESULT_FIELDS)
+    assert lines[1].startswith('a.jpg,MH12AB1234,')
+    assert json.loads(''.join(format_rows(iter(rows), 'jsonl'))) == rows[0]
+
+
+def test_near_readings_resolve_to_the_registered_vehicle(app, operator):
+    from app import db
+    from app.models import Vehicle
+
+    db.session.add(Vehicle(user_id=operator.id, vehicle_number='MH12AB1234', owner_name='Owner', vehicle_type='car'))
+    db.session.commit()
+    index = PlateIndex()
+    index.add(1, 'MH12AB1234')
+    index.sync = lambda: None
+
+    rows = [{'plate': 'MH12A81234'}, {'plate': None}]
+    resolve_vehicles(rows, index)
+    assert rows[0]['vehicle_exists'] and rows[0]['vehicle_number'] == 'MH12AB1234'
+    assert rows[0]['compliance_status'] == 'valid'
+    assert not rows[1]['vehicle_exists']
+
+    rows = [{'plate': 'MH12A81234'}]
+    resolve_vehicles(rows)
+    assert not rows[0]['vehicle_exists']
+
+
+def test_batch_counts_plates_and_registered_vehicles(app, operator, plate_scene):
+    from app import db
+    from app.models import Vehicle
+
+    db.session.add(Vehicle(user_id=operator.id, vehicle_number='MH12AB1234', owner_name='Owner', vehicle_type='car'))
+    db.session.commit()
+    images = [('registered.jpg', plate_scene('MH12AB1234')), ('unregistered.jpg', plate_scene('KA01AB1234', seed=1)),
+              ('broken.jpg', b'not an image'), ('huge.jpg', None)]
+    output = io.StringIO()
+    counts = run_batch(iter(images), output, app.config, 'jsonl', workers=2, exact=True)
+
+    rows = {row['name']: row for row in map(json.loads, output.getvalue().splitlines())}
+    assert rows['registered.jpg']['vehicle_exists']
+    assert rows['huge.jpg']['error'] == 'Image too large'
+    assert counts['images'] == 4
+    assert counts['registered'] == 1
+    assert counts['errors'] >= 2
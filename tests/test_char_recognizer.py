@@ -0,0 +1,50 @@
+import os
+
+import cv2
+import pytest
+
+from app.utils.char_recognizer import PlateCharRecognizer, render_templates, segment_characters
+from app.utils.plate_corrector import PlateCorrector
+from app.utils.plate_render import PLATE_FONT_PATHS, render_plate
+
+# A proportional face, in which pairs such as KA and AW touch
+SANS_BOLD = next((path for path in PLATE_FONT_PATHS if os.path.basename(path) == 'DejaVuSans-Bold.ttf'
+                  and os.path.exists(path)), None)
+
+pytestmark = pytest.mark.skipif(SANS_BOLD is None, reason='DejaVu Sans Bold is not installed')
+
+
+@pytest.fixture(scope='module')
+def recognizer():
+    return PlateCharRecognizer(*render_templates([SANS_BOLD]))
+
+
+@pytest.fixture(scope='module')
+def font():
+    from PIL import ImageFont
+    return ImageFont.truetype(SANS_BOLD, 84)
+
+
+@pytest.mark.parametrize('text', ['MH12KA1234', 'TN09AW4321', 'KA01AB1234'])
+def test_touching_characters_are_split(recognizer, font, text):
+    plate = render_plate(text, font)
+    masks, unread = segment_characters(plate)
+    assert (len(masks), unread) == (len(text), 0)
+
+    reading, confidence = recognizer.read(plate)
+    assert PlateCorrector().correct(reading)[0] == text
+    assert confidence > 0
+
+
+def test_characters_too_wide_to_split_leave_the_reading_unconfident(recognizer, font):
+    plate = render_plate('MH12AB1234', font)
+    # A smudge of character height over the middle of the number
+    cv2.rectangle(plate, (150, 32), (420, 88), 0, -1)
+
+    assert segment_characters(plate)[1] == 1
+    assert recognizer.read(plate)[1] == 0.0
+
+
+@pytest.mark.parametrize('text', ['MH123', 'MH12AB123456'])
+def test_character_counts_no_plate_has_are_not_trusted(recognizer, font, text):
+    assert recognizer.read(render_plate(text, font))[1] == 0.0
@@ -0,0 +1,124 @@
+import multiprocessing
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app.utils.detection_log import DetectionLog
+
+
+def open_log(path, **options):
+    options.setdefault('flush_interval', 0.05)
+    options.setdefault('compact_interval', 3600)
+    log = DetectionLog(str(path), **options)
+    # Nothing is due for compaction while the test runs
+    log.last_compacted = time.monotonic()
+    return log
+
+
+def write_legacy_pickle(path, count):
+    # Recent enough that the workers' retention compaction keeps them
+    detections = [{'timestamp': (datetime.now() - timedelta(minutes=i)).isoformat(),
+                   'original': f'MH12AB{i:04d}', 'corrected': f'MH12AB{i:04d}'} for i in range(count)]
+    with open(path, 'wb') as f:
+        pickle.dump({'successful_detections': detections}, f)
+
+
+def create_log(path, legacy_path, start):
+    start.wait()
+    DetectionLog(path, legacy_path=legacy_path).close()
+
+
+def record_in_child(log):
+    log.record('MH12AB1234', 'MH12AB1234', 90.0, label='MH12AB1234')
+    log.flush()
+    log.close()
+
+
+def writer_threads():
+    return [thread for thread in threading.enumerate() if thread.name == 'detection-log-writer']
+
+
+def test_new_log_uses_incremental_auto_vacuum(tmp_path):
+    log = open_log(tmp_path / 'detections.db')
+    conn = log.connect()
+    try:
+        assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    finally:
+        conn.close()
+        log.close()
+
+
+def test_compact_shrinks_the_file(tmp_path):
+    path = tmp_path / 'detections.db'
+    log = open_log(path, max_rows=10)
+    conn = log.connect()
+    try:
+        rows = [(time.time(), 'MH12AB1234', 'MH12AB1234 ' + 'x' * 500, 90.0, 1, None, None, None, None)
+                for _ in range(2000)]
+        log._write_batch(conn, rows)
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        size_before = os.path.getsize(path)
+
+        log.compact(conn)
+
+        assert conn.execute('SELECT COUNT(*) FROM detections').fetchone()[0] == 10
+        assert os.path.getsize(path) < size_before / 4
+    finally:
+        conn.close()
+        log.close()
+
+
+def test_legacy_pickle_is_imported_once_by_concurrent_workers(tmp_path):
+    path = str(tmp_path / 'detections.db')
+    legacy_path = str(tmp_path / 'plate_detection_learning.pkl')
+    write_legacy_pickle(legacy_path, 200)
+
+    context = multiprocessing.get_context('spawn')
+    start = context.Event()
+    workers = [context.Process(target=create_log, args=(path, legacy_path, start)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    start.set()
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute('SELECT COUNT(*) FROM detections').fetchone()[0] == 200
+    finally:
+        conn.close()
+
+
+def test_only_labelled_detections_are_recent(tmp_path):
+    log = open_log(tmp_path / 'detections.db')
+    log.record('MH12A81234', 'MH12AB1234', 80.0, label='MH12AB1234')
+    log.record('MH12A81234', 'MH12AB1234', 80.0)
+    log.record('KA01AB1234', None, 0.0, label='KA01AB1234')
+    log.flush()
+    try:
+        assert log.recent() == [('KA01AB1234', 'KA01AB1234', 0.0), ('MH12AB1234', 'MH12A81234', 80.0)]
+    finally:
+        log.close()
+
+
+def test_writer_starts_after_fork_in_the_recording_process(tmp_path):
+    log = open_log(tmp_path / 'detections.db')
+    try:
+        # As in the gunicorn master after warmup: the log is open but nothing was recorded
+        assert log.recent() == []
+        assert not writer_threads()
+
+        child = multiprocessing.get_context('fork').Process(target=record_in_child, args=(log,))
+        child.start()
+        child.join(timeout=30)
+        assert child.exitcode == 0
+
+        assert log.recent() == [('MH12AB1234', 'MH12AB1234', 90.0)]
+        assert not writer_threads()
+    finally:
+        log.close()
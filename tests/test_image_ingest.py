@@ -0,0 +1,79 @@
+import struct
+import zlib
+
+import cv2
+import numpy as np
+import pytest
+
+from app.utils.error_handler import ImageRejectedError
+from app.utils.image_ingest import ImageIngestor, read_image_header
+
+
+def encoded(extension, width=800, height=600):
+    image = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    ok, data = cv2.imencode(extension, image)
+    return data.tobytes()
+
+
+def png_claiming(width, height):
+    """A PNG signature and IHDR chunk claiming the given size, with no image data"""
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)
+    chunk = b'IHDR' + ihdr
+    return b'\x89PNG\r\n\x1a\n' + struct.pack('>I', len(ihdr)) + chunk + struct.pack('>I', zlib.crc32(chunk))
+
+
+@pytest.mark.parametrize('extension, image_format', [
+    ('.png', 'png'), ('.jpg', 'jpeg'), ('.webp', 'webp'), ('.bmp', 'bmp')
+])
+def test_dimensions_are_read_from_the_header(extension, image_format):
+    assert read_image_header(encoded(extension, 800, 600)) == (image_format, 800, 600)
+
+
+def test_progressive_jpeg_dimensions_are_read():
+    image = np.zeros((480, 640), np.uint8)
+    ok, data = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_PROGRESSIVE, 1])
+    assert read_image_header(data.tobytes()) == ('jpeg', 640, 480)
+
+
+def test_decompression_bomb_is_refused_before_decoding(monkeypatch):
+    def no_decode(*args):
+        raise AssertionError('the image was decoded')
+    monkeypatch.setattr(cv2, 'imdecode', no_decode)
+    with pytest.raises(ImageRejectedError, match='too large'):
+        ImageIngestor(max_pixels=40000000).load(png_claiming(50000, 50000))
+
+
+@pytest.mark.parametrize('data, message', [
+    (b'', 'Empty'),
+    (b'\xff\xd8\xff', 'truncated'),
+    (b'GIF89a' + b'\x00' * 40, 'Unsupported'),
+    (b'\xff\xd8' + b'\x00' * 40, 'Corrupt JPEG'),
+])
+def test_broken_uploads_are_rejected(data, message):
+    with pytest.raises(ImageRejectedError, match=message):
+        ImageIngestor().load(data)
+
+
+def test_tiny_and_oddly_shaped_images_are_rejected():
+    ingestor = ImageIngestor()
+    with pytest.raises(ImageRejectedError, match='too small'):
+        ingestor.load(encoded('.png', 40, 30))
+    with pytest.raises(ImageRejectedError, match='Unusual image shape'):
+        ingestor.load(encoded('.png', 1800, 100))
+
+
+def test_large_images_decode_reduced_to_the_working_size():
+    ingestor = ImageIngestor(working_max_side=1280)
+    assert ingestor.decode_factor(4000, 3000)[0] == 2
+    assert ingestor.decode_factor(12000, 9000)[0] == 8
+    assert ingestor.decode_factor(1024, 768)[0] == 1
+
+    gray = ingestor.load(encoded('.jpg', 4000, 3000))
+    assert gray.ndim == 2
+    assert gray.shape == (960, 1280)
+
+
+def test_video_frames_are_brought_to_the_working_image():
+    frame = np.zeros((1080, 1920, 3), np.uint8)
+    gray = ImageIngestor(working_max_side=1280).load_frame(frame)
+    assert gray.shape == (720, 1280)
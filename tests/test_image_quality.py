@@ -0,0 +1,89 @@
+import io
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from app.utils.image_quality import ImageQualityGate
+from app.utils.plate_localizer import PlateLocalizer
+from app.utils.plate_render import PLATE_FONT_PATHS, render_plate
+
+
+@pytest.fixture(scope='module')
+def plate():
+    from PIL import ImageFont
+    path = next((path for path in PLATE_FONT_PATHS if os.path.exists(path)), None)
+    return render_plate('MH12AB1234', ImageFont.truetype(path, 84) if path else None)
+
+
+def white_car_frame(plate):
+    """A street frame mostly filled by a white car body carrying the plate"""
+    frame = np.random.default_rng(0).normal(115, 22, (720, 1280)).clip(0, 255).astype(np.uint8)
+    cv2.rectangle(frame, (80, 60), (1200, 700), 255, -1)
+    plate = cv2.resize(plate, None, fx=0.7, fy=0.7, interpolation=cv2.INTER_AREA)
+    frame[450:450 + plate.shape[0], 400:400 + plate.shape[1]] = plate
+    return frame
+
+
+def check(frame):
+    return ImageQualityGate().check(frame, PlateLocalizer().localize(frame))
+
+
+def test_tight_crop_of_a_white_plate_passes(plate):
+    retake, metrics = check(plate)
+    assert retake is None
+    assert metrics['bright'] > 0.6
+
+
+def test_frame_filled_by_a_white_car_passes(plate):
+    frame = white_car_frame(plate)
+    assert ImageQualityGate().check(frame)[0] == 'overexposed'
+    assert check(frame)[0] is None
+
+
+@pytest.mark.parametrize('degrade, reason', [
+    (lambda frame: (frame * 0.1).astype(np.uint8), 'underexposed'),
+    (lambda frame: np.clip(frame.astype(int) + 200, 0, 255).astype(np.uint8), 'overexposed'),
+    (lambda frame: cv2.GaussianBlur(frame, (0, 0), 8), 'blurred'),
+])
+def test_hopeless_frames_are_sent_back(plate, degrade, reason):
+    assert check(degrade(white_car_frame(plate)))[0] == reason
+
+
+def test_frame_without_a_plate_is_judged_whole():
+    assert check(np.full((720, 1280), 128, np.uint8))[0] == 'blurred'
+
+
+def degraded(image, how):
+    frame = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if how == 'dark':
+        frame = (frame * 0.1).astype(np.uint8)
+    else:
+        frame = cv2.GaussianBlur(frame, (0, 0), 8)
+    return cv2.imencode('.jpg', frame)[1].tobytes()
+
+
+@pytest.mark.parametrize('how, reason', [('dark', 'underexposed'), ('blurred', 'blurred')])
+def test_camera_scan_asks_for_a_retake_without_running_ocr(app, client, operator, plate_scene, how, reason):
+    from app.utils.plate_detector import PlateDetector
+
+    image = degraded(plate_scene('MH12AB1234'), how)
+    result = PlateDetector().detect_plate(image)
+    assert result['retake'] == reason
+    assert result['recognizer'] is None
+    assert result['ocr_calls'] == 0
+
+    response = client.post('/camera-scan', data={'image': (io.BytesIO(image), 'frame.jpg')})
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body['retake'] and body['retake_reason'] == reason
+
+
+def test_disabled_gate_reads_every_frame(app, plate_scene):
+    from app.utils.plate_detector import PlateDetector
+
+    app.config['PLATE_QUALITY_GATE_ENABLED'] = False
+    result = PlateDetector().detect_plate(degraded(plate_scene('MH12AB1234'), 'blurred'))
+    assert result['retake'] is None
+    assert result['quality'] is None
@@ -0,0 +1,109 @@
+import threading
+import time
+
+import numpy as np
+
+from app.utils.lane_camera import LaneCameraWorker, MotionGate, VehiclePass
+
+
+def lane_frame(car=False):
+    frame = np.full((240, 320, 3), 90, np.uint8)
+    if car:
+        frame[60:200, 80:260] = 220
+    return frame
+
+
+class StubDetector:
+    """Reads the given plate on every frame, taking `delay` seconds per frame"""
+
+    def __init__(self, plate='MH12AB1234', delay=0.0):
+        self.plate = plate
+        self.delay = delay
+        self.frames = []
+
+    def detect_plate(self, frame, station_id=None):
+        time.sleep(self.delay)
+        self.frames.append(int(frame[0, 0, 0]))
+        return {'plate': self.plate, 'confidence': 80.0, 'format_valid': True}
+
+
+class PresentGate:
+    def update(self, frame):
+        return True, 1.0
+
+
+class LiveCapture:
+    """A live camera: a new frame every `interval` seconds, numbered in its first pixel"""
+
+    def __init__(self, frames, interval):
+        self.frames = frames
+        self.interval = interval
+        self.read_count = 0
+
+    def read(self):
+        if self.read_count >= self.frames:
+            return False, None
+        time.sleep(self.interval)
+        self.read_count += 1
+        return True, np.full((4, 4, 3), self.read_count % 256, np.uint8)
+
+
+def test_motion_gate_opens_for_a_vehicle_and_closes_after_it_leaves():
+    gate = MotionGate()
+    states = [gate.update(lane_frame())[0] for _ in range(5)]
+    states += [gate.update(lane_frame(car=True))[0] for _ in range(4)]
+    states += [gate.update(lane_frame())[0] for _ in range(6)]
+    assert states[:5] == [False] * 5
+    # Two changed frames open the gate, four quiet ones close it
+    assert states[5:9] == [False, True, True, True]
+    assert states[9:12] == [True] * 3
+    assert states[-1] is False
+
+
+def test_pass_votes_by_confidence():
+    vehicle_pass = VehiclePass(0.0)
+    vehicle_pass.add('MH12AB1234', 80.0)
+    vehicle_pass.add('MH12A81234', 40.0)
+    assert not vehicle_pass.is_decided()
+    vehicle_pass.add('MH12AB1234', 75.0)
+    assert vehicle_pass.is_decided()
+    plate, share = vehicle_pass.winner()
+    assert plate == 'MH12AB1234'
+    assert share == (80.0 + 75.0) / (80.0 + 75.0 + 40.0)
+
+
+def test_a_vehicle_stopping_within_the_dedupe_window_is_reported_once():
+    results = []
+    worker = LaneCameraWorker('lane.mp4', StubDetector(), lambda result, detection: results.append(result),
+                              gate=PresentGate(), dedupe_seconds=30.0)
+    for started_at in (0.0, 10.0, 50.0):
+        worker.process_frame(lane_frame(car=True), started_at)
+        worker.process_frame(lane_frame(car=True), started_at + 1.0)
+        worker.end_pass()
+    assert [result['started_at'] for result in results] == [0.0, 50.0]
+    assert worker.stats['duplicates'] == 1
+
+
+def test_a_decided_pass_stops_running_ocr():
+    detector = StubDetector()
+    worker = LaneCameraWorker('lane.mp4', detector, lambda result, detection: None, gate=PresentGate())
+    for index in range(5):
+        worker.process_frame(lane_frame(car=True), index * 0.25)
+    assert len(detector.frames) == 2
+
+
+def test_live_stream_drops_the_frames_read_during_a_detection():
+    detector = StubDetector(delay=0.2)
+    worker = LaneCameraWorker('rtsp://camera.local/lane', detector, lambda result, detection: None,
+                              gate=PresentGate(), sample_fps=20.0, max_ocr_per_pass=3, min_agreeing=99)
+    capture = LiveCapture(frames=100, interval=0.01)
+    thread = threading.Thread(target=worker.read_capture, args=(capture,))
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+
+    # Each detection is handed the newest frame, not the next one in line
+    assert len(detector.frames) == 3
+    assert all(later - earlier >= 10 for earlier, later in zip(detector.frames, detector.frames[1:]))
+    assert worker.stats['frames_read'] == 100
+    assert worker.stats['frames_dropped'] > 50
@@ -0,0 +1,149 @@
+import io
+import threading
+import time
+
+import pytest
+
+from app.utils import ocr_jobs
+from app.utils.error_handler import OCRQueueFullError
+from app.utils.ocr_jobs import JobRunner, MemoryJobBroker, SQLiteJobBroker
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def broker(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryJobBroker(max_queued=3)
+    return SQLiteJobBroker(str(tmp_path / 'jobs.db'), max_queued=3, poll_interval=0.05)
+
+
+def test_jobs_are_claimed_oldest_first_and_finished(broker):
+    first = broker.submit(b'one', {'station_id': 1}, owner_id=7)
+    second = broker.submit(b'two', {'station_id': 2}, owner_id=7)
+    assert broker.get(first)['status'] == 'queued'
+
+    assert broker.claim(timeout=0.1) == (first, b'one', {'station_id': 1})
+    assert broker.get(first)['status'] == 'running'
+    broker.finish(first, {'plate': 'MH12AB1234'})
+
+    job = broker.get(first)
+    assert job['status'] == 'done'
+    assert job['owner_id'] == 7
+    assert job['result'] == {'plate': 'MH12AB1234'}
+    assert broker.claim(timeout=0.1)[0] == second
+    assert broker.claim(timeout=0.1) is None
+    assert broker.stats() == {'queued': 0, 'running': 1, 'done': 1, 'failed': 0}
+
+
+def test_a_full_queue_refuses_jobs(broker):
+    for i in range(3):
+        broker.submit(b'image', {})
+    with pytest.raises(OCRQueueFullError):
+        broker.submit(b'image', {})
+    broker.claim(timeout=0.1)
+    broker.submit(b'image', {})
+
+
+def test_waiters_wake_when_the_job_finishes(broker):
+    job_id = broker.submit(b'image', {})
+    broker.claim(timeout=0.1)
+    threading.Timer(0.1, broker.finish, (job_id, {'plate': None}, True)).start()
+    started = time.monotonic()
+    job = broker.wait(job_id, timeout=5)
+    assert job['status'] == 'failed'
+    assert time.monotonic() - started < 2
+
+
+def test_unknown_jobs_are_none(broker):
+    assert broker.get('missing') is None
+
+
+def test_sqlite_jobs_are_shared_and_claimed_once(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    web_worker = SQLiteJobBroker(path, max_queued=100)
+    job_ids = {web_worker.submit(b'image', {'n': i}) for i in range(40)}
+
+    # Two job worker processes, each with two threads
+    workers = [SQLiteJobBroker(path, poll_interval=0.01) for _ in range(2)]
+    claimed = []
+
+    def work(broker):
+        while (job := broker.claim(timeout=0.2)) is not None:
+            claimed.append(job[0])
+            broker.finish(job[0], {'n': job[2]['n']})
+    threads = [threading.Thread(target=work, args=(broker,)) for broker in workers for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claimed) == sorted(job_ids)
+    assert all(web_worker.get(job_id)['status'] == 'done' for job_id in job_ids)
+
+
+def test_sqlite_fails_interrupted_jobs_and_forgets_old_results(tmp_path):
+    broker = SQLiteJobBroker(str(tmp_path / 'jobs.db'), result_ttl=60, stale_after=30)
+    interrupted = broker.submit(b'image', {})
+    finished = broker.submit(b'image', {})
+    broker.claim(timeout=0.1)
+    broker.claim(timeout=0.1)
+    broker.finish(finished, {'plate': 'MH12AB1234'})
+
+    conn = broker.connect()
+    conn.execute('UPDATE ocr_jobs SET started_at = started_at - 40 WHERE id = ?', (interrupted,))
+    conn.execute('UPDATE ocr_jobs SET finished_at = finished_at - 90 WHERE id = ?', (finished,))
+    broker.purge(conn)
+    conn.close()
+
+    assert broker.get(interrupted)['status'] == 'failed'
+    assert broker.get(interrupted)['result']['error'] == 'Scan was interrupted, please try again'
+    assert broker.get(finished) is None
+
+
+def test_runner_threads_run_the_handler_in_the_app_context(app):
+    from flask import current_app
+
+    def handler(image, params):
+        if params.get('fail'):
+            raise ValueError('broken image')
+        return {'length': len(image), 'app': current_app.name}
+
+    runner = JobRunner(app, MemoryJobBroker(), handler, threads=1)
+    done = runner.submit(b'image', {})
+    failed = runner.submit(b'image', {'fail': True})
+    assert runner.broker.wait(done, timeout=5)['result'] == {'length': 5, 'app': app.name}
+    job = runner.broker.wait(failed, timeout=5)
+    assert job['status'] == 'failed'
+    assert job['result'] == {'status': 'error', 'error': 'Error processing image'}
+
+
+def test_async_camera_scan_is_polled_by_its_owner_only(app, client, operator, plate_scene, monkeypatch):
+    monkeypatch.setattr(ocr_jobs, '_job_runner', None)
+    response = client.post('/camera-scan', data={
+        'mode': 'async',
+        'image': (io.BytesIO(plate_scene('MH12AB1234')), 'frame.jpg')
+    })
+    assert response.status_code == 202
+    queued = response.get_json()
+    assert queued['status'] == 'queued'
+
+    deadline = time.monotonic() + 30
+    while (response := client.get(queued['poll_url'])).status_code == 202:
+        assert time.monotonic() < deadline
+        time.sleep(0.1)
+    assert response.status_code == 200
+    assert response.get_json()['vehicle_number'] == 'MH12AB1234'
+
+    from flask import g
+    from app import db
+    from app.models import User
+    other = User(email='other@example.com', first_name='Other', last_name='Operator', role='station_operator')
+    other.set_password('Operator-pass-2')
+    db.session.add(other)
+    db.session.commit()
+    other_client = app.test_client()
+    # Requests share the fixture's app context, where Flask-Login keeps the loaded user
+    g.pop('_login_user', None)
+    with other_client.session_transaction() as session:
+        session['_user_id'] = str(other.id)
+        session['_fresh'] = True
+    assert other_client.get(queued['poll_url']).status_code == 404
@@ -0,0 +1,32 @@
+from app.utils.ocr_metrics import PairWins
+from app.utils.detection_log import DetectionLog
+
+CLAHE = ('clahe', 7)
+OTSU = ('otsu', 7)
+
+
+def test_pair_that_only_fails_is_tried_last():
+    wins = PairWins(min_wins=5, explore_rate=0.0)
+    for _ in range(20):
+        # otsu runs first and never reads anything; clahe reads half the frames
+        wins.record(1, None, [OTSU, CLAHE])
+        wins.record(1, CLAHE, [OTSU, CLAHE])
+
+    assert wins.order([OTSU, CLAHE], station_id=1) == [CLAHE, OTSU]
+    stats = wins.stats()['stations']['1']
+    assert stats == [{'variant': 'clahe', 'psm': 7, 'wins': 20, 'attempts': 40, 'win_rate': 0.5}]
+
+
+def test_failed_cascades_are_rebuilt_from_the_detection_log(tmp_path):
+    log = DetectionLog(str(tmp_path / 'detections.db'), flush_interval=0.05)
+    try:
+        log.record('', None, 0.0, station_id=1, tried=[OTSU, CLAHE])
+        log.record('MH12AB1234', 'MH12AB1234', 90.0, station_id=1, variant='clahe', psm=7, tried=[OTSU, CLAHE])
+        log.flush()
+        wins = PairWins(log.recent_wins(), min_wins=1, explore_rate=0.0)
+    finally:
+        log.close()
+
+    wins_by_pair, attempts = wins.by_station[1]
+    assert wins_by_pair == {CLAHE: 1}
+    assert attempts == {OTSU: 2, CLAHE: 2}
@@ -0,0 +1,101 @@
+import socket
+import struct
+import threading
+
+import pytest
+
+from app.utils.error_handler import OCRQueueFullError, OCRServiceTimeoutError, OCRServiceUnavailableError
+from app.utils.ocr_service import (
+    DETECT, ERROR, HEADER, MAGIC, MAX_PAYLOAD_BYTES, PROTOCOL_VERSION, OCRService, OCRServiceClient,
+    ProtocolError, client_timeout, recv_message, send_message, service_scan_timeout, worker_settings
+)
+
+
+@pytest.fixture
+def service(app, tmp_path):
+    settings = worker_settings(app.config)
+    service = OCRService(str(tmp_path / 'ocr.sock'), settings, workers=1, max_pending=1, timeout=30.0)
+    thread = threading.Thread(target=service.serve_forever, daemon=True)
+    thread.start()
+    client = OCRServiceClient(service.socket_path, timeout=30.0)
+    # The socket is bound once the pool processes are up
+    while service.server is None:
+        thread.join(0.05)
+    client.health()
+    yield service
+    service.shutdown()
+    thread.join(5)
+
+
+def test_messages_round_trip_with_raw_payloads():
+    left, right = socket.socketpair()
+    payload = bytes(range(256)) * 1000
+    # Larger than the socket buffer, so it is read while it is being sent
+    sender = threading.Thread(target=send_message, args=(left, DETECT, {'station_id': 3}, payload))
+    sender.start()
+    kind, meta, received = recv_message(right)
+    sender.join()
+    assert (kind, meta, bytes(received)) == (DETECT, {'station_id': 3}, payload)
+    left.close()
+    right.close()
+
+
+def test_malformed_messages_are_refused():
+    left, right = socket.socketpair()
+    left.sendall(HEADER.pack(b'HT', PROTOCOL_VERSION, DETECT, 0, 0))
+    with pytest.raises(ProtocolError):
+        recv_message(right)
+    left.sendall(HEADER.pack(MAGIC, PROTOCOL_VERSION, DETECT, 2, MAX_PAYLOAD_BYTES + 1))
+    with pytest.raises(ProtocolError):
+        recv_message(right)
+    left.sendall(struct.pack('!2sB', MAGIC, PROTOCOL_VERSION))
+    left.close()
+    with pytest.raises(ConnectionError):
+        recv_message(right)
+    right.close()
+
+
+def test_web_workers_outwait_the_service():
+    assert client_timeout(8.0) > service_scan_timeout(8.0)
+    assert client_timeout(8.0, configured=60.0) == 60.0
+
+
+def test_scans_are_run_by_the_service(service, plate_scene):
+    client = OCRServiceClient(service.socket_path)
+    result = client.detect(plate_scene('MH12AB1234'), station_id=1)
+    assert result['plate'] == 'MH12AB1234'
+    health = client.health()
+    assert health['served'] == 1
+    assert health['in_flight'] == 0
+    assert health['workers'] == 1
+
+
+def test_a_full_service_answers_busy(service, plate_scene):
+    service.slots.acquire()
+    try:
+        with pytest.raises(OCRQueueFullError):
+            OCRServiceClient(service.socket_path).detect(plate_scene('MH12AB1234'))
+    finally:
+        service.slots.release()
+    assert OCRServiceClient(service.socket_path).health()['rejected'] == 1
+
+
+def test_unknown_requests_get_an_error(service):
+    assert OCRServiceClient(service.socket_path).request(99) == (ERROR, {'error': 'Unknown message type 99'})
+
+
+def test_unreachable_service(tmp_path):
+    with pytest.raises(OCRServiceUnavailableError):
+        OCRServiceClient(str(tmp_path / 'missing.sock')).health()
+
+
+def test_a_silent_service_times_out(tmp_path):
+    path = str(tmp_path / 'silent.sock')
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen()
+    try:
+        with pytest.raises(OCRServiceTimeoutError):
+            OCRServiceClient(path, timeout=0.2).detect(b'image')
+    finally:
+        server.close()
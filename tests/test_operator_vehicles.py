@@ -0,0 +1,19 @@
+from app.models import QRCode, Vehicle
+from app.utils.qr_payload import decode_qr_payload, get_qr_signing_key
+
+
+def test_added_vehicle_gets_a_qr_code(app, client, operator):
+    response = client.post('/add-vehicle', data={
+        'vehicle_number': 'mh12ab1234',
+        'owner_name': 'Asha Patil',
+        'vehicle_type': 'car',
+        'fuel_type': 'cng',
+        'cng_expiry_date': '2030-03-31'
+    })
+
+    assert response.status_code == 302
+    vehicle = Vehicle.query.filter_by(vehicle_number='MH12AB1234').one()
+    qr_code = QRCode.query.filter_by(vehicle_id=vehicle.id).one()
+    payload = decode_qr_payload(qr_code.qr_content, get_qr_signing_key(app.config))
+    assert (payload['vehicle_id'], payload['vehicle_number']) == (vehicle.id, 'MH12AB1234')
+    assert payload['expiry_date'].isoformat() == '2030-03-31'
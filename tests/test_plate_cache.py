@@ -0,0 +1,92 @@
+import numpy as np
+
+from app.utils import plate_cache
+from app.utils.plate_cache import PlateResultCache, content_hash
+from app.utils.plate_detector import PlateDetector
+
+
+class Clock:
+    now = 1000.0
+
+    @classmethod
+    def monotonic(cls):
+        return cls.now
+
+
+class SharedCache:
+    """Stands in for the Flask-Caching backend shared by the gunicorn workers"""
+
+    def __init__(self, down=False):
+        self.values = {}
+        self.down = down
+
+    def get(self, key):
+        if self.down:
+            raise ConnectionError('cache is down')
+        return self.values.get(key)
+
+    def set(self, key, value, timeout=None):
+        if self.down:
+            raise ConnectionError('cache is down')
+        self.values[key] = value
+
+
+def test_only_identical_images_share_a_hash():
+    image = bytes(range(256)) * 8
+    assert content_hash(image) == content_hash(bytearray(image))
+    assert content_hash(image) != content_hash(image[:-1] + b'\x00')
+
+    frame = np.zeros((4, 8), np.uint8)
+    assert content_hash(frame) == content_hash(frame.copy())
+    assert content_hash(frame) != content_hash(frame.reshape(8, 4))
+
+
+def test_least_recently_used_results_are_evicted():
+    cache = PlateResultCache(max_entries=2)
+    cache.set('a', {'plate': 'MH12AB1234'})
+    cache.set('b', {'plate': 'KA01AB1234'})
+    cache.get('a')
+    cache.set('c', {'plate': 'DL3CAB1234'})
+    assert cache.get('b') is None
+    assert cache.get('a') == {'plate': 'MH12AB1234'}
+    assert cache.stats()['entries'] == 2
+
+
+def test_results_expire_after_the_ttl(monkeypatch):
+    monkeypatch.setattr(plate_cache, 'time', Clock)
+    cache = PlateResultCache(ttl=120)
+    cache.set('a', {'plate': 'MH12AB1234'})
+    Clock.now += 119
+    assert cache.get('a') is not None
+    Clock.now += 2
+    assert cache.get('a') is None
+
+
+def test_other_workers_are_answered_from_the_shared_cache(app):
+    shared = SharedCache()
+    PlateResultCache(shared_cache=shared).set('a', {'plate': 'MH12AB1234'})
+    other_worker = PlateResultCache(shared_cache=shared)
+    assert other_worker.get('a') == {'plate': 'MH12AB1234'}
+    assert other_worker.get('a') == {'plate': 'MH12AB1234'}
+    assert other_worker.stats()['shared_hits'] == 1
+    assert other_worker.stats()['local_hits'] == 1
+
+
+def test_a_shared_cache_outage_is_a_miss(app):
+    cache = PlateResultCache(shared_cache=SharedCache(down=True))
+    cache.set('a', {'plate': 'MH12AB1234'})
+    assert PlateResultCache(shared_cache=SharedCache(down=True)).get('a') is None
+
+
+def test_a_resubmitted_frame_is_answered_without_decoding(app, plate_scene):
+    detector = PlateDetector()
+    image = plate_scene('MH12AB1234', seed=11)
+    first = detector.detect_plate(image)
+    again = detector.detect_plate(image)
+    assert not first['cached']
+    assert again['cached']
+    assert again['plate'] == first['plate'] == 'MH12AB1234'
+    assert 'decode' not in again['timings']
+
+    other = detector.detect_plate(plate_scene('MH12AB1234', seed=12))
+    assert not other['cached']
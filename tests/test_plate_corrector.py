@@ -0,0 +1,25 @@
+from app.utils.plate_corrector import PlateCorrector
+from config.base import Config
+
+
+def test_confusions_are_mined_against_the_label():
+    counts = PlateCorrector.mine_confusions([('MH12AB1234', 'MH12A81234\nMH12AB1234', 80.0)])
+    assert counts['8']['B'] == 1
+
+
+def test_unlabelled_detections_teach_nothing():
+    assert not PlateCorrector.mine_confusions([(None, 'MH12A81234', 80.0)])
+
+
+def test_misread_characters_are_corrected():
+    corrector = PlateCorrector()
+    assert corrector.correct('MH12A81234')[0] == 'MH12AB1234'
+    assert corrector.correct('MH12AB12S4')[0] == 'MH12AB1254'
+    assert corrector.correct('MH12ABI234')[0] == 'MH12AB1234'
+
+
+def test_a_short_number_is_not_filled_from_the_series():
+    corrector = PlateCorrector()
+    for reading in ('KA01AB123', 'KA01AB12', 'KA01ABB23'):
+        plate, cost = corrector.correct(reading)
+        assert cost > Config.PLATE_CORRECTION_MAX_COST, (reading, plate)
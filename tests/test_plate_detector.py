@@ -0,0 +1,61 @@
+import io
+import os
+import tempfile
+
+import cv2
+import numpy as np
+import pytest
+
+from app.utils.plate_detector import PlateDetector
+
+
+@pytest.fixture
+def detector(app):
+    app.config['PLATE_RESULT_CACHE_ENABLED'] = False
+    return PlateDetector()
+
+
+def files_under(path):
+    return {os.path.join(root, name) for root, dirs, names in os.walk(path) for name in names}
+
+
+def test_bytes_streams_and_frames_take_the_same_pipeline(detector, plate_scene):
+    image = plate_scene('MH12AB1234')
+    frame = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_GRAYSCALE)
+    for source in (image, bytearray(image), memoryview(image), io.BytesIO(image), frame):
+        result = detector.detect_plate(source)
+        assert result['error'] is None
+        assert result['plate'] == 'MH12AB1234'
+        assert result['format_valid']
+        assert result['regions'] == 1
+
+
+def test_detection_writes_no_files(detector, plate_scene, tmp_path, monkeypatch):
+    image = plate_scene('MH12AB1234')
+    # The first scan builds the character templates under instance/
+    detector.detect_plate(image)
+    before = files_under(tmp_path)
+
+    def no_temp_files(*args, **kwargs):
+        raise AssertionError('detect_plate created a temporary file')
+    monkeypatch.setattr(tempfile, 'mkstemp', no_temp_files)
+    monkeypatch.setattr(tempfile, 'NamedTemporaryFile', no_temp_files)
+
+    for seed in range(3):
+        assert detector.detect_plate(plate_scene('MH12AB1234', seed=seed))['plate'] == 'MH12AB1234'
+    assert files_under(tmp_path) == before
+
+
+def test_result_reports_the_stages_it_ran(detector, plate_scene):
+    result = detector.detect_plate(plate_scene('MH12AB1234'))
+    assert result['recognizer'] == 'segmentation'
+    for stage in ('decode', 'localize', 'quality', 'total'):
+        assert stage in result['timings']
+    assert result['elapsed_ms'] == result['timings']['total']
+
+
+def test_an_undecodable_upload_is_rejected_not_raised(detector):
+    result = detector.detect_plate(b'this is not an image')
+    assert result['plate'] is None
+    assert result['rejected']
+    assert result['error']
@@ -0,0 +1,105 @@
+import random
+
+import pytest
+
+from app.utils import plate_index as plate_index_module
+from app.utils.plate_index import PlateIndex, get_plate_index, within_one_edit
+
+
+def distance(a, b):
+    """Levenshtein distance, for checking the index against a full scan"""
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+@pytest.fixture
+def index():
+    index = PlateIndex(max_distance=2)
+    for vehicle_id, number in enumerate(['MH12AB1234', 'KA01AB1234', 'DL3CAB5678', 'TN22BH4321'], 1):
+        index.add(vehicle_id, number)
+    return index
+
+
+def test_exact_and_near_readings_resolve(index):
+    assert index.lookup('mh12ab1234') == (1, 'MH12AB1234', 0)
+    assert index.lookup('MH12A81234') == (1, 'MH12AB1234', 1)  # wrong character
+    assert index.lookup('MH12AB124') == (1, 'MH12AB1234', 1)  # missing character
+    assert index.lookup('DL3CAB56789') == (3, 'DL3CAB5678', 1)  # extra character
+    assert index.lookup('TN22B84S21') == (4, 'TN22BH4321', 2)
+    assert index.lookup('TN22B84S21', max_distance=1) is None
+    assert index.lookup('GJ05ZZ9999') is None
+
+
+def test_equally_close_numbers_are_too_ambiguous(index):
+    # One character from both MH12AB1234 and KA01AB1234 is impossible, but two from each is not
+    assert index.lookup('KH02AB1234') is None
+
+
+def test_renamed_and_removed_vehicles_are_reindexed(index):
+    index.add(1, 'MH14AB1234')
+    assert index.lookup('MH12AB1234') == (1, 'MH14AB1234', 1)
+    index.remove(1)
+    assert index.lookup('MH14AB1234') is None
+    assert len(index) == 3
+
+
+def test_index_agrees_with_a_full_scan():
+    rng = random.Random(3)
+    alphabet = 'ABCDEFGHJKLMNPRSTUVWXYZ0123456789'
+    numbers = {''.join(rng.choices(alphabet, k=rng.choice([9, 10]))) for _ in range(300)}
+    index = PlateIndex(max_distance=1)
+    for vehicle_id, number in enumerate(numbers):
+        index.add(vehicle_id, number)
+
+    for number in rng.sample(sorted(numbers), 100):
+        position = rng.randrange(len(number))
+        reading = rng.choice([
+            number[:position] + rng.choice(alphabet) + number[position + 1:],
+            number[:position] + number[position + 1:],
+            number[:position] + rng.choice(alphabet) + number[position:],
+        ])
+        near = [other for other in numbers if distance(reading, other) <= 1]
+        expected = min(near, key=lambda other: distance(reading, other))
+        if sum(distance(reading, other) == distance(reading, expected) for other in near) > 1:
+            expected = None
+        match = index.lookup(reading)
+        assert (match[1] if match else None) == expected, reading
+
+
+def test_within_one_edit():
+    assert within_one_edit('MH12AB1234', 'MH12AB1234')
+    assert within_one_edit('MH12AB1234', 'MH12AB234')
+    assert not within_one_edit('MH12AB1234', 'MH12BA1234')
+
+
+def test_registered_index_follows_committed_vehicles(app, operator, monkeypatch):
+    from app import db
+    from app.models import Vehicle
+
+    monkeypatch.setattr(plate_index_module, '_plate_index', None)
+    vehicle = Vehicle(user_id=operator.id, vehicle_number='MH12AB1234', owner_name='Owner', vehicle_type='car')
+    db.session.add(vehicle)
+    db.session.commit()
+
+    index = get_plate_index()
+    index.sync()
+    assert index.lookup('MH12A81234')[1] == 'MH12AB1234'
+
+    vehicle.vehicle_number = 'GJ05ZZ9999'
+    db.session.commit()
+    assert index.lookup('MH12AB1234') is None
+    assert index.lookup('GJ05ZZ9999')[0] == vehicle.id
+
+    db.session.add(Vehicle(user_id=operator.id, vehicle_number='KA01AB1234', owner_name='Owner', vehicle_type='car'))
+    db.session.flush()
+    db.session.rollback()
+    assert index.lookup('KA01AB1234') is None
+
+    db.session.delete(db.session.get(Vehicle, vehicle.id))
+    db.session.commit()
+    assert len(index) == 0
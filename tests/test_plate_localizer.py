@@ -0,0 +1,68 @@
+import cv2
+import numpy as np
+from PIL import ImageFont
+
+from app.utils.plate_localizer import ROI_HEIGHT, PlateLocalizer, order_box_points, overlap_ratio
+from app.utils.plate_render import PLATE_FONT_PATHS, render_plate
+
+
+def street_frame(angle=0.0, plates=((390, 400),), seed=0):
+    """A noisy 1280x720 frame with a dark car body and the plate(s) at the given (x, y)"""
+    rng = np.random.default_rng(seed)
+    frame = rng.normal(115, 22, (720, 1280)).clip(0, 255).astype(np.uint8)
+    cv2.rectangle(frame, (200, 150), (1100, 650), 60, -1)
+    plate = render_plate('MH12AB1234', ImageFont.truetype(PLATE_FONT_PATHS[0], 84))
+    plate = cv2.resize(plate, None, fx=0.7, fy=0.7, interpolation=cv2.INTER_AREA)
+    if angle:
+        height, width = plate.shape
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+        cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+        size = (int(width * cos + height * sin), int(width * sin + height * cos))
+        matrix[0, 2] += size[0] / 2 - width / 2
+        matrix[1, 2] += size[1] / 2 - height / 2
+        plate = cv2.warpAffine(plate, matrix, size, borderValue=60)
+    height, width = plate.shape
+    for x, y in plates:
+        frame[y:y + height, x:x + width] = plate
+    return frame, (plates[0][0], plates[0][1], width, height)
+
+
+def test_plate_is_found_and_cropped_to_roi_height():
+    frame, bounds = street_frame()
+    candidates = PlateLocalizer().find_candidates(frame)
+    assert len(candidates) == 1
+    assert overlap_ratio(candidates[0]['bounds'], bounds) > 0.9
+
+    crops = PlateLocalizer().localize(frame)
+    assert crops[0].shape[0] == ROI_HEIGHT
+    assert 3.5 < crops[0].shape[1] / ROI_HEIGHT < 5.0
+
+
+def test_tilted_plate_is_deskewed():
+    frame, bounds = street_frame(angle=8.0)
+    crop = PlateLocalizer().localize(frame)[0]
+    # The upright crop keeps the plate's own proportions, not its tilted bounding box
+    assert 3.5 < crop.shape[1] / crop.shape[0] < 5.0
+    assert bounds[2] / bounds[3] < 3.0
+
+
+def test_frames_without_a_plate_give_no_regions():
+    assert PlateLocalizer().localize(np.full((480, 640), 128, np.uint8)) == []
+    noise = np.random.default_rng(0).normal(115, 22, (720, 1280)).clip(0, 255).astype(np.uint8)
+    assert PlateLocalizer().localize(noise) == []
+
+
+def test_candidates_are_capped():
+    frame, _ = street_frame(plates=((250, 200), (650, 200), (250, 450), (650, 450)))
+    assert len(PlateLocalizer(max_candidates=4).find_candidates(frame)) == 4
+    assert len(PlateLocalizer(max_candidates=2).find_candidates(frame)) == 2
+
+
+def test_box_points_are_ordered_clockwise_from_top_left():
+    box = np.float32([[10, 50], [10, 10], [90, 10], [90, 50]])
+    assert order_box_points(box).tolist() == [[10, 10], [90, 10], [90, 50], [10, 50]]
+
+
+def test_overlap_is_measured_against_the_smaller_box():
+    assert overlap_ratio((0, 0, 10, 10), (5, 0, 100, 100)) == 0.5
+    assert overlap_ratio((0, 0, 10, 10), (20, 20, 10, 10)) == 0.0
@@ -0,0 +1,87 @@
+import cv2
+import numpy as np
+import pytest
+from flask import g
+
+from app.utils import qr_generator
+from app.utils.helpers import generate_qr_content
+from app.utils.qr_generator import read_qr_codes
+
+
+def log_in(client, user):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    # Requests share the fixture's app context, where Flask-Login keeps the loaded user
+    g.pop('_login_user', None)
+
+
+def new_user(email, role):
+    from app import db
+    from app.models import User
+
+    user = User(email=email, first_name='Test', last_name='User', role=role)
+    user.set_password('Test-pass-1')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def qr_code(app, client):
+    from app import db
+    from app.models import QRCode, Vehicle
+
+    owner = new_user('owner@example.com', 'vehicle_owner')
+    vehicle = Vehicle(user_id=owner.id, vehicle_number='MH12AB1234', owner_name='Asha Patil', vehicle_type='car')
+    db.session.add(vehicle)
+    db.session.flush()
+    qr_code = QRCode(vehicle_id=vehicle.id, qr_content=generate_qr_content(vehicle.id, 'MH12AB1234', None))
+    db.session.add(qr_code)
+    db.session.commit()
+    log_in(client, owner)
+    return qr_code
+
+
+def test_image_is_rendered_with_long_lived_private_caching(client, qr_code):
+    response = client.get(f'/qr/image/{qr_code.id}.png')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    assert response.headers['ETag']
+    assert response.cache_control.private
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age == 31536000
+
+    image = cv2.imdecode(np.frombuffer(response.data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    assert read_qr_codes(image) == [qr_code.qr_content]
+
+
+def test_revalidation_is_answered_without_rendering(client, qr_code, monkeypatch):
+    etag = client.get(f'/qr/image/{qr_code.id}.png').headers['ETag']
+
+    def no_render(*args):
+        raise AssertionError('the QR image was rendered again')
+    monkeypatch.setattr(qr_generator, 'render_qr_image', no_render)
+    response = client.get(f'/qr/image/{qr_code.id}.png', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+    # Cached renders are served again without rendering too
+    assert client.get(f'/qr/image/{qr_code.id}.png').status_code == 200
+
+
+def test_each_format_has_its_own_etag(client, qr_code):
+    png = client.get(f'/qr/image/{qr_code.id}.png')
+    svg = client.get(f'/qr/image/{qr_code.id}.svg?download=1')
+    assert svg.mimetype == 'image/svg+xml'
+    assert svg.headers['ETag'] != png.headers['ETag']
+    assert svg.headers['Content-Disposition'] == 'attachment; filename="qr_MH12AB1234.svg"'
+    assert client.get(f'/qr/image/{qr_code.id}.gif').status_code == 404
+
+
+def test_only_the_owner_and_admins_get_the_image(client, qr_code):
+    log_in(client, new_user('someone@example.com', 'vehicle_owner'))
+    assert client.get(f'/qr/image/{qr_code.id}.png').status_code == 404
+    log_in(client, new_user('admin@example.com', 'admin'))
+    assert client.get(f'/qr/image/{qr_code.id}.png').status_code == 200
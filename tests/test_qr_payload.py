@@ -0,0 +1,59 @@
+from datetime import date, datetime
+
+import pytest
+
+from app.utils.qr_payload import QRPayloadError, decode_qr_payload, encode_qr_payload
+
+KEY = b'k' * 32
+ISSUED_AT = datetime(2025, 6, 1, 12, 0)
+
+
+def roundtrip(vehicle_id=1, vehicle_number='MH12AB1234', expiry_date=None, issued_at=ISSUED_AT):
+    content = encode_qr_payload(vehicle_id, vehicle_number, expiry_date, KEY, issued_at=issued_at)
+    return decode_qr_payload(content, KEY)
+
+
+def test_payload_roundtrips():
+    payload = roundtrip(42, 'MH12AB1234', date(2026, 3, 31))
+    assert payload['vehicle_id'] == 42
+    assert payload['vehicle_number'] == 'MH12AB1234'
+    assert payload['expiry_date'] == date(2026, 3, 31)
+    assert payload['issued_at'] == ISSUED_AT
+    assert payload['signed']
+
+
+@pytest.mark.parametrize('vehicle_id', [0, 0xFFFFFFFF])
+def test_vehicle_id_boundaries_roundtrip(vehicle_id):
+    assert roundtrip(vehicle_id)['vehicle_id'] == vehicle_id
+
+
+@pytest.mark.parametrize('vehicle_id', [-1, 0x100000000])
+def test_vehicle_id_out_of_range_is_rejected(vehicle_id):
+    with pytest.raises(QRPayloadError):
+        roundtrip(vehicle_id)
+
+
+@pytest.mark.parametrize('expiry_date', [date(2000, 1, 1), date(2179, 6, 5)])
+def test_expiry_boundaries_roundtrip(expiry_date):
+    assert roundtrip(expiry_date=expiry_date)['expiry_date'] == expiry_date
+
+
+@pytest.mark.parametrize('expiry_date, expected', [
+    (date(1999, 12, 31), date(2000, 1, 1)),
+    (date(1990, 1, 1), date(2000, 1, 1)),
+    (date(2179, 6, 6), date(2179, 6, 5)),
+    (date(9999, 12, 31), date(2179, 6, 5)),
+])
+def test_expiry_out_of_range_is_clamped(expiry_date, expected):
+    assert roundtrip(expiry_date=expiry_date)['expiry_date'] == expected
+
+
+def test_expiry_datetime_is_taken_as_its_date():
+    assert roundtrip(expiry_date=datetime(2026, 3, 31, 18, 30))['expiry_date'] == date(2026, 3, 31)
+
+
+def test_issue_time_out_of_range_is_rejected():
+    with pytest.raises(QRPayloadError):
+        roundtrip(issued_at=datetime(1969, 12, 31))
+    with pytest.raises(QRPayloadError):
+        roundtrip(issued_at=datetime(2106, 2, 8))
@@ -0,0 +1,94 @@
+import io
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from app.utils import ocr_jobs, scan_admission
+from app.utils.helpers import generate_qr_content
+from app.utils.plate_detector import PlateDetector
+from app.utils.qr_generator import render_qr_image
+from app.utils.scan_admission import ScanAdmission
+
+
+@pytest.fixture
+def vehicle(app, operator):
+    from app import db
+    from app.models import Vehicle
+
+    vehicle = Vehicle(user_id=operator.id, vehicle_number='MH12AB1234', owner_name='Asha Patil', vehicle_type='car')
+    db.session.add(vehicle)
+    db.session.commit()
+    return vehicle
+
+
+def with_qr_code(image, content):
+    """The scan frame with a QR code holding `content` stuck on the windscreen"""
+    frame = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_GRAYSCALE)
+    code = cv2.imdecode(np.frombuffer(render_qr_image(content), np.uint8), cv2.IMREAD_GRAYSCALE)
+    code = cv2.resize(code, (240, 240), interpolation=cv2.INTER_NEAREST)
+    frame[40:280, 900:1140] = code
+    return cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+def scan(client, image, **data):
+    return client.post('/scan', data={'image': (io.BytesIO(image), 'frame.jpg'), **data})
+
+
+def test_a_qr_code_identifies_the_vehicle_without_ocr(client, vehicle, plate_scene, monkeypatch):
+    def no_ocr(*args, **kwargs):
+        raise AssertionError('the plate was read although the frame holds a QR code')
+    monkeypatch.setattr(PlateDetector, 'detect_plate', no_ocr)
+
+    image = with_qr_code(plate_scene('KA01AB1234'), generate_qr_content(vehicle.id, vehicle.vehicle_number, None))
+    response = scan(client, image)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['scan_method'] == 'qr'
+    assert body['vehicle_number'] == 'MH12AB1234'
+
+
+def test_the_plate_is_read_when_there_is_no_qr_code_of_ours(client, vehicle, plate_scene):
+    for image in (plate_scene('MH12AB1234'), with_qr_code(plate_scene('MH12AB1234'), 'https://example.com/menu')):
+        response = scan(client, image)
+        assert response.status_code == 200
+        body = response.get_json()
+        assert body['scan_method'] == 'plate'
+        assert body['vehicle_number'] == 'MH12AB1234'
+        assert body['vehicle_exists']
+
+
+def test_plate_reading_can_run_as_a_job(client, vehicle, plate_scene, monkeypatch):
+    monkeypatch.setattr(ocr_jobs, '_job_runner', None)
+    response = scan(client, plate_scene('MH12AB1234'), mode='async')
+    assert response.status_code == 202
+    poll_url = response.get_json()['poll_url']
+
+    deadline = time.monotonic() + 30
+    while (response := client.get(poll_url)).status_code == 202:
+        assert time.monotonic() < deadline
+        time.sleep(0.1)
+    assert response.get_json()['scan_method'] == 'plate'
+    assert response.get_json()['vehicle_number'] == 'MH12AB1234'
+
+
+def test_bad_uploads_are_refused(client, operator):
+    assert scan(client, b'not an image').status_code == 400
+    assert client.post('/scan', data={}).status_code == 400
+
+
+def test_shed_scans_are_refused_before_decoding(client, operator, plate_scene, monkeypatch):
+    def no_decode(*args):
+        raise AssertionError('a shed scan was decoded')
+    monkeypatch.setattr(PlateDetector, 'decode_image', no_decode)
+    admission = ScanAdmission(max_active=1, max_per_station=1, max_waiting=0, max_wait=0.1)
+    monkeypatch.setattr(scan_admission, '_admission', admission)
+
+    slot = admission.acquire(None)
+    try:
+        response = scan(client, plate_scene('MH12AB1234'))
+    finally:
+        admission.release(slot)
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
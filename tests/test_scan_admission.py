@@ -0,0 +1,42 @@
+import multiprocessing
+import os
+import signal
+import time
+
+import pytest
+
+from app.utils.error_handler import OCRQueueFullError
+from app.utils.scan_admission import ScanAdmission
+
+
+def hold_lock_forever(admission, locked):
+    admission.lock.acquire()
+    locked.set()
+    time.sleep(60)
+
+
+def test_slots_free_up_for_waiting_scans():
+    admission = ScanAdmission(max_active=1, max_per_station=1, max_waiting=1, max_wait=1.0)
+    slot = admission.acquire(1)
+    with pytest.raises(OCRQueueFullError):
+        admission.acquire(1)
+    admission.release(slot)
+    admission.release(admission.acquire(1))
+    assert admission.stats()['admitted'] == 2
+
+
+def test_lock_left_by_a_killed_worker_sheds_scans_instead_of_hanging():
+    admission = ScanAdmission()
+    context = multiprocessing.get_context('fork')
+    locked = context.Event()
+    worker = context.Process(target=hold_lock_forever, args=(admission, locked))
+    worker.start()
+    assert locked.wait(10)
+    os.kill(worker.pid, signal.SIGKILL)
+    worker.join()
+
+    started = time.monotonic()
+    with pytest.raises(OCRQueueFullError):
+        admission.acquire(1)
+    assert time.monotonic() - started < 5
+    assert admission.stats()['rejected_lock_timeout'] == 1
@@ -0,0 +1,11 @@
+import threading
+
+from app.utils.warmup import warm_up
+
+
+def test_warmup_leaves_no_detection_log_writer_to_fork(app):
+    app.config['PLATE_DETECTION_LOG_ENABLED'] = True
+    report = warm_up(app)
+
+    assert report['steps']['detector'] >= 0
+    assert 'detection-log-writer' not in [thread.name for thread in threading.enumerate()]